@@ -178,6 +178,7 @@ class Bot(object):
         self.logger.info("Starting bot (EarwigBot {0})".format(__version__))
         self._start_irc_components()
         self._start_wiki_scheduler()
+        self.wiki.warm_up()
         while self._keep_looping:
             with self.component_lock:
                 self._keep_irc_component_alive("frontend", Frontend)
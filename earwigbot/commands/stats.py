@@ -0,0 +1,64 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from earwigbot import exceptions
+from earwigbot.commands import Command
+
+class Stats(Command):
+    """Report API cache, connection reuse, and query queue statistics for a
+    site."""
+    name = "stats"
+    commands = ["stats", "apistats"]
+
+    def process(self, data):
+        if data.args:
+            try:
+                site = self.bot.wiki.get_site(data.args[0])
+            except exceptions.SiteNotFoundError:
+                msg = "Unknown site: \x0302{0}\x0F.".format(data.args[0])
+                self.reply(data, msg)
+                return
+        else:
+            site = self.bot.wiki.get_site()
+
+        stats = site.get_stats()
+        parts = [self.get_cache(stats.get("cache")),
+                 self.get_http(stats["http"]),
+                 self.get_scheduler(stats["scheduler"])]
+        msg = "\x0302{0}\x0F: {1}."
+        self.reply(data, msg.format(site.name, "; ".join(parts)))
+
+    def get_cache(self, stats):
+        if not stats:
+            return "response cache disabled"
+        msg = "cache: {0} hits, {1} misses ({2:.0%} hit rate), {3} entries"
+        return msg.format(stats["hits"], stats["misses"], stats["hit_rate"],
+                          stats["entries"])
+
+    def get_http(self, stats):
+        msg = "HTTP: {0} requests, {1:.0%} on reused connections"
+        return msg.format(stats["requests"], stats["hit_rate"])
+
+    def get_scheduler(self, stats):
+        msg = "queue: {0} in flight, {1} waiting (max {2}), {3:.2f}s avg wait"
+        return msg.format(stats["in_flight"], stats["queued"],
+                          stats["max_queued"], stats["avg_wait"])
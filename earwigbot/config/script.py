@@ -275,6 +275,8 @@ class ConfigScript(object):
         self.data["wiki"]["assert"] = "user"
         self.data["wiki"]["maxlag"] = 10
         self.data["wiki"]["waitTime"] = 2
+        self.data["wiki"]["maxConcurrentReads"] = 4
+        self.data["wiki"]["maxSQLConnections"] = 4
         self.data["wiki"]["defaultSite"] = self._login(kwargs).name
         self.data["wiki"]["sql"] = {}
 
@@ -33,18 +33,36 @@ from types import ModuleType
 
 __all__ = ["LazyImporter"]
 
+_loading = set()  # IDs of modules being loaded right now
+
 def _getattribute(self, attr):
     _load(self)
-    return self.__getattribute__(attr)
+    return ModuleType.__getattribute__(self, attr)
 
 def _setattr(self, attr, value):
     _load(self)
-    self.__setattr__(attr, value)
+    ModuleType.__setattr__(self, attr, value)
 
 def _load(self):
-    type(self).__getattribute__ = ModuleType.__getattribute__
-    type(self).__setattr__ = ModuleType.__setattr__
-    reload(self)
+    # Other threads wait on the import lock until the module is fully loaded,
+    # while the loading thread itself (which may need the module's attributes
+    # as it's being loaded) sees it as-is:
+    acquire_lock()
+    try:
+        klass = type(self)
+        if klass.__dict__["__getattribute__"] is not _getattribute:
+            return  # Already loaded by another thread
+        if id(self) in _loading:
+            return
+        _loading.add(id(self))
+        try:
+            reload(self)
+        finally:
+            _loading.discard(id(self))
+        klass.__getattribute__ = ModuleType.__getattribute__
+        klass.__setattr__ = ModuleType.__setattr__
+    finally:
+        release_lock()
 
 
 class _LazyModule(type):
@@ -61,7 +79,11 @@ class _LazyModule(type):
                 klass = type.__new__(cls, "module", parents, attributes)
                 sys.modules[name] = klass(name)
                 if "." in name:  # Also ensure the parent exists
-                    _LazyModule(name.rsplit(".", 1)[0])
+                    parent, child = name.rsplit(".", 1)
+                    # Bind ourselves to the parent without loading it, so
+                    # "from parent import child" works elsewhere:
+                    ModuleType.__setattr__(_LazyModule(parent), child,
+                                           sys.modules[name])
             return sys.modules[name]
         finally:
             release_lock()
@@ -156,12 +156,9 @@ class WikiProjectTagger(Task):
         be ``NS_TEMPLATE`` unless one is explicitly declared (so ``{{foo}}`` ->
         ``[[Template:Foo]]``, but ``{{:foo}}`` -> ``[[Foo]]``).
         """
-        prefix = title.split(":", 1)[0]
-        if prefix == title:
-            return u":".join((site.namespace_id_to_name(assumed), title))
-        try:
-            site.namespace_name_to_id(prefix)
-        except exceptions.NamespaceNotFoundError:
+        # The title is returned unsplit only if it has no namespace prefix; an
+        # explicit prefix (even an empty one, as in ":foo") is stripped off:
+        if site.split_title(title)[1] == title:
             return u":".join((site.namespace_id_to_name(assumed), title))
         return title
 
@@ -179,9 +176,10 @@ class WikiProjectTagger(Task):
             names = [self._upperfirst(banner)]
         else:
             names = [self._upperfirst(banner), self._upperfirst(title)]
-        result = site.api_query(action="query", list="backlinks", bllimit=500,
-                                blfilterredir="redirects", bltitle=title)
-        for backlink in result["query"]["backlinks"]:
+        backlinks = site.api_query_iter(
+            action="query", list="backlinks", bllimit="max",
+            blfilterredir="redirects", bltitle=title)
+        for backlink in backlinks:
             names.append(backlink["title"])
             if backlink["ns"] == constants.NS_TEMPLATE:
                 names.append(backlink["title"].split(":", 1)[1])
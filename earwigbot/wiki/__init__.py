@@ -43,6 +43,7 @@ of your :py:class:`~earwigbot.wiki.site.Site` (and thus,
 :py:class:`~earwigbot.wiki.user.User`) needs.
 """
 
+from earwigbot.wiki.asyncsite import AsyncSite
 from earwigbot.wiki.category import *
 from earwigbot.wiki.constants import *
 from earwigbot.wiki.page import *
@@ -0,0 +1,183 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from multiprocessing.pool import ThreadPool
+from threading import Lock
+
+__all__ = ["AsyncSite"]
+
+class AsyncSite(object):
+    """
+    **EarwigBot: Wiki Toolset: Asynchronous Site**
+
+    Wraps a :py:class:`~earwigbot.wiki.site.Site` so that its queries can be
+    started without waiting for them to finish. Each method submits the work
+    to a thread pool and immediately returns a
+    :py:class:`multiprocessing.pool.AsyncResult`; call its
+    :py:meth:`~multiprocessing.pool.AsyncResult.get` method to wait for the
+    return value (or the exception raised). This makes it easy to keep many
+    reads in flight at once, across many sites, from a single thread.
+
+    This is a thread-pool wrapper, not non-blocking I/O: each call still runs
+    the wrapped site's blocking code, and occupies one of the pool's threads
+    until it finishes (including any time spent waiting for the site's
+    throttle). It saves the caller from managing threads, but not the cost of
+    one thread per call in flight, and it can't make queries go out any
+    faster than the site itself allows.
+
+    Everything is delegated to the wrapped site, so throttling, maxlag, assert
+    and login behave exactly as they do there; in particular, the number of
+    reads actually sent to a site at the same time is still capped by its
+    ``max_concurrent_reads``, and pool threads beyond that just wait their
+    turn. By default, all AsyncSites share one pool of
+    :py:attr:`DEFAULT_WORKERS` threads, so that many sites can be queried at
+    once; pass your own *pool* (anything with an ``apply_async`` method) to
+    use a different one.
+
+    *Public methods:*
+
+    - :py:meth:`api_query`:             does an API query with kwargs as params
+    - :py:meth:`api_query_list`:        does a continued API query and returns
+      all of its items
+    - :py:meth:`get_page`:              returns a loaded Page for a title
+    - :py:meth:`get_pages`:             returns loaded Pages for many titles
+    - :py:meth:`get_category_members`:  returns the Pages in a category
+    - :py:meth:`gather`:                waits for many AsyncResults at once
+    """
+    DEFAULT_WORKERS = 32
+
+    _shared_pool = None
+    _shared_pool_lock = Lock()
+
+    def __init__(self, site, pool=None):
+        self._site = site
+        self._pool = pool
+
+    def __repr__(self):
+        """Return the canonical string representation of the AsyncSite."""
+        return "AsyncSite({0!r})".format(self._site)
+
+    def __str__(self):
+        """Return a nice string representation of the AsyncSite."""
+        return "<AsyncSite for {0}>".format(self._site)
+
+    @classmethod
+    def _get_shared_pool(cls):
+        """Return the thread pool shared by AsyncSites, creating it if needed.
+        """
+        with cls._shared_pool_lock:
+            if not cls._shared_pool:
+                cls._shared_pool = ThreadPool(cls.DEFAULT_WORKERS)
+            return cls._shared_pool
+
+    def _submit(self, func, *args, **kwargs):
+        """Run *func* with the given arguments in our pool."""
+        pool = self._pool or self._get_shared_pool()
+        return pool.apply_async(func, args, kwargs)
+
+    def _load_pages(self, titles, content, follow_redirects):
+        """Return Pages for *titles*, with their attributes loaded."""
+        return self._site.get_pages(titles, content=content,
+                                    follow_redirects=follow_redirects)
+
+    def _load_page(self, title, content, follow_redirects):
+        """Return a single Page for *title*, with its attributes loaded."""
+        return self._load_pages([title], content, follow_redirects)[0]
+
+    def _get_members(self, catname, limit, follow_redirects, prefetch):
+        """Return a list of the Pages in the given category."""
+        category = self._site.get_category(catname)
+        members = self._site.api_query_iter(
+            prefetch=prefetch, action="query", list="categorymembers",
+            cmtitle=category.title, cmlimit=limit if limit else "max")
+        titles = []
+        for i, member in enumerate(members, 1):
+            titles.append(member["title"])
+            if i == limit:
+                break
+        return self._load_pages(titles, False, follow_redirects)
+
+    @property
+    def site(self):
+        """The :py:class:`~earwigbot.wiki.site.Site` we are wrapping."""
+        return self._site
+
+    def api_query(self, **kwargs):
+        """Start an API query with `kwargs` as the parameters.
+
+        See :py:meth:`Site.api_query <earwigbot.wiki.site.Site.api_query>`.
+        """
+        return self._submit(self._site.api_query, **kwargs)
+
+    def api_query_list(self, **kwargs):
+        """Start a continued API query, returning a list of all its items.
+
+        See :py:meth:`Site.api_query_iter
+        <earwigbot.wiki.site.Site.api_query_iter>`; the difference is that all
+        of the items are collected before the result is ready.
+        """
+        return self._submit(lambda: list(self._site.api_query_iter(**kwargs)))
+
+    def get_page(self, title, follow_redirects=False, content=False):
+        """Start loading the page with the given *title*.
+
+        The result is a :py:class:`~earwigbot.wiki.page.Page` (or
+        :py:class:`~earwigbot.wiki.category.Category`) whose attributes, and
+        content if *content* is ``True``, have already been loaded, so reading
+        them won't block. If *follow_redirects* is ``True``, we'll return the
+        redirect's target instead.
+        """
+        return self._submit(self._load_page, title, content, follow_redirects)
+
+    def get_pages(self, titles, content=True, follow_redirects=False):
+        """Start loading the pages with the given *titles* in bulk.
+
+        See :py:meth:`Site.get_pages <earwigbot.wiki.site.Site.get_pages>`.
+        """
+        return self._submit(self._load_pages, titles, content,
+                            follow_redirects)
+
+    def get_category_members(self, catname, limit=None,
+                             follow_redirects=False, prefetch=True):
+        """Start listing the members of the category *catname*.
+
+        *catname* should be given *without* a namespace prefix, as with
+        :py:meth:`Site.get_category <earwigbot.wiki.site.Site.get_category>`.
+        The result is a
+        list of :py:class:`~earwigbot.wiki.page.Page` objects, loaded in bulk,
+        for up to *limit* members (or all of them, if *limit* is ``None``).
+        With *prefetch*, each batch of members is requested while the previous
+        one is being handled.
+        """
+        return self._submit(self._get_members, catname, limit,
+                            follow_redirects, prefetch)
+
+    @staticmethod
+    def gather(results, timeout=None):
+        """Wait for a list of AsyncResults, and return a list of their values.
+
+        If any of them raised an exception, it is raised here. *timeout* is the
+        maximum number of seconds to wait for each result.
+        """
+        if timeout is None:
+            return [result.get() for result in results]
+        return [result.get(timeout) for result in results]
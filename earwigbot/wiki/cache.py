@@ -0,0 +1,133 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import OrderedDict
+from copy import deepcopy
+from threading import Lock
+from time import time
+
+from earwigbot.wiki.throttle import READ_ACTIONS
+
+__all__ = ["ResponseCache"]
+
+class ResponseCache(object):
+    """
+    **EarwigBot: Wiki Toolset: API Response Cache**
+
+    An in-memory cache of API query results, used by
+    :py:class:`~earwigbot.wiki.site.Site` to avoid repeating identical queries
+    within a short time of each other.
+
+    *ttls* is a dict mapping API actions (like ``"query"``) to the number of
+    seconds their results stay fresh; actions that aren't listed are never
+    cached. At most *max_entries* results are kept, and the least recently
+    used ones are evicted first.
+
+    Queries that change something (anything that isn't a read action) or that
+    involve tokens are never cached, and any write clears the cache entirely,
+    since we can't easily tell which results it made stale.
+    """
+    IGNORED_PARAMS = ("format", "assert", "maxlag")
+
+    def __init__(self, ttls=None, max_entries=1000):
+        self._ttls = ttls or {}
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the ResponseCache."""
+        res = "ResponseCache(ttls={0!r}, max_entries={1!r})"
+        return res.format(self._ttls, self._max_entries)
+
+    def __str__(self):
+        """Return a nice string representation of the ResponseCache."""
+        return "<ResponseCache of size {0}>".format(len(self._entries))
+
+    def _unicodeify(self, value):
+        """Return a param value as unicode, whatever its original type."""
+        if isinstance(value, str):
+            return value.decode("utf8")
+        return unicode(value)
+
+    def make_key(self, params):
+        """Return a cache key for a dict of API query *params*.
+
+        Returns ``None`` if the query must not be cached: if its action has no
+        TTL, or it isn't a read, or it asks for or sends a token.
+        """
+        action = params.get("action")
+        if action not in READ_ACTIONS or not self._ttls.get(action):
+            return None
+        key = []
+        for name, value in params.iteritems():
+            if name in self.IGNORED_PARAMS:
+                continue
+            value = self._unicodeify(value)
+            if "token" in name:
+                return None
+            if name in ("meta", "prop", "list"):
+                if "tokens" in value.split("|"):
+                    return None
+            key.append((name, value))
+        return tuple(sorted(key))
+
+    def get(self, key):
+        """Return a copy of the cached result for *key*, or ``None``."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry and entry[0] > time():
+                self._entries[key] = entry  # Move to most-recently-used end
+                self._stats["hits"] += 1
+                return deepcopy(entry[1])
+            self._stats["misses"] += 1
+
+    def put(self, key, result):
+        """Store an API *result* under *key*, evicting old entries if needed.
+        """
+        ttl = self._ttls[dict(key)["action"]]
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time() + ttl, deepcopy(result))
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        """Remove everything from the cache."""
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self):
+        """Return a dict of cache statistics.
+
+        The dict contains the number of cache ``hits`` and ``misses``, the
+        ``hit_rate``, the number of entries evicted to make room for new ones
+        (``evictions``), and the current number of ``entries``.
+        """
+        with self._lock:
+            stats = self._stats.copy()
+            stats["entries"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = float(stats["hits"]) / lookups if lookups else 0.0
+        return stats
@@ -60,22 +60,13 @@ class Category(Page):
 
     def _get_members_via_api(self, limit, follow):
         """Iterate over Pages in the category using the API."""
-        params = {"action": "query", "list": "categorymembers",
-                  "cmtitle": self.title}
-
-        while 1:
-            params["cmlimit"] = limit if limit else "max"
-            result = self.site.api_query(**params)
-            for member in result["query"]["categorymembers"]:
-                title = member["title"]
-                yield self.site.get_page(title, follow_redirects=follow)
-
-            if "query-continue" in result:
-                qcontinue = result["query-continue"]["categorymembers"]
-                params["cmcontinue"] = qcontinue["cmcontinue"]
-                if limit:
-                    limit -= len(result["query"]["categorymembers"])
-            else:
+        members = self.site.api_query_iter(
+            action="query", list="categorymembers", cmtitle=self.title,
+            cmlimit=limit if limit else "max")
+
+        for i, member in enumerate(members, 1):
+            yield self.site.get_page(member["title"], follow_redirects=follow)
+            if i == limit:
                 break
 
     def _get_members_via_sql(self, limit, follow):
@@ -87,12 +78,11 @@ class Category(Page):
 
         if limit:
             query += " LIMIT ?"
-            result = self.site.sql_query(query, (title, limit))
+            result = self.site.sql_query(query, (title, limit), stream=True)
         else:
-            result = self.site.sql_query(query, (title,))
+            result = self.site.sql_query(query, (title,), stream=True)
 
-        members = list(result)
-        for row in members:
+        for row in result:
             base = row[0].replace("_", " ").decode("utf8")
             namespace = self.site.namespace_id_to_name(row[1])
             if namespace:
@@ -114,10 +104,11 @@ class Category(Page):
         query = "SELECT COUNT(*) FROM categorylinks WHERE cl_to = ?"
         title = self.title.replace(" ", "_").split(":", 1)[1]
         if member_type == "size":
-            result = self.site.sql_query(query, (title,))
+            params = (title,)
         else:
             query += " AND cl_type = ?"
-            result = self.site.sql_query(query, (title, member_type[:-1]))
+            params = (title, member_type[:-1])
+        result = self.site.sql_query(query, params)
         return list(result)[0][0]
 
     def _get_size(self, member_type):
@@ -188,13 +179,11 @@ class Category(Page):
            Be careful when iterating over very large categories with no limit.
            If using the API, at best, you will make one query per 5000 pages,
            which can add up significantly for categories with hundreds of
-           thousands of members. As for SQL, note that *all page titles are
-           stored internally* as soon as the query is made, so the site-wide
-           SQL lock can be freed and unrelated queries can be made without
-           requiring a separate connection to be opened. This is generally not
-           an issue unless your category's size approaches several hundred
-           thousand, in which case the sheer number of titles in memory becomes
-           problematic.
+           thousands of members. As for SQL, members are streamed from the
+           server in batches, so memory use stays flat, but one of the site's
+           pooled SQL connections is held until iteration is finished (or the
+           iterator is closed). Other SQL queries can still be made in the
+           meantime, on the pool's other connections.
         """
         services = {
             self.site.SERVICE_API: self._get_members_via_api,
@@ -20,17 +20,24 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from gzip import GzipFile
+from collections import defaultdict
+from functools import partial
+from httplib import HTTPException
 from socket import timeout
-from StringIO import StringIO
-from time import sleep, time
-from urllib2 import build_opener, URLError
+from time import time
+from urllib2 import build_opener, HTTPError, Request, URLError
+import zlib
 
 from earwigbot import exceptions, importer
-from earwigbot.wiki.copyvios.markov import MarkovChain, MarkovChainIntersection
+from earwigbot.wiki.copyvios.fingerprint import Fingerprint, Prefilter
+from earwigbot.wiki.copyvios.markov import (CompactMarkovChain,
+                                           MarkovChainIntersection)
 from earwigbot.wiki.copyvios.parsers import ArticleTextParser, HTMLTextParser
-from earwigbot.wiki.copyvios.result import CopyvioCheckResult
-from earwigbot.wiki.copyvios.search import YahooBOSSSearchEngine
+from earwigbot.wiki.copyvios.result import (CopyvioCheckResult,
+                                            CopyvioSourceResult)
+from earwigbot.wiki.copyvios.search import (SearchScheduler,
+                                            YahooBOSSSearchEngine)
+from earwigbot.wiki.copyvios.workers import CopyvioSource, CopyvioWorkspace
 
 oauth = importer.new("oauth2")
 
@@ -47,35 +54,155 @@ class CopyvioMixIn(object):
     the :py:class:`~earwigbot.wiki.site.Site`'s config.
     """
 
+    SOURCE_TYPES = ("text/html", "application/xhtml+xml", "text/plain",
+                    "text/xml", "application/xml")
+    SOURCE_ENCODINGS = ("identity", "gzip", "x-gzip", "deflate")
+
     def __init__(self, site):
         self._search_config = site._search_config
         self._exclusions_db = self._search_config.get("exclusions_db")
+        self._source_cache = self._search_config.get("source_cache")
+        self._search_cache = self._search_config.get("search_cache")
         self._opener = build_opener()
         self._opener.addheaders = site._opener.addheaders
 
-    def _open_url_ignoring_errors(self, url):
-        """Open a URL using self._opener and return its content, or None.
+    def _open_url_ignoring_errors(self, url, headers=None, outcome=None):
+        """Open a URL using self._opener and return a response tuple, or None.
+
+        Returns a tuple of the response's status code, its headers, and an
+        iterator over its content (see :py:meth:`_read_response`). *headers*
+        is an optional dict of extra request headers; if they make the request
+        conditional and the server replies with ``304 Not Modified``, the
+        content is ``None``. *outcome* is passed on to
+        :py:meth:`_read_response`.
 
-        Will decompress the content if the headers contain "gzip" as its
-        content encoding, and will return None if URLError is raised while
-        opening the URL. IOErrors while gunzipping a compressed response are
-        ignored, and the original content is returned.
+        Will return None if URLError is raised while opening the URL, and
+        without reading the content if its type isn't one of
+        :py:attr:`SOURCE_TYPES` (so we don't download PDFs and videos only to
+        find no text in them) or it's compressed in a way we don't understand.
         """
+        request = Request(url.encode("utf8"), headers=headers or {})
         try:
-            response = self._opener.open(url.encode("utf8"), timeout=5)
+            response = self._opener.open(request, timeout=5)
+        except HTTPError as exc:
+            if exc.code == 304:
+                return exc.code, exc.headers, None
+            return None
         except (URLError, timeout):
             return None
-        result = response.read()
 
-        if response.headers.get("Content-Encoding") == "gzip":
-            stream = StringIO(result)
-            gzipper = GzipFile(fileobj=stream)
-            try:
-                result = gzipper.read()
-            except IOError:
-                pass
+        ctype = response.headers.gettype()
+        encoding = response.headers.get("Content-Encoding", "identity")
+        if (ctype not in self.SOURCE_TYPES or
+                encoding.lower() not in self.SOURCE_ENCODINGS):
+            log = u"Skipping {0} ({1}, {2})".format(url, ctype, encoding)
+            self._logger.debug(log)
+            response.close()
+            return None
+        content = self._read_response(response, outcome)
+        return response.code, response.headers, content
+
+    def _read_response(self, response, outcome=None):
+        """Iterate over a response's content in chunks, as it's downloaded.
+
+        Content compressed with gzip or deflate is decompressed as it arrives.
+        We stop once we have our search config's ``max_download_size`` bytes
+        of (decompressed) content, 2 MiB by default, or -1 for no limit; the
+        response is closed when we're done. Network errors are raised as
+        :py:exc:`IOError`, :py:exc:`httplib.HTTPException`, or (for garbled
+        compressed content) :py:exc:`zlib.error`.
+
+        If *outcome* (a
+        :py:class:`~earwigbot.wiki.copyvios.result.CopyvioSourceResult`) is
+        given, the bytes we download and the time we spend waiting for them are
+        added to it.
+        """
+        remaining = self._search_config.get("max_download_size", 2 * 1024 ** 2)
+        encoding = response.headers.get("Content-Encoding", "identity").lower()
+        if encoding != "identity":  # Accept both gzip and zlib headers
+            decompressor = zlib.decompressobj(32 + zlib.MAX_WBITS)
+        else:
+            decompressor = None
 
-        return result
+        try:
+            while remaining:
+                start = time()
+                chunk = response.read(64 * 1024)
+                if not decompressor:
+                    data = chunk
+                elif chunk:
+                    data = decompressor.decompress(chunk, max(remaining, 0))
+                else:
+                    data = decompressor.flush()
+                if remaining > 0:
+                    data = data[:remaining]
+                    remaining -= len(data)
+                if outcome:
+                    outcome.size += len(chunk)
+                    outcome.add_time("fetch", time() - start)
+                if data:
+                    yield data
+                if not chunk:
+                    break
+        finally:
+            response.close()
+
+    def _get_source_text(self, url, outcome=None):
+        """Return the text of the source at the given URL, or None.
+
+        If we have a source cache, fresh copies of the source are taken from
+        it instead of being downloaded, and stale ones are revalidated with
+        the server if they have an ``ETag`` or ``Last-Modified`` header, so
+        they're only downloaded again if they've changed. The source's text is
+        extracted with the HTML engine named by our search config's
+        ``extractor`` (see :py:class:`~.HTMLTextParser`), which is fed the
+        source as it's being downloaded; the ``charset`` of its
+        ``Content-Type`` header, if any, takes precedence over the one the
+        source declares itself.
+
+        If *outcome* (a
+        :py:class:`~earwigbot.wiki.copyvios.result.CopyvioSourceResult`) is
+        given, the bytes downloaded and the time spent fetching and parsing
+        the source are added to it.
+        """
+        outcome = outcome or CopyvioSourceResult(url)
+        start = time()
+        cache = self._source_cache
+        cached = cache.get(url) if cache else None
+        if cached and cached.fresh:
+            outcome.add_time("fetch", time() - start)
+            return cached.text
+
+        headers = {}
+        if cached and cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached and cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+        response = self._open_url_ignoring_errors(url, headers, outcome)
+        outcome.add_time("fetch", time() - start)
+        if not response:
+            return None
+        code, info, content = response
+        if code == 304 and cached:
+            cache.revalidate(url)
+            return cached.text
+        if content is None:
+            return None
+
+        engine = self._search_config.get("extractor", "bs4")
+        charset = info.getparam("charset")
+        fetched, start = outcome.timings["fetch"], time()
+        try:
+            text = HTMLTextParser.strip_stream(content, engine, charset)
+        except (IOError, HTTPException, zlib.error):
+            return None
+        finally:  # The content is downloaded while it's parsed
+            reading = outcome.timings["fetch"] - fetched
+            outcome.add_time("parse", time() - start - reading)
+        if cache:
+            etag, modified = info.get("ETag"), info.get("Last-Modified")
+            cache.put(url, text, etag, modified)
+        return text
 
     def _select_search_engine(self):
         """Return a function that can be called to do web searches.
@@ -102,19 +229,67 @@ class CopyvioMixIn(object):
 
         raise exceptions.UnknownSearchEngineError(engine)
 
-    def _copyvio_compare_content(self, article, url):
+    def _copyvio_compare_content(self, article, url, get_source=None,
+                                 prefilter=None, outcomes=None):
         """Return a number comparing an article and a URL.
 
         The *article* is a Markov chain, whereas the *url* is just a string
-        that we'll try to open and read ourselves.
+        that we'll try to open and read ourselves. If *get_source* is given,
+        it's called with the URL and a
+        :py:class:`~earwigbot.wiki.copyvios.result.CopyvioSourceResult` to get
+        the source (a
+        :py:class:`~earwigbot.wiki.copyvios.workers.CopyvioSource`, or
+        ``None``) instead, so it can be shared with other checks; it's called
+        again with ``True`` as a third argument if the source must be fetched
+        anew, since another check rejected it before its chain was built. If
+        *prefilter* is given, it's called with the source's fingerprint, and
+        if it returns ``False``, the source is skipped without building its
+        chain.
+
+        If *outcomes* is given, it's a dict that the comparison's
+        :py:class:`~earwigbot.wiki.copyvios.result.CopyvioSourceResult` is
+        stored in, keyed by the URL; its status is set once it's done.
         """
-        html = self._open_url_ignoring_errors(url)
-        if not html:
+        outcome = CopyvioSourceResult(url)
+        if outcomes is not None:
+            outcomes[url] = outcome
+        if get_source:
+            source = get_source(url, outcome)
+        else:
+            text = self._get_source_text(url, outcome)
+            source = CopyvioSource(url, text) if text is not None else None
+        if source is None:
+            outcome.status = "unavailable"
             return 0, ()
-
-        source = MarkovChain(HTMLTextParser(html).strip())
-        delta = MarkovChainIntersection(article, source)
-        return float(delta.size()) / article.size(), (source, delta)
+        if prefilter:
+            start = time()
+            could_match = prefilter(source.fingerprint)
+            outcome.add_time("prefilter", time() - start)
+            if not could_match:
+                source.reject()
+                outcome.status = "skipped"
+                return 0, ()
+
+        start = time()
+        chain = source.chain
+        outcome.add_time("chain", time() - start)
+        if chain is None and get_source:
+            # Another check's prefilter rejected the source and dropped its
+            # text, so we need to get it again:
+            source = get_source(url, outcome, True)
+            start = time()
+            chain = source.chain if source else None
+            outcome.add_time("chain", time() - start)
+        if chain is None:
+            outcome.status = "unavailable"
+            return 0, ()
+        start = time()
+        delta = MarkovChainIntersection(article, chain)
+        confidence = float(delta.size()) / article.size()
+        outcome.add_time("compare", time() - start)
+        outcome.confidence = confidence
+        outcome.status = "compared"
+        return confidence, (chain, delta)
 
     def copyvio_check(self, min_confidence=0.5, max_queries=-1, max_time=-1,
                       interquery_sleep=1):
@@ -126,83 +301,231 @@ class CopyvioMixIn(object):
 
         *max_queries* is self-explanatory; we will never make more than this
         number of queries in a given check. If it's lower than 0, we will not
-        limit the number of queries.
+        limit the number of queries. If our search config has a
+        ``search_cache`` (a
+        :py:class:`~earwigbot.wiki.copyvios.searchcache.SearchCache`), queries
+        whose results are already cached don't count towards this limit, and
+        aren't subject to *interquery_sleep*; only queries actually sent to
+        the search engine are reported in the result.
 
         *max_time* can be set to prevent copyvio checks from taking longer than
         a set amount of time (generally around a minute), which can be useful
         if checks are called through a web server with timeouts. We will stop
-        checking new URLs as soon as this limit is reached.
+        checking new URLs as soon as this limit is reached. If it's lower than
+        0, we will not limit the time taken.
+
+        Searching is pipelined with comparing: the search engine is queried
+        for the next chunk of the article (still at most once every
+        *interquery_sleep* seconds) while the previous chunk's URLs are being
+        compared, so there may be one more query than strictly needed. Chunks
+        we've already searched for, and URLs we've already seen, are skipped.
+
+        Source URLs are downloaded and compared in parallel by a
+        :py:class:`~earwigbot.wiki.copyvios.workers.CopyvioWorkspace`, using up
+        to ``workers`` threads (``domain_workers`` per domain) as given in our
+        search config. Once a URL reaches *min_confidence*, no more queries
+        are made and the rest of its query's URLs are still compared; the
+        match is the most similar URL, with ties going to the earlier search
+        result. Unless *max_time* runs out, this is always the same result a
+        one-at-a-time check would give.
+
+        If our search config has a ``source_cache`` (a
+        :py:class:`~earwigbot.wiki.copyvios.sourcecache.SourceCache`), sources
+        seen in recent checks are taken from it rather than downloaded again.
+
+        If our search config has a ``prefilter_error``, sources are first
+        compared with the article by a
+        :py:class:`~earwigbot.wiki.copyvios.fingerprint.Prefilter`, which
+        skips those obviously too different to reach *min_confidence*. A
+        source that would have matched is skipped with a probability of at
+        most ``prefilter_error``, but the confidence of a non-violation may be
+        reported lower than it really is, since skipped sources count as 0.
 
         *interquery_sleep* is the minimum amount of time we will sleep between
         search engine queries, in seconds.
 
+        The result also says where the check's time went (its
+        :py:attr:`~earwigbot.wiki.copyvios.result.CopyvioCheckResult.timings`),
+        how many bytes were downloaded, and what happened to each source URL.
+        If our search config has a ``metrics_sink`` (a
+        :py:class:`~earwigbot.wiki.copyvios.metrics.BaseMetricsSink`), the
+        result is also given to it, so checks can be measured in aggregate.
+
         Raises :py:exc:`~earwigbot.exceptions.CopyvioCheckError` or subclasses
         (:py:exc:`~earwigbot.exceptions.UnknownSearchEngineError`,
         :py:exc:`~earwigbot.exceptions.SearchQueryError`, ...) on errors.
         """
+        searcher = SearchScheduler(self._select_search_engine(),
+                                   self._search_cache, interquery_sleep)
+        return self._copyvio_check(searcher, min_confidence, max_queries,
+                                   max_time)
+
+    def _get_prefilter(self, min_confidence):
+        """Return a new Prefilter as our search config asks, or ``None``."""
+        error = self._search_config.get("prefilter_error")
+        return Prefilter(min_confidence, error) if error else None
+
+    def _record_metrics(self, result):
+        """Give a check's result to our search config's metrics sink, if any.
+
+        Errors in the sink are logged, but don't fail the check.
+        """
+        sink = self._search_config.get("metrics_sink")
+        if not sink:
+            return
+        try:
+            sink.record(self, result)
+        except Exception:
+            log = u"Couldn't record copyvio metrics for [[{0}]]"
+            self._logger.exception(log.format(self.title))
+
+    def _copyvio_check(self, searcher, min_confidence, max_queries, max_time,
+                       get_source=None, prefilter=None):
+        """Check the page for copyright violations; see :py:meth:`copyvio_check`.
+
+        *searcher* is the
+        :py:class:`~earwigbot.wiki.copyvios.search.SearchScheduler` to send
+        our queries through, *get_source* is passed on to
+        :py:meth:`_copyvio_compare_content`, and *prefilter* is the
+        :py:class:`~earwigbot.wiki.copyvios.fingerprint.Prefilter` to use, if
+        any, instead of making our own; a
+        :py:class:`~earwigbot.wiki.copyvios.batch.CopyvioBatch` shares them
+        between the checks of its pages.
+        """
         start_time = time()
-        searcher = self._select_search_engine()
+        timings = defaultdict(float)
         if self._exclusions_db:
             self._exclusions_db.sync(self.site.name)
-        handled_urls = []
-        best_confidence = 0
-        best_match = None
-        num_queries = 0
-        empty = MarkovChain("")
+            timings["exclusions"] += time() - start_time
+        search_cache = self._search_cache
+        handled_urls = set()
+        num_queries = cached_queries = 0
+        empty = CompactMarkovChain("")
         best_chains = (empty, MarkovChainIntersection(empty, empty))
+        start = time()
         parser = ArticleTextParser(self.get())
         clean = parser.strip()
-        chunks = parser.chunk(self._search_config["nltk_dir"], max_queries)
-        article_chain = MarkovChain(clean)
-        last_query = time()
+        chunks = parser.chunk(self._search_config["nltk_dir"], max_queries,
+                              tokenizer=self._search_config.get("tokenizer",
+                                                                "nltk"))
+        timings["parse"] += time() - start
+        start = time()
+        article_chain = CompactMarkovChain(clean)
+        timings["chain"] += time() - start
 
         if article_chain.size() < 20:  # Auto-fail very small articles
-            return CopyvioCheckResult(False, best_confidence, best_match,
-                                      num_queries, 0, article_chain,
-                                      best_chains)
-
-        while (chunks and best_confidence < min_confidence and
-               (max_queries < 0 or num_queries < max_queries)):
-            chunk = chunks.pop(0)
-            log = u"[[{0}]] -> querying {1} for {2!r}"
-            self._logger.debug(log.format(self.title, searcher.name, chunk))
-            urls = searcher.search(chunk)
-            urls = [url for url in urls if url not in handled_urls]
-            for url in urls:
-                handled_urls.append(url)
+            result = CopyvioCheckResult(False, 0, None, num_queries, 0,
+                                        article_chain, best_chains,
+                                        dict(timings))
+            self._record_metrics(result)
+            return result
+
+        own_prefilter = None
+        if not prefilter:
+            prefilter = own_prefilter = self._get_prefilter(min_confidence)
+        could_match = None
+        if prefilter:
+            start = time()
+            article_fp = Fingerprint(clean)
+            timings["prefilter"] += time() - start
+            could_match = partial(prefilter.could_match, article_fp)
+        outcomes = {}
+        compare = partial(self._copyvio_compare_content, article_chain,
+                          get_source=get_source, prefilter=could_match,
+                          outcomes=outcomes)
+        workspace = CopyvioWorkspace(
+            compare, min_confidence, max_time,
+            self._search_config.get("workers", 8),
+            self._search_config.get("domain_workers", 2))
+        searched_chunks = set()
+        considered = []  # Every new URL, in order, with whether it's excluded
+        try:
+            while (chunks and not workspace.found and
+                   (max_queries < 0 or num_queries < max_queries)):
+                chunk = chunks.pop(0)
+                if chunk in searched_chunks:
+                    continue
+                searched_chunks.add(chunk)
+                start = time()
+                urls, sent = searcher.search(chunk, lambda: workspace.found)
+                timings["search"] += time() - start
+                if urls is None:  # Found while we were waiting to search
+                    break
+                if sent:
+                    num_queries += 1
+                    log = u"[[{0}]] -> queried {1} for {2!r}"
+                else:
+                    cached_queries += 1
+                    log = u"[[{0}]] -> using cached {1} results for {2!r}"
+                self._logger.debug(log.format(self.title, searcher.name,
+                                              chunk))
+                urls = [url for url in urls if url not in handled_urls]
+                handled_urls.update(urls)
+                excluded = ()
                 if self._exclusions_db:
-                    if self._exclusions_db.check(self.site.name, url):
-                        continue
-                conf, chns = self._copyvio_compare_content(article_chain, url)
-                if conf > best_confidence:
-                    best_confidence = conf
-                    best_match = url
-                    best_chains = chns
-                if time() - start_time > max_time:
+                    start = time()
+                    excluded = self._exclusions_db.check_many(self.site.name,
+                                                              urls)
+                    timings["exclusions"] += time() - start
+                considered.extend((url, url in excluded) for url in urls)
+                urls = [url for url in urls if url not in excluded]
+                if not urls:
+                    log = u"[[{0}]] -> no new URLs for {1!r}; skipping"
+                    self._logger.debug(log.format(self.title, chunk))
+
+                # The previous query's URLs have been compared while we were
+                # searching; wait for them to finish before the next search,
+                # but leave this query's URLs to run in the meantime:
+                previous = workspace.queued
+                workspace.enqueue(urls)
+                if not workspace.wait(previous):  # Out of time
                     break
-            num_queries += 1
-            if time() - start_time > max_time:
-                break
-            diff = time() - last_query
-            if diff < interquery_sleep:
-                sleep(interquery_sleep - diff)
-            last_query = time()
+            timed_out = not workspace.wait()
+        finally:
+            workspace.stop()
 
+        best_confidence, best_match, chains = workspace.best
+        if chains:
+            best_chains = chains
         ctime = time() - start_time
         if best_confidence >= min_confidence:
             is_violation = True
-            log = u"Violation detected for [[{0}]] (confidence: {1}; URL: {2}; using {3} queries in {4} seconds)"
+            log = u"Violation detected for [[{0}]] (confidence: {1}; URL: {2}; using {3} queries and {4} cached in {5} seconds)"
             self._logger.debug(log.format(self.title, best_confidence,
-                                          best_match, num_queries, ctime))
+                                          best_match, num_queries,
+                                          cached_queries, ctime))
         else:
             is_violation = False
-            log = u"No violation for [[{0}]] (confidence: {1}; using {2} queries in {3} seconds)"
+            log = u"No violation for [[{0}]] (confidence: {1}; using {2} queries and {3} cached in {4} seconds)"
             self._logger.debug(log.format(self.title, best_confidence,
-                                          num_queries, ctime))
-
-        return CopyvioCheckResult(is_violation, best_confidence, best_match,
-                                  num_queries, ctime, article_chain,
-                                  best_chains)
+                                          num_queries, cached_queries, ctime))
+        if search_cache:
+            hit_rate = search_cache.get_stats()["hit_rate"]
+            log = u"Search cache hit rate: {0:.1%}".format(hit_rate)
+            self._logger.debug(log)
+        if own_prefilter:
+            stats = own_prefilter.get_stats()
+            log = u"Prefilter skipped {0} of {1} sources".format(
+                stats["skipped"], stats["checked"])
+            self._logger.debug(log)
+
+        sources = []
+        unfinished = "timeout" if timed_out else "cancelled"
+        for url, is_excluded in considered:
+            outcome = outcomes.get(url)
+            if is_excluded:
+                outcome = CopyvioSourceResult(url, "excluded")
+            elif not outcome or not outcome.status:
+                outcome = CopyvioSourceResult(url, unfinished)
+            for phase, seconds in outcome.timings.iteritems():
+                timings[phase] += seconds
+            sources.append(outcome)
+
+        result = CopyvioCheckResult(is_violation, best_confidence, best_match,
+                                    num_queries, ctime, article_chain,
+                                    best_chains, dict(timings), sources)
+        self._record_metrics(result)
+        return result
 
     def copyvio_compare(self, url, min_confidence=0.5):
         """Check the page like :py:meth:`copyvio_check` against a specific URL.
@@ -220,23 +543,39 @@ class CopyvioMixIn(object):
         time-and-money-consuming search engine queries. However, the comparison
         itself (which includes the article's and the source's content) cannot
         be stored for data retention reasons, so a fresh comparison is made
-        using this function.
+        using this function. The source's text is only kept on disk if our
+        search config has a ``source_cache``, which must be enabled
+        explicitly with the ``source_cache_size`` setting.
 
         Since no searching is done, neither
         :py:exc:`~earwigbot.exceptions.UnknownSearchEngineError` nor
-        :py:exc:`~earwigbot.exceptions.SearchQueryError` will be raised.
+        :py:exc:`~earwigbot.exceptions.SearchQueryError` will be raised. The
+        result's timings and its one source are recorded like
+        :py:meth:`copyvio_check`'s.
         """
         start_time = time()
+        timings = defaultdict(float)
         content = self.get()
         clean = ArticleTextParser(content).strip()
-        article_chain = MarkovChain(clean)
+        timings["parse"] += time() - start_time
+        start = time()
+        article_chain = CompactMarkovChain(clean)
+        timings["chain"] += time() - start
 
         if not url:
-            empty = MarkovChain("")
+            empty = CompactMarkovChain("")
             chns = (empty, MarkovChainIntersection(empty, empty))
-            return CopyvioCheckResult(False, 0, url, 0, 0, article_chain, chns)
-
-        confidence, chains = self._copyvio_compare_content(article_chain, url)
+            result = CopyvioCheckResult(False, 0, url, 0, 0, article_chain,
+                                        chns, dict(timings))
+            self._record_metrics(result)
+            return result
+
+        outcomes = {}
+        confidence, chains = self._copyvio_compare_content(
+            article_chain, url, outcomes=outcomes)
+        outcome = outcomes[url]
+        for phase, seconds in outcome.timings.iteritems():
+            timings[phase] += seconds
         ctime = time() - start_time
         if confidence >= min_confidence:
             is_violation = True
@@ -247,5 +586,8 @@ class CopyvioMixIn(object):
             log = u"No violation for [[{0}]] (confidence: {1}; URL: {2}; {3} seconds)"
             self._logger.debug(log.format(self.title, confidence, url, ctime))
 
-        return CopyvioCheckResult(is_violation, confidence, url, 0, ctime,
-                                  article_chain, chains)
+        result = CopyvioCheckResult(is_violation, confidence, url, 0, ctime,
+                                    article_chain, chains, dict(timings),
+                                    [outcome])
+        self._record_metrics(result)
+        return result
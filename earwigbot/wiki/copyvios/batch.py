@@ -0,0 +1,253 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import OrderedDict
+from functools import partial
+from Queue import Queue
+import sys
+from threading import Event, Lock, Thread
+
+from earwigbot import exceptions
+from earwigbot.wiki.copyvios.search import SearchScheduler
+from earwigbot.wiki.copyvios.workers import CopyvioSource
+
+__all__ = ["CopyvioBatch"]
+
+class CopyvioBatch(object):
+    """
+    **EarwigBot: Wiki Toolset: Copyvio Batch**
+
+    Checks many of a :py:class:`~earwigbot.wiki.site.Site`'s pages for
+    copyright violations at once. Iterating over the batch gives a
+    ``(page, result)`` tuple for each page as soon as its check finishes, in
+    no particular order, where *result* is the
+    :py:class:`~earwigbot.wiki.copyvios.result.CopyvioCheckResult` that
+    :py:meth:`~earwigbot.wiki.copyvios.CopyvioMixIn.copyvio_check` would have
+    given with the same arguments. Usually made with
+    :py:meth:`Site.copyvio_check_many()
+    <earwigbot.wiki.site.Site.copyvio_check_many>`.
+
+    *pages* is a list of :py:class:`~earwigbot.wiki.page.Page` objects or
+    titles; their content is loaded in bulk before checking begins. Up to
+    *workers* pages are checked at once, and the work they have in common is
+    only done once: the search engine and the exclusions database are set up
+    for the whole batch, each distinct query is sent once (at most once every
+    *interquery_sleep* seconds across the batch), and each distinct source URL
+    is downloaded and parsed once and compared against every article that
+    turned it up. The *max_sources* most recently used sources (with their
+    Markov chains and fingerprints, once built) are kept in memory for this;
+    older ones come from the source cache, if there is one. If the search
+    config enables the prefilter, one
+    :py:class:`~earwigbot.wiki.copyvios.fingerprint.Prefilter` is shared by
+    the whole batch; sources it skips keep only their fingerprints, and are
+    fetched again (usually from the source cache) if another page's check
+    needs their chains.
+
+    Pages that are missing or invalid are logged and skipped. Any other error
+    stops the batch and is raised while iterating.
+    """
+
+    def __init__(self, site, pages, min_confidence=0.5, max_queries=-1,
+                 max_time=-1, interquery_sleep=1, workers=4,
+                 max_sources=1024):
+        self._site = site
+        self._pages = list(pages)
+        self._min_confidence = min_confidence
+        self._max_queries = max_queries
+        self._max_time = max_time
+        self._interquery_sleep = interquery_sleep
+        self._num_workers = max(workers, 1)
+        self._max_sources = max_sources
+        self._logger = site._logger
+
+        self._sources = OrderedDict()  # URL -> CopyvioSource, or None
+        self._pending = {}  # URL -> Event set once it's done
+        self._lock = Lock()
+        self._stopped = False
+        self._stats = {"pages": 0, "skipped": 0, "sources_fetched": 0,
+                       "sources_shared": 0}
+        self._searcher = None
+        self._prefilter = None
+
+    def __repr__(self):
+        """Return the canonical string representation of the CopyvioBatch."""
+        res = "CopyvioBatch(site={0!r}, pages={1!r}, min_confidence={2!r}, max_queries={3!r}, max_time={4!r}, interquery_sleep={5!r}, workers={6!r}, max_sources={7!r})"
+        return res.format(self._site, self._pages, self._min_confidence,
+                          self._max_queries, self._max_time,
+                          self._interquery_sleep, self._num_workers,
+                          self._max_sources)
+
+    def __str__(self):
+        """Return a nice string representation of the CopyvioBatch."""
+        res = "<CopyvioBatch of {0} pages on {1}>"
+        return res.format(len(self._pages), self._site.name)
+
+    def __iter__(self):
+        """Check the pages, yielding ``(page, result)`` tuples as they finish.
+        """
+        return self.run()
+
+    def _load_pages(self):
+        """Return our pages as Page objects, with their content loaded."""
+        titles = [page for page in self._pages
+                  if isinstance(page, basestring)]
+        loaded = iter(self._site.get_pages(titles) if titles else [])
+        pages = [next(loaded) if isinstance(page, basestring) else page
+                 for page in self._pages]
+        unloaded = [page for page in pages if page._content is None]
+        if unloaded:
+            self._site._query_pages(unloaded, content=True)
+        return pages
+
+    def _get_source(self, page, url, outcome=None, refetch=False):
+        """Return the :py:class:`~.CopyvioSource` at *url*, or ``None``.
+
+        The source is downloaded by *page* if nobody else has done it yet, and
+        the download is added to its *outcome*; if someone else is doing it
+        right now, we wait for them to finish. If *refetch* is ``True``, our
+        copy of the source is replaced by a new one, since its text has been
+        dropped.
+        """
+        while True:
+            with self._lock:
+                stale = self._sources.get(url)
+                if refetch and stale and stale.rejected:
+                    del self._sources[url]
+                if url in self._sources:
+                    source = self._sources.pop(url)
+                    self._sources[url] = source  # Most recently used
+                    self._stats["sources_shared"] += 1
+                    return source
+                event = self._pending.get(url)
+                if not event:
+                    event = self._pending[url] = Event()
+                    break
+            event.wait()
+
+        try:
+            text = page._get_source_text(url, outcome)
+            source = CopyvioSource(url, text) if text is not None else None
+            with self._lock:
+                self._sources[url] = source
+                while len(self._sources) > self._max_sources:
+                    self._sources.popitem(last=False)
+                self._stats["sources_fetched"] += 1
+            return source
+        finally:
+            with self._lock:
+                del self._pending[url]
+            event.set()
+
+    def _check(self, page):
+        """Check one page, using our shared searcher and sources."""
+        get_source = partial(self._get_source, page)
+        return page._copyvio_check(self._searcher, self._min_confidence,
+                                   self._max_queries, self._max_time,
+                                   get_source, self._prefilter)
+
+    def _work(self, pages, results):
+        """Main loop for a worker thread: check pages until none are left."""
+        while True:
+            with self._lock:
+                if self._stopped or not pages:
+                    return
+                page = pages.pop(0)
+            try:
+                results.put((page, self._check(page), None))
+            except Exception:
+                results.put((page, None, sys.exc_info()))
+
+    def run(self):
+        """Check the pages, yielding ``(page, result)`` tuples as they finish.
+
+        This is what iterating over the batch does. Raises
+        :py:exc:`~earwigbot.exceptions.CopyvioCheckError` or subclasses on
+        errors, like
+        :py:meth:`~earwigbot.wiki.copyvios.CopyvioMixIn.copyvio_check`.
+        """
+        pages = self._load_pages()
+        if not pages:
+            return
+        first = pages[0]
+        self._searcher = SearchScheduler(first._select_search_engine(),
+                                         first._search_cache,
+                                         self._interquery_sleep)
+        self._prefilter = first._get_prefilter(self._min_confidence)
+        if first._exclusions_db:
+            first._exclusions_db.sync(self._site.name)
+
+        results = Queue()
+        remaining = list(pages)
+        self._stopped = False
+        for i in xrange(min(self._num_workers, len(pages))):
+            name = "copyvio-batch-{0}".format(i)
+            thread = Thread(target=self._work, args=(remaining, results),
+                            name=name)
+            thread.daemon = True
+            thread.start()
+
+        try:
+            for i in xrange(len(pages)):
+                page, result, exc_info = results.get()
+                if exc_info and issubclass(exc_info[0], (
+                        exceptions.PageNotFoundError,
+                        exceptions.InvalidPageError)):
+                    log = u"Skipping [[{0}]] in copyvio batch: {1}"
+                    self._logger.warn(log.format(page.title, exc_info[1]))
+                    self._stats["skipped"] += 1
+                    continue
+                if exc_info:  # Keep the worker's traceback
+                    raise exc_info[0], exc_info[1], exc_info[2]
+                self._stats["pages"] += 1
+                yield page, result
+        finally:
+            with self._lock:
+                self._stopped = True
+
+        stats = self.get_stats()
+        log = u"Checked {0} pages in batch ({1} queries sent, {2} reused; {3} sources fetched, {4} reused; {5} comparisons skipped)"
+        self._logger.info(log.format(
+            stats["pages"], stats["queries_sent"], stats["queries_reused"],
+            stats["sources_fetched"], stats["sources_shared"],
+            stats["comparisons_skipped"]))
+
+    def get_stats(self):
+        """Return a dict of statistics about the work the batch has done.
+
+        The dict contains the number of ``pages`` checked and ``skipped``, the
+        number of search queries sent to the search engine
+        (``queries_sent``) and the number answered from the search cache or
+        from other pages' queries (``queries_reused``), and the number of
+        sources downloaded (``sources_fetched``, including those taken from
+        the source cache) and those shared with other pages
+        (``sources_shared``), and the number of comparisons skipped by the
+        prefilter (``comparisons_skipped``).
+        """
+        with self._lock:
+            stats = self._stats.copy()
+        searched = self._searcher.get_stats() if self._searcher else {}
+        stats["queries_sent"] = searched.get("sent", 0)
+        stats["queries_reused"] = (searched.get("cached", 0) +
+                                   searched.get("remembered", 0))
+        filtered = self._prefilter.get_stats() if self._prefilter else {}
+        stats["comparisons_skipped"] = filtered.get("skipped", 0)
+        return stats
@@ -22,7 +22,7 @@
 
 import re
 import sqlite3 as sqlite
-from threading import Lock
+from threading import Lock, Thread
 from time import time
 from urlparse import urlparse
 
@@ -42,12 +42,61 @@ default_sources = {
     ]
 }
 
+class _ExclusionIndex(object):
+    """An in-memory index of a site's exclusions, for matching URLs quickly.
+
+    Exclusions starting with ``*.`` match their domain and all of its
+    subdomains, and are stored in a trie of domain labels, last label first.
+    Every other exclusion matches URLs starting with it (ignoring the
+    scheme), and is stored in a set along with the lengths of all such
+    prefixes, so a URL is only compared against prefixes of those lengths.
+    """
+
+    def __init__(self, exclusions):
+        self._prefixes = set()
+        self._domains = {}
+        for excl in exclusions:
+            if excl.startswith("*."):
+                node = self._domains
+                for label in reversed(excl[2:].split(".")):
+                    node = node.setdefault(label, {})
+                node[None] = True  # Marks the end of a domain
+            else:
+                self._prefixes.add(excl)
+        self._lengths = sorted(set(len(prefix) for prefix in self._prefixes))
+
+    def matches(self, url):
+        """Return whether the given URL is excluded."""
+        url = url.lower()
+        normalized = re.sub("https?://", "", url)
+        for length in self._lengths:
+            if length > len(normalized):
+                break
+            if normalized[:length] in self._prefixes:
+                return True
+
+        node = self._domains
+        for label in reversed((urlparse(url).hostname or "").split(".")):
+            node = node.get(label)
+            if node is None:
+                return False
+            if None in node:
+                return True
+        return False
+
+
 class ExclusionsDB(object):
     """
     **EarwigBot: Wiki Toolset: Exclusions Database Manager**
 
     Controls the :file:`exclusions.db` file, which stores URLs excluded from
     copyright violation checks on account of being known mirrors, for example.
+
+    URLs are checked against an in-memory index of each site's exclusions,
+    which is only rebuilt when the database has been updated. The database is
+    accessed through a single persistent connection in WAL mode, and the time
+    of each site's last update is remembered after it is first read. If
+    updating a stale database fails, we wait an hour before trying again.
     """
 
     def __init__(self, sitesdb, dbfile, logger):
@@ -55,6 +104,11 @@ class ExclusionsDB(object):
         self._dbfile = dbfile
         self._logger = logger
         self._db_access_lock = Lock()
+        self._conn = None
+        self._last_updates = {}  # Site name -> UNIX time of last update
+        self._refreshing = set()  # Sites currently being updated
+        self._failures = {}  # Site name -> UNIX time of last failed update
+        self._indexes = {}  # Site name -> _ExclusionIndex
 
     def __repr__(self):
         """Return the canonical string representation of the ExclusionsDB."""
@@ -65,31 +119,51 @@ class ExclusionsDB(object):
         """Return a nice string representation of the ExclusionsDB."""
         return "<ExclusionsDB at {0}>".format(self._dbfile)
 
-    def _create(self):
+    def _create(self, conn):
         """Initialize the exclusions database with its necessary tables."""
         script = """
-            CREATE TABLE sources (source_sitename, source_page);
+            CREATE TABLE sources (source_sitename, source_page, source_revid,
+                                  source_urls);
             CREATE TABLE updates (update_sitename, update_time);
             CREATE TABLE exclusions (exclusion_sitename, exclusion_url);
         """
-        query = "INSERT INTO sources VALUES (?, ?);"
+        query = """INSERT INTO sources (source_sitename, source_page)
+                   VALUES (?, ?);"""
         sources = []
         for sitename, pages in default_sources.iteritems():
             for page in pages:
                 sources.append((sitename, page))
 
-        with sqlite.connect(self._dbfile) as conn:
+        with conn:
             conn.executescript(script)
             conn.executemany(query, sources)
 
-    def _load_source(self, site, source):
-        """Load from a specific source and return a set of URLs."""
-        urls = set()
-        try:
-            data = site.get_page(source).get()
-        except exceptions.PageNotFoundError:
-            return urls
+    def _get_conn(self):
+        """Return our connection to the database, opening it if necessary.
+
+        The database is created if it doesn't exist, and databases from before
+        we tracked the revisions of sources are upgraded. Must be called with
+        the database access lock held.
+        """
+        if not self._conn:
+            query = """SELECT 1 FROM sqlite_master
+                       WHERE type = 'table' AND name = 'updates'"""
+            conn = sqlite.connect(self._dbfile, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            if not conn.execute(query).fetchone():
+                self._create(conn)
+            columns = [row[1] for row in
+                       conn.execute("PRAGMA table_info(sources)")]
+            if "source_revid" not in columns:
+                with conn:
+                    conn.execute("ALTER TABLE sources ADD COLUMN source_revid")
+                    conn.execute("ALTER TABLE sources ADD COLUMN source_urls")
+            self._conn = conn
+        return self._conn
 
+    def _parse_source(self, data):
+        """Parse the text of a source page and return a set of URLs."""
+        urls = set()
         regexes = [
             r"url\s*=\s*(?:\<nowiki\>)?(?:https?:)?(?://)?(.*?)(?:\</nowiki\>.*?)?\s*$",
             r"\*\s*Site:\s*(?:\[|\<nowiki\>)?(?:https?:)?(?://)?(.*?)(?:\].*?|\</nowiki\>.*?)?\s*$"
@@ -99,83 +173,211 @@ class ExclusionsDB(object):
             [urls.add(url.lower().strip()) for url in find if url.strip()]
         return urls
 
+    def _load_sources(self, site, sources):
+        """Load the given source pages and return the URLs listed on them.
+
+        *sources* is a dict mapping source page titles to the
+        ``(revid, urls)`` they had when they were last loaded (either may be
+        ``None``). The pages' latest revision IDs are looked up in bulk, and
+        only pages that have been edited since then are downloaded (also in
+        bulk) and parsed again. Returns a dict in the same format, with *urls*
+        as a set.
+        """
+        titles = sources.keys()
+        results = {}
+        changed = []
+        for title, page in zip(titles, site.get_pages(titles, content=False)):
+            try:
+                revid = page.lastrevid
+            except exceptions.PageNotFoundError:
+                results[title] = (None, set())
+                continue
+            old_revid, old_urls = sources[title]
+            if revid == old_revid and old_urls is not None:
+                old_urls = filter(None, old_urls.split("\n"))
+                results[title] = (revid, set(old_urls))
+            else:
+                changed.append(title)
+
+        for title, page in zip(changed, site.get_pages(changed)):
+            try:
+                urls = self._parse_source(page.get())
+                results[title] = (page.lastrevid, urls)
+            except exceptions.PageNotFoundError:
+                results[title] = (None, set())
+
+        log = u"Loaded {0} of {1} sources ({2} unchanged)"
+        self._logger.debug(log.format(len(changed), len(titles),
+                                      len(titles) - len(changed)))
+        return results
+
     def _update(self, sitename):
-        """Update the database from listed sources in the index."""
-        query1 = "SELECT source_page FROM sources WHERE source_sitename = ?"
+        """Update the database from listed sources in the index.
+
+        The sources are loaded without holding the database lock, so checks
+        can continue using the existing exclusions in the meantime.
+        """
+        query1 = """SELECT source_page, source_revid, source_urls FROM sources
+                    WHERE source_sitename = ?"""
         query2 = "SELECT exclusion_url FROM exclusions WHERE exclusion_sitename = ?"
         query3 = "DELETE FROM exclusions WHERE exclusion_sitename = ? AND exclusion_url = ?"
         query4 = "INSERT INTO exclusions VALUES (?, ?)"
         query5 = "SELECT 1 FROM updates WHERE update_sitename = ?"
         query6 = "UPDATE updates SET update_time = ? WHERE update_sitename = ?"
         query7 = "INSERT INTO updates VALUES (?, ?)"
+        query8 = """UPDATE sources SET source_revid = ?, source_urls = ?
+                    WHERE source_sitename = ? AND source_page = ?"""
 
         if sitename == "all":
             site = self._sitesdb.get_site("enwiki")
         else:
             site = self._sitesdb.get_site(sitename)
-        with sqlite.connect(self._dbfile) as conn, self._db_access_lock:
-            urls = set()
-            for (source,) in conn.execute(query1, (sitename,)):
-                urls |= self._load_source(site, source)
-            for (url,) in conn.execute(query2, (sitename,)):
-                if url in urls:
-                    urls.remove(url)
+        with self._db_access_lock:
+            conn = self._get_conn()
+            sources = dict((page, (revid, urls)) for (page, revid, urls)
+                           in conn.execute(query1, (sitename,)))
+
+        loaded = self._load_sources(site, sources)
+        urls = set()
+        for revid, source_urls in loaded.itervalues():
+            urls |= source_urls
+
+        with self._db_access_lock:
+            conn = self._get_conn()
+            with conn:
+                conn.executemany(query8, [
+                    (revid, u"\n".join(sorted(source_urls)), sitename, page)
+                    for page, (revid, source_urls) in loaded.iteritems()])
+                old = set(row[0] for row in conn.execute(query2, (sitename,)))
+                conn.executemany(query3, [(sitename, url)
+                                          for url in old - urls])
+                conn.executemany(query4, [(sitename, url)
+                                          for url in urls - old])
+                now = int(time())
+                if conn.execute(query5, (sitename,)).fetchone():
+                    conn.execute(query6, (now, sitename))
                 else:
-                    conn.execute(query3, (sitename, url))
-            conn.executemany(query4, [(sitename, url) for url in urls])
-            if conn.execute(query5, (sitename,)).fetchone():
-                conn.execute(query6, (int(time()), sitename))
-            else:
-                conn.execute(query7, (sitename, int(time())))
+                    conn.execute(query7, (sitename, now))
+            self._last_updates[sitename] = now
+
+        names = self._indexes.keys() if sitename == "all" else [sitename]
+        for name in names:
+            self._get_index(name, rebuild=True)
+
+    def _refresh(self, sitename, background=False):
+        """Update the database for *sitename*, which we've marked as busy.
+
+        In the *background*, errors are logged instead of being raised.
+        """
+        try:
+            self._update(sitename)
+        except Exception:
+            with self._db_access_lock:
+                self._failures[sitename] = time()
+            if not background:
+                raise
+            log = u"Couldn't update exclusions database for {0}"
+            self._logger.exception(log.format(sitename))
+        finally:
+            with self._db_access_lock:
+                self._refreshing.discard(sitename)
 
     def _get_last_update(self, sitename):
         """Return the UNIX timestamp of the last time the db was updated."""
         query = "SELECT update_time FROM updates WHERE update_sitename = ?"
-        with sqlite.connect(self._dbfile) as conn, self._db_access_lock:
-            try:
+        with self._db_access_lock:
+            if sitename not in self._last_updates:
+                conn = self._get_conn()
                 result = conn.execute(query, (sitename,)).fetchone()
-            except sqlite.OperationalError:
-                self._create()
-                return 0
-            return result[0] if result else 0
+                self._last_updates[sitename] = result[0] if result else 0
+            return self._last_updates[sitename]
 
     def sync(self, sitename):
         """Update the database if it hasn't been updated in the past day.
 
         This only updates the exclusions database for the *sitename* site.
+        Stale databases are updated in a background thread, and checks made
+        in the meantime use the exclusions we already have; only if the site
+        has never been updated do we wait for the update to finish. At most
+        one update runs for a site at a time, and if a background update
+        fails, we don't try again for an hour.
         """
         max_staleness = 60 * 60 * 24
-        time_since_update = int(time() - self._get_last_update(sitename))
+        retry_delay = 60 * 60
+        last_update = self._get_last_update(sitename)
+        time_since_update = int(time() - last_update)
         if time_since_update > max_staleness:
-            log = u"Updating stale database: {0} (last updated {1} seconds ago)"
-            self._logger.info(log.format(sitename, time_since_update))
-            self._update(sitename)
+            with self._db_access_lock:
+                busy = sitename in self._refreshing
+                failure = self._failures.get(sitename, 0)
+                backoff = last_update and time() - failure < retry_delay
+                if not busy and not backoff:
+                    self._refreshing.add(sitename)
+            if busy:
+                log = u"Database for {0} is already being updated"
+                self._logger.debug(log.format(sitename))
+            elif backoff:
+                log = u"Not updating stale database: {0} (last attempt failed {1} seconds ago)"
+                self._logger.debug(log.format(sitename, int(time() - failure)))
+            elif not last_update:
+                log = u"Creating database for {0}"
+                self._logger.info(log.format(sitename))
+                self._refresh(sitename)
+            else:
+                log = u"Updating stale database: {0} (last updated {1} seconds ago)"
+                self._logger.info(log.format(sitename, time_since_update))
+                thread = Thread(target=self._refresh, args=(sitename, True))
+                thread.name = "exclusionsdb-" + sitename
+                thread.daemon = True
+                thread.start()
         else:
             log = u"Database for {0} is still fresh (last updated {1} seconds ago)"
             self._logger.debug(log.format(sitename, time_since_update))
         if sitename != "all":
             self.sync("all")
 
+    def _get_index(self, sitename, rebuild=False):
+        """Return the _ExclusionIndex of the exclusions for *sitename*.
+
+        The index covers the site's own exclusions and those for all sites.
+        It's built the first time it's needed, and after that only if
+        *rebuild* is ``True`` (when the database has been updated).
+        """
+        if sitename in self._indexes and not rebuild:
+            return self._indexes[sitename]
+
+        query = """SELECT exclusion_url FROM exclusions
+                   WHERE exclusion_sitename = ? OR exclusion_sitename = ?"""
+        with self._db_access_lock:
+            conn = self._get_conn()
+            exclusions = [row[0] for row in conn.execute(
+                query, (sitename, "all"))]
+
+        index = _ExclusionIndex(exclusions)
+        self._indexes[sitename] = index
+        return index
+
     def check(self, sitename, url):
         """Check whether a given URL is in the exclusions database.
 
         Return ``True`` if the URL is in the database, or ``False`` otherwise.
         """
-        normalized = re.sub("https?://", "", url.lower())
-        query = """SELECT exclusion_url FROM exclusions
-                   WHERE exclusion_sitename = ? OR exclusion_sitename = ?"""
-        with sqlite.connect(self._dbfile) as conn, self._db_access_lock:
-            for (excl,) in conn.execute(query, (sitename, "all")):
-                if excl.startswith("*."):
-                    netloc = urlparse(url.lower()).netloc
-                    matches = True if excl[2:] in netloc else False
-                else:
-                    matches = True if normalized.startswith(excl) else False
-                if matches:
-                    log = u"Exclusion detected in {0} for {1}"
-                    self._logger.debug(log.format(sitename, url))
-                    return True
+        if self._get_index(sitename).matches(url):
+            log = u"Exclusion detected in {0} for {1}"
+            self._logger.debug(log.format(sitename, url))
+            return True
 
         log = u"No exclusions in {0} for {1}".format(sitename, url)
         self._logger.debug(log)
         return False
+
+    def check_many(self, sitename, urls):
+        """Check which of the given URLs are in the exclusions database.
+
+        Return the set of URLs in *urls* that are in the database.
+        """
+        index = self._get_index(sitename)
+        excluded = set(url for url in urls if index.matches(url))
+        log = u"{0} of {1} URLs excluded in {2}"
+        self._logger.debug(log.format(len(excluded), len(urls), sitename))
+        return excluded
@@ -0,0 +1,141 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import defaultdict
+from itertools import imap, izip
+from math import log, sqrt
+from threading import Lock
+
+from earwigbot.wiki.copyvios.markov import MarkovChain
+
+__all__ = ["Fingerprint", "Prefilter"]
+
+class Fingerprint(object):
+    """A small sample of the ngrams of a text, for estimating overlap cheaply.
+
+    The ngrams are the same as those of a
+    :py:class:`~earwigbot.wiki.copyvios.markov.MarkovChain` of the text, and
+    an ngram is sampled if its hash is divisible by *rate*, so about one in
+    *rate* of them are kept. Since the choice depends only on the ngram
+    itself, the same ngrams are sampled from every text they appear in, and
+    comparing two samples estimates how the full chains would compare. This
+    is the "0 mod p" selection of document fingerprinting; it's cheaper to
+    make than a chain because nothing but the sample is stored.
+
+    :py:attr:`counts` maps each sampled ngram's hash to its number of hits,
+    and :py:attr:`size` is their total.
+    """
+
+    def __init__(self, text, rate=8):
+        self.rate = rate
+        words = MarkovChain._get_words(text)
+        ngrams = izip(*[words[i:] for i in xrange(MarkovChain.degree)])
+        self.counts = counts = defaultdict(int)
+        for node in imap(hash, ngrams):
+            if not node % rate:
+                counts[node] += 1
+        self.size = sum(counts.itervalues())
+
+    def __repr__(self):
+        """Return the canonical string representation of the Fingerprint."""
+        return "Fingerprint(size={0!r}, rate={1!r})".format(self.size,
+                                                            self.rate)
+
+    def __str__(self):
+        """Return a nice string representation of the Fingerprint."""
+        return "<Fingerprint of size {0}>".format(self.size)
+
+    def estimate(self, other):
+        """Estimate the confidence of comparing our text against *other*'s.
+
+        That is, the fraction of our ngrams that also appear in the other
+        fingerprint's text, like the size of a
+        :py:class:`~earwigbot.wiki.copyvios.markov.MarkovChainIntersection`
+        divided by the size of our chain.
+        """
+        if not self.size:
+            return 0.0
+        shared = sum(min(count, other.counts.get(node, 0))
+                     for node, count in self.counts.iteritems())
+        return float(shared) / self.size
+
+
+class Prefilter(object):
+    """
+    **EarwigBot: Wiki Toolset: Copyvio Prefilter**
+
+    Decides whether a source is worth comparing against an article, using
+    their :py:class:`Fingerprint`\ s, so that sources that are obviously
+    unrelated don't need Markov chains built for them.
+
+    A source is skipped when its estimated confidence is so far below
+    *min_confidence* that a source really at *min_confidence* would give an
+    estimate that low with a probability of at most *error* (by Hoeffding's
+    inequality, treating the sampled ngrams as independent). Lower values of
+    *error* skip fewer sources; articles with small fingerprints are never
+    skipped, since their estimates are too uncertain to act on.
+    """
+
+    def __init__(self, min_confidence, error=0.001):
+        self._min_confidence = min_confidence
+        self._error = error
+        self._lock = Lock()
+        self._stats = {"checked": 0, "skipped": 0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the Prefilter."""
+        res = "Prefilter(min_confidence={0!r}, error={1!r})"
+        return res.format(self._min_confidence, self._error)
+
+    def __str__(self):
+        """Return a nice string representation of the Prefilter."""
+        res = "<Prefilter ({0} of {1} sources skipped)>"
+        return res.format(self._stats["skipped"], self._stats["checked"])
+
+    def could_match(self, article, source):
+        """Return whether the *source* fingerprint could match the *article*.
+
+        Returns ``False`` if the source should be skipped.
+        """
+        if article.size:
+            slack = sqrt(log(1.0 / self._error) / (2 * article.size))
+            threshold = self._min_confidence - slack
+            skip = threshold > 0 and article.estimate(source) < threshold
+        else:
+            skip = False
+        with self._lock:
+            self._stats["checked"] += 1
+            if skip:
+                self._stats["skipped"] += 1
+        return not skip
+
+    def get_stats(self):
+        """Return a dict of statistics about the sources we've seen.
+
+        The dict contains the number of sources ``checked`` and ``skipped``,
+        and the ``skip_rate``, the fraction of comparisons avoided.
+        """
+        with self._lock:
+            stats = self._stats.copy()
+        checked, skipped = stats["checked"], stats["skipped"]
+        stats["skip_rate"] = float(skipped) / checked if checked else 0.0
+        return stats
@@ -23,7 +23,25 @@
 from collections import defaultdict
 from re import sub, UNICODE
 
-__all__ = ["MarkovChain", "MarkovChainIntersection"]
+from earwigbot import importer
+
+numpy = importer.new("numpy")
+
+__all__ = ["MarkovChain", "CompactMarkovChain", "MarkovChainIntersection"]
+
+_numpy_available = None
+
+def _use_numpy():
+    """Return whether NumPy can be used to speed up chain comparisons."""
+    global _numpy_available
+    if _numpy_available is None:
+        try:
+            numpy.ndarray  # Force-load the lazy module
+        except (ImportError, AttributeError):
+            _numpy_available = False
+        else:
+            _numpy_available = True
+    return _numpy_available
 
 class MarkovChain(object):
     """Implements a basic ngram Markov chain of words."""
@@ -34,14 +52,18 @@ class MarkovChain(object):
     def __init__(self, text):
         self.text = text
         self.chain = defaultdict(lambda: defaultdict(lambda: 0))
-        words = sub("[^\w\s-]", "", text.lower(), flags=UNICODE).split()
-
-        padding = self.degree - 1
-        words = ([self.START] * padding) + words + ([self.END] * padding)
+        words = self._get_words(text)
         for i in range(len(words) - self.degree + 1):
             last = i + self.degree - 1
             self.chain[tuple(words[i:last])][words[last]] += 1
 
+    @classmethod
+    def _get_words(cls, text):
+        """Return the normalized words of *text*, padded for making ngrams."""
+        words = sub("[^\w\s-]", "", text.lower(), flags=UNICODE).split()
+        padding = cls.degree - 1
+        return ([cls.START] * padding) + words + ([cls.END] * padding)
+
     def __repr__(self):
         """Return the canonical string representation of the MarkovChain."""
         return "MarkovChain(text={0!r})".format(self.text)
@@ -59,22 +81,151 @@ class MarkovChain(object):
         return count
 
 
+class CompactMarkovChain(MarkovChain):
+    """A memory-efficient Markov chain that stores hashes of its nodes.
+
+    Instead of a nested dict of words, each ngram is stored as an integer hash
+    in :py:attr:`hashes`, mapping to the number of times it appears, and the
+    size is counted once, on construction. It gives the same sizes (and so
+    the same confidences, when intersected) as a :py:class:`MarkovChain` of
+    the same text, barring astronomically unlikely hash collisions.
+
+    If NumPy is installed, the hashes are kept instead as a sorted array of
+    unique unsigned 64-bit ints (:py:attr:`keys`) with a parallel array of
+    :py:attr:`counts`, so chains can be intersected with vectorized
+    operations; :py:attr:`hashes` is then only built when first used. Without
+    NumPy, :py:attr:`keys` and :py:attr:`counts` are ``None``.
+
+    :py:attr:`chain` is still available for code that needs the words
+    themselves, but it is only built (from :py:attr:`text`) when first used.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._chain = None
+        self._hashes = None
+        self.keys = self.counts = None
+        words = self._get_words(text)
+        nodes = [hash(tuple(words[i:i + self.degree]))
+                 for i in xrange(len(words) - self.degree + 1)]
+        self._size = len(nodes)
+
+        if _use_numpy():
+            nodes = numpy.array(nodes, dtype=numpy.int64).view(numpy.uint64)
+            self.keys, self.counts = numpy.unique(nodes, return_counts=True)
+        else:
+            self._hashes = hashes = defaultdict(int)
+            for node in nodes:
+                hashes[node] += 1
+
+    def __repr__(self):
+        """Return the canonical string representation of the chain."""
+        return "CompactMarkovChain(text={0!r})".format(self.text)
+
+    def __str__(self):
+        """Return a nice string representation of the chain."""
+        return "<CompactMarkovChain of size {0}>".format(self.size())
+
+    @property
+    def hashes(self):
+        """A dict mapping the hash of each ngram to its number of hits."""
+        if self._hashes is None:
+            keys = self.keys.view(numpy.int64).tolist()
+            self._hashes = dict(zip(keys, self.counts.tolist()))
+        return self._hashes
+
+    @property
+    def chain(self):
+        """The full chain of words, as a :py:class:`MarkovChain` has it."""
+        if self._chain is None:
+            self._chain = MarkovChain(self.text).chain
+        return self._chain
+
+    def size(self):
+        """Return the size of the Markov chain: the total number of nodes."""
+        return self._size
+
+
 class MarkovChainIntersection(MarkovChain):
-    """Implements the intersection of two chains (i.e., their shared nodes)."""
+    """Implements the intersection of two chains (i.e., their shared nodes).
+
+    If both chains are :py:class:`CompactMarkovChain`\ s, only their hashes
+    are intersected (using NumPy, if they have arrays of them), and neither
+    :py:attr:`hashes` nor :py:attr:`chain` are built until they are first
+    used; usually, only the intersection's size is needed.
+    """
 
     def __init__(self, mc1, mc2):
-        self.chain = defaultdict(lambda: defaultdict(lambda: 0))
+        self._chain = None
+        self._hashes = None
         self.mc1, self.mc2 = mc1, mc2
-        c1 = mc1.chain
-        c2 = mc2.chain
 
+        compact = CompactMarkovChain
+        if isinstance(mc1, compact) and isinstance(mc2, compact):
+            if mc1.keys is not None and mc2.keys is not None:
+                self._size = self._intersect_size(mc1, mc2)
+            else:
+                self._hashes = self._intersect_hashes(mc1.hashes, mc2.hashes)
+                self._size = sum(self._hashes.itervalues())
+        else:
+            self._chain = self._intersect(mc1.chain, mc2.chain)
+            self._size = MarkovChain.size(self)
+
+    def _intersect(self, c1, c2):
+        """Return the intersection of two chains' nested dicts of words."""
+        chain = defaultdict(lambda: defaultdict(lambda: 0))
         for word, nodes1 in c1.iteritems():
             if word in c2:
                 nodes2 = c2[word]
                 for node, count1 in nodes1.iteritems():
                     if node in nodes2:
                         count2 = nodes2[node]
-                        self.chain[word][node] = min(count1, count2)
+                        chain[word][node] = min(count1, count2)
+        return chain
+
+    def _intersect_hashes(self, h1, h2):
+        """Return the intersection of two chains' dicts of ngram hashes."""
+        if len(h2) < len(h1):
+            h1, h2 = h2, h1
+        return dict((node, min(count, h2[node]))
+                    for node, count in h1.iteritems() if node in h2)
+
+    def _intersect_size(self, mc1, mc2):
+        """Return the size of the intersection of two chains' hash arrays.
+
+        Each key of the smaller chain is looked up in the sorted keys of the
+        larger one with a binary search; the smaller count of each match is
+        summed.
+        """
+        if len(mc2.keys) < len(mc1.keys):
+            mc1, mc2 = mc2, mc1
+        if not len(mc1.keys):
+            return 0
+        indexes = numpy.searchsorted(mc2.keys, mc1.keys)
+        indexes[indexes == len(mc2.keys)] = 0
+        found = mc2.keys[indexes] == mc1.keys
+        counts = numpy.minimum(mc1.counts[found], mc2.counts[indexes[found]])
+        return int(counts.sum())
+
+    @property
+    def hashes(self):
+        """A dict mapping the hash of each shared ngram to its number of hits.
+        """
+        if self._hashes is None:
+            self._hashes = self._intersect_hashes(self.mc1.hashes,
+                                                  self.mc2.hashes)
+        return self._hashes
+
+    @property
+    def chain(self):
+        """The shared nodes of the two chains, as a nested dict of words."""
+        if self._chain is None:
+            self._chain = self._intersect(self.mc1.chain, self.mc2.chain)
+        return self._chain
+
+    def size(self):
+        """Return the size of the intersection: the number of shared nodes."""
+        return self._size
 
     def __repr__(self):
         """Return the canonical string representation of the intersection."""
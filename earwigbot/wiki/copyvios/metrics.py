@@ -0,0 +1,123 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from collections import defaultdict
+from threading import Lock
+
+__all__ = ["BaseMetricsSink", "MetricsAggregator"]
+
+class BaseMetricsSink(object):
+    """
+    **EarwigBot: Wiki Toolset: Base Copyvio Metrics Sink**
+
+    Receives the result of every copyvio check and comparison made by a
+    :py:class:`~earwigbot.wiki.site.Site` whose search config has it as its
+    ``metrics_sink``, so that their timings can be collected across many
+    checks: logged, aggregated, or sent to a monitoring system. Subclasses
+    must override :py:meth:`record`, which may be called from several threads
+    at once.
+
+    In the bot's config file, ``metrics_sink`` can also be the dotted name of
+    a sink class, like ``earwigbot.wiki.copyvios.metrics.MetricsAggregator``;
+    it's made without arguments and shared by every site.
+    """
+
+    def __repr__(self):
+        """Return the canonical string representation of the sink."""
+        return "{0}()".format(type(self).__name__)
+
+    def __str__(self):
+        """Return a nice string representation of the sink."""
+        return "<{0}>".format(type(self).__name__)
+
+    def record(self, page, result):
+        """Record the *result* of a copyvio check or comparison of *page*.
+
+        *result* is a
+        :py:class:`~earwigbot.wiki.copyvios.result.CopyvioCheckResult`, whose
+        :py:attr:`timings`, :py:attr:`bytes`, and :py:attr:`sources` give the
+        breakdown of the check.
+        """
+        raise NotImplementedError()
+
+
+class MetricsAggregator(BaseMetricsSink):
+    """
+    **EarwigBot: Wiki Toolset: Copyvio Metrics Aggregator**
+
+    A metrics sink that adds up the results it's given, so that where the time
+    goes in a large number of checks can be seen with :py:meth:`get_stats`.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def __str__(self):
+        """Return a nice string representation of the aggregator."""
+        return "<MetricsAggregator of {0} checks>".format(self._checks)
+
+    def reset(self):
+        """Forget everything recorded so far."""
+        with self._lock:
+            self._checks = self._violations = 0
+            self._queries = self._bytes = 0
+            self._time = 0.0
+            self._timings = defaultdict(float)
+            self._statuses = defaultdict(int)
+
+    def record(self, page, result):
+        """Add the *result* of a check of *page* to our totals."""
+        with self._lock:
+            self._checks += 1
+            if result.violation:
+                self._violations += 1
+            self._queries += result.queries
+            self._time += result.time
+            self._bytes += result.bytes
+            for phase, seconds in result.timings.iteritems():
+                self._timings[phase] += seconds
+            for source in result.sources:
+                self._statuses[source.status] += 1
+
+    def get_stats(self):
+        """Return a dict of statistics about the results recorded so far.
+
+        The dict contains the number of ``checks`` and of ``violations``
+        found, the total number of ``queries`` sent and ``bytes`` downloaded,
+        the total ``time`` taken by the checks and its ``mean``, the total
+        seconds spent in each phase (``timings``), and the number of sources
+        with each status (``sources``).
+        """
+        with self._lock:
+            stats = {
+                "checks": self._checks,
+                "violations": self._violations,
+                "queries": self._queries,
+                "bytes": self._bytes,
+                "time": self._time,
+                "timings": dict(self._timings),
+                "sources": dict(self._statuses)
+            }
+        checks = stats["checks"]
+        stats["mean"] = stats["time"] / checks if checks else 0.0
+        return stats
@@ -20,7 +20,52 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-__all__ = ["CopyvioCheckResult"]
+__all__ = ["CopyvioCheckResult", "CopyvioSourceResult"]
+
+class CopyvioSourceResult(object):
+    """
+    **EarwigBot: Wiki Toolset: Copyvio Source Result**
+
+    What happened to one source URL during a copyvio check.
+
+    *Attributes:*
+
+    - :py:attr:`url`:        the source's URL
+    - :py:attr:`status`:     one of ``"compared"``, ``"excluded"`` (by the
+                             exclusions database), ``"skipped"`` (by the
+                             prefilter), ``"unavailable"`` (it couldn't be
+                             downloaded, or had no text), ``"timeout"`` (the
+                             check ran out of time first), or ``"cancelled"``
+                             (a match was found before it was needed)
+    - :py:attr:`confidence`: the confidence of the comparison, if compared
+    - :py:attr:`size`:       the number of bytes downloaded for it; 0 if it
+                             came from a cache or another check
+    - :py:attr:`timings`:    a dict of the seconds spent on it in each phase
+                             (``"fetch"``, ``"parse"``, ``"prefilter"``,
+                             ``"chain"``, and ``"compare"``)
+    """
+
+    def __init__(self, url, status=None, confidence=0.0):
+        self.url = url
+        self.status = status
+        self.confidence = confidence
+        self.size = 0
+        self.timings = {}
+
+    def __repr__(self):
+        """Return the canonical string representation of the result."""
+        res = "CopyvioSourceResult(url={0!r}, status={1!r}, confidence={2!r})"
+        return res.format(self.url, self.status, self.confidence)
+
+    def __str__(self):
+        """Return a nice string representation of the result."""
+        res = "<CopyvioSourceResult ({0} with {1} conf)>"
+        return res.format(self.status, self.confidence)
+
+    def add_time(self, phase, seconds):
+        """Add *seconds* to the time spent on the source in *phase*."""
+        self.timings[phase] = self.timings.get(phase, 0) + seconds
+
 
 class CopyvioCheckResult(object):
     """
@@ -38,10 +83,24 @@ class CopyvioCheckResult(object):
     - :py:attr:`article_chain`: the MarkovChain of the article text
     - :py:attr:`source_chain`:  the MarkovChain of the violated page text
     - :py:attr:`delta_chain`:   the MarkovChainIntersection comparing the two
+    - :py:attr:`timings`:       a dict of the seconds spent in each phase of the
+                                check (see below)
+    - :py:attr:`sources`:       a list of
+                                :py:class:`CopyvioSourceResult`\ s, one for
+                                each URL considered, in search result order
+    - :py:attr:`bytes`:         the number of bytes downloaded from sources
+
+    The phases are ``"exclusions"`` (syncing and checking the exclusions
+    database), ``"search"`` (including waiting to send queries), ``"parse"``
+    (of the article and of sources), ``"fetch"`` (downloading sources, or
+    getting them from the source cache), ``"prefilter"``, ``"chain"``
+    (building Markov chains), and ``"compare"`` (intersecting them). Sources
+    are handled in parallel, so the phases can add up to more than
+    :py:attr:`time`.
     """
 
     def __init__(self, violation, confidence, url, queries, time, article,
-                 chains):
+                 chains, timings=None, sources=None):
         self.violation = violation
         self.confidence = confidence
         self.url = url
@@ -50,6 +109,8 @@ class CopyvioCheckResult(object):
         self.article_chain = article
         self.source_chain = chains[0]
         self.delta_chain = chains[1]
+        self.timings = timings or {}
+        self.sources = sources or []
 
     def __repr__(self):
         """Return the canonical string representation of the result."""
@@ -61,3 +122,8 @@ class CopyvioCheckResult(object):
         """Return a nice string representation of the result."""
         res = "<CopyvioCheckResult ({0} with {1} conf)>"
         return res.format(self.violation, self.confidence)
+
+    @property
+    def bytes(self):
+        """The number of bytes downloaded from sources during the check."""
+        return sum(source.size for source in self.sources)
@@ -23,6 +23,8 @@
 from gzip import GzipFile
 from json import loads
 from StringIO import StringIO
+from threading import Event, Lock
+from time import sleep, time
 from urllib import quote_plus
 
 from earwigbot import importer
@@ -30,7 +32,7 @@ from earwigbot.exceptions import SearchQueryError
 
 oauth = importer.new("oauth2")
 
-__all__ = ["BaseSearchEngine", "YahooBOSSSearchEngine"]
+__all__ = ["BaseSearchEngine", "SearchScheduler", "YahooBOSSSearchEngine"]
 
 class BaseSearchEngine(object):
     """Base class for a simple search engine interface."""
@@ -106,3 +108,117 @@ class YahooBOSSSearchEngine(BaseSearchEngine):
         except KeyError:
             return []
         return [result["url"] for result in results]
+
+
+class SearchScheduler(object):
+    """
+    **EarwigBot: Wiki Toolset: Search Scheduler**
+
+    Sends the search engine queries of one or more copyvio checks through
+    *engine* (a :py:class:`BaseSearchEngine`), starting each one at least
+    *interquery_sleep* seconds after the last, however many checks are
+    searching at once.
+
+    Results are remembered, so a query that comes up twice (within one check,
+    or in different checks sharing the scheduler, like those of a
+    :py:class:`~earwigbot.wiki.copyvios.batch.CopyvioBatch`) is only sent
+    once; if two checks ask at the same time, the second waits for the
+    first's result. If there's a *search_cache* (a
+    :py:class:`~earwigbot.wiki.copyvios.searchcache.SearchCache`), it is
+    consulted before sending anything, and new results are stored in it.
+    """
+
+    def __init__(self, engine, search_cache=None, interquery_sleep=1):
+        self._engine = engine
+        self._search_cache = search_cache
+        self._interval = interquery_sleep
+        self._last_query = 0
+
+        self._results = {}  # Normalized query -> list of URLs
+        self._pending = {}  # Normalized query -> Event set once it's done
+        self._lock = Lock()
+        self._turn = Lock()  # Held while waiting to send a query
+        self._stats = {"sent": 0, "cached": 0, "remembered": 0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the scheduler."""
+        res = "SearchScheduler({0!r}, search_cache={1!r}, interquery_sleep={2!r})"
+        return res.format(self._engine, self._search_cache, self._interval)
+
+    def __str__(self):
+        """Return a nice string representation of the scheduler."""
+        res = "<SearchScheduler for {0} ({1} queries sent)>"
+        return res.format(self._engine.name, self._stats["sent"])
+
+    @property
+    def name(self):
+        """The name of our search engine."""
+        return self._engine.name
+
+    def _send(self, query, cancel):
+        """Send *query* to the search engine when it's our turn.
+
+        Returns ``None`` without sending it if *cancel* says so once we've
+        waited.
+        """
+        with self._turn:
+            diff = time() - self._last_query
+            if diff < self._interval:
+                sleep(self._interval - diff)
+            if cancel and cancel():
+                return None
+            self._last_query = time()
+            return self._engine.search(query)
+
+    def search(self, query, cancel=None):
+        """Search for *query*, returning a tuple of ``(urls, sent)``.
+
+        *urls* is the list of URLs found, ranked by importance, and *sent* is
+        whether the query was actually sent to the search engine (as opposed
+        to being remembered or taken from the search cache). If *cancel* is
+        given, it's called after waiting for our turn to send a query; if it
+        returns ``True``, the query isn't sent and ``(None, False)`` is
+        returned instead. Raises
+        :py:exc:`~earwigbot.exceptions.SearchQueryError` on errors.
+        """
+        key = u" ".join(query.lower().split())
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._stats["remembered"] += 1
+                    return self._results[key], False
+                event = self._pending.get(key)
+                if not event:
+                    event = self._pending[key] = Event()
+                    break
+            event.wait()
+
+        try:
+            urls, sent = None, False
+            if self._search_cache:
+                urls = self._search_cache.get(self.name, query)
+            if urls is None:
+                urls = self._send(query, cancel)
+                if urls is None:
+                    return None, False
+                sent = True
+                if self._search_cache:
+                    self._search_cache.put(self.name, query, urls)
+            with self._lock:
+                self._results[key] = urls
+                self._stats["sent" if sent else "cached"] += 1
+            return urls, sent
+        finally:
+            with self._lock:
+                del self._pending[key]
+            event.set()
+
+    def get_stats(self):
+        """Return a dict of statistics about the queries we've handled.
+
+        The dict contains the number of queries ``sent`` to the search engine,
+        the number taken from the search cache (``cached``), and the number
+        ``remembered`` from earlier in our lifetime.
+        """
+        with self._lock:
+            return self._stats.copy()
@@ -0,0 +1,122 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from json import dumps, loads
+import sqlite3 as sqlite
+from threading import Lock
+from time import time
+
+__all__ = ["SearchCache"]
+
+class SearchCache(object):
+    """
+    **EarwigBot: Wiki Toolset: Search Cache Manager**
+
+    Controls the :file:`searches.db` file, which stores the URLs returned by
+    search engine queries made during copyright violation checks. Queries
+    often repeat (for example, when a page is checked again after a small
+    edit), and each one costs money and time, so their results are reused for
+    *ttl* seconds.
+
+    Results are keyed by the search engine's name and the query, normalized
+    by lowercasing it and collapsing its whitespace.
+    """
+
+    def __init__(self, dbfile, ttl=60 * 60 * 24 * 3):
+        self._dbfile = dbfile
+        self._ttl = ttl
+        self._created = False
+        self._db_access_lock = Lock()
+        self._stats = {"hits": 0, "misses": 0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the SearchCache."""
+        res = "SearchCache(dbfile={0!r}, ttl={1!r})"
+        return res.format(self._dbfile, self._ttl)
+
+    def __str__(self):
+        """Return a nice string representation of the SearchCache."""
+        return "<SearchCache at {0}>".format(self._dbfile)
+
+    def _connect(self):
+        """Return a connection to the database, creating its table if needed.
+        """
+        conn = sqlite.connect(self._dbfile)
+        if not self._created:
+            with conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS searches (
+                    search_engine TEXT, search_query TEXT, search_urls TEXT,
+                    search_time REAL,
+                    PRIMARY KEY (search_engine, search_query))""")
+            self._created = True
+        return conn
+
+    def _normalize(self, query):
+        """Return the form of *query* used as part of its cache key."""
+        return u" ".join(query.lower().split())
+
+    def get(self, engine, query):
+        """Return the cached list of URLs for *query* on *engine*, or ``None``.
+
+        Expired results are removed and treated as missing.
+        """
+        query1 = """SELECT search_urls, search_time FROM searches
+                    WHERE search_engine = ? AND search_query = ?"""
+        query2 = "DELETE FROM searches WHERE search_time < ?"
+        key = (engine, self._normalize(query))
+        with self._db_access_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(query1, key).fetchone()
+                    if row and time() - row[1] >= self._ttl:
+                        conn.execute(query2, (time() - self._ttl,))
+                        row = None
+            finally:
+                conn.close()
+            self._stats["hits" if row else "misses"] += 1
+        return loads(row[0]) if row else None
+
+    def put(self, engine, query, urls):
+        """Store the list of *urls* returned for *query* on *engine*."""
+        row = (engine, self._normalize(query), dumps(urls), time())
+        query = "INSERT OR REPLACE INTO searches VALUES (?, ?, ?, ?)"
+        with self._db_access_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(query, row)
+            finally:
+                conn.close()
+
+    def get_stats(self):
+        """Return a dict of cache statistics.
+
+        The dict contains the number of cache ``hits`` and ``misses``, and the
+        ``hit_rate``, the fraction of queries that didn't need to be sent to
+        the search engine.
+        """
+        with self._db_access_lock:
+            stats = self._stats.copy()
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = float(stats["hits"]) / lookups if lookups else 0.0
+        return stats
@@ -0,0 +1,203 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import sqlite3 as sqlite
+from threading import Lock
+from time import time
+import zlib
+
+__all__ = ["SourceCache", "CachedSource"]
+
+class CachedSource(object):
+    """A source's text as stored in the :py:class:`SourceCache`.
+
+    :py:attr:`text` is the text extracted from the source, :py:attr:`etag`
+    and :py:attr:`last_modified` are the HTTP validators it was served with
+    (or ``None``), and :py:attr:`fresh` is whether it is still within the
+    cache's TTL and can be used without asking the server again.
+    """
+
+    def __init__(self, url, text, etag, last_modified, fresh):
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fresh = fresh
+
+    def __repr__(self):
+        """Return the canonical string representation of the CachedSource."""
+        res = "CachedSource(url={0!r}, text={1!r}, etag={2!r}, last_modified={3!r}, fresh={4!r})"
+        return res.format(self.url, self.text, self.etag, self.last_modified,
+                          self.fresh)
+
+    def __str__(self):
+        """Return a nice string representation of the CachedSource."""
+        state = "fresh" if self.fresh else "stale"
+        return "<CachedSource ({0}) of {1}>".format(state, self.url)
+
+    @property
+    def validators(self):
+        """Whether the source can be revalidated with a conditional request."""
+        return bool(self.etag or self.last_modified)
+
+
+class SourceCache(object):
+    """
+    **EarwigBot: Wiki Toolset: Source Cache Manager**
+
+    Controls the :file:`sources.db` file, which stores the text extracted from
+    URLs downloaded during copyright violation checks, so that sources which
+    come up again and again (mirrors, news sites) don't need to be downloaded
+    and parsed for every check.
+
+    Sources are fresh for *ttl* seconds after they were last downloaded; after
+    that, they are revalidated with the server using the ``ETag`` and
+    ``Last-Modified`` headers they were served with, if there were any. Text is
+    stored compressed, and once the compressed text of every source adds up to
+    more than *max_size* bytes, the least recently used sources are evicted.
+    """
+
+    def __init__(self, dbfile, ttl=60 * 60 * 24 * 7, max_size=64 * 1024 ** 2):
+        self._dbfile = dbfile
+        self._ttl = ttl
+        self._max_size = max_size
+        self._created = False
+        self._db_access_lock = Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "stored": 0,
+                       "evictions": 0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the SourceCache."""
+        res = "SourceCache(dbfile={0!r}, ttl={1!r}, max_size={2!r})"
+        return res.format(self._dbfile, self._ttl, self._max_size)
+
+    def __str__(self):
+        """Return a nice string representation of the SourceCache."""
+        return "<SourceCache at {0}>".format(self._dbfile)
+
+    def _connect(self):
+        """Return a connection to the database, creating its table if needed.
+        """
+        conn = sqlite.connect(self._dbfile)
+        if not self._created:
+            with conn:
+                conn.execute("""CREATE TABLE IF NOT EXISTS sources (
+                    source_url TEXT PRIMARY KEY, source_text BLOB,
+                    source_etag TEXT, source_modified TEXT,
+                    source_fetched REAL, source_accessed REAL,
+                    source_size INTEGER)""")
+                conn.execute("""CREATE INDEX IF NOT EXISTS sources_accessed
+                                ON sources (source_accessed)""")
+            self._created = True
+        return conn
+
+    def _evict(self, conn):
+        """Remove the least recently used sources until we're under size."""
+        query1 = "SELECT SUM(source_size) FROM sources"
+        query2 = """SELECT source_url, source_size FROM sources
+                    ORDER BY source_accessed"""
+        query3 = "DELETE FROM sources WHERE source_url = ?"
+        total = conn.execute(query1).fetchone()[0] or 0
+        if total <= self._max_size:
+            return
+        evicted = []
+        for url, size in conn.execute(query2):
+            if total <= self._max_size:
+                break
+            evicted.append((url,))
+            total -= size
+        conn.executemany(query3, evicted)
+        self._stats["evictions"] += len(evicted)
+
+    def get(self, url):
+        """Return the :py:class:`CachedSource` for *url*, or ``None``.
+
+        Stale sources are returned too, so their validators can be used; check
+        :py:attr:`CachedSource.fresh` before using the text as-is.
+        """
+        query1 = """SELECT source_text, source_etag, source_modified,
+                    source_fetched FROM sources WHERE source_url = ?"""
+        query2 = "UPDATE sources SET source_accessed = ? WHERE source_url = ?"
+        with self._db_access_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    row = conn.execute(query1, (url,)).fetchone()
+                    if not row:
+                        self._stats["misses"] += 1
+                        return None
+                    conn.execute(query2, (time(), url))
+            finally:
+                conn.close()
+            text, etag, last_modified, fetched = row
+            fresh = time() - fetched < self._ttl
+            if fresh:
+                self._stats["hits"] += 1
+
+        text = zlib.decompress(text).decode("utf8")
+        return CachedSource(url, text, etag, last_modified, fresh)
+
+    def put(self, url, text, etag=None, last_modified=None):
+        """Store the extracted *text* of *url*, along with its validators."""
+        query = "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?, ?)"
+        data = zlib.compress(text.encode("utf8"))
+        now = time()
+        with self._db_access_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(query, (url, sqlite.Binary(data), etag,
+                                         last_modified, now, now, len(data)))
+                    self._stats["stored"] += 1
+                    self._evict(conn)
+            finally:
+                conn.close()
+
+    def revalidate(self, url):
+        """Mark *url* as fresh again, after the server said it's unchanged."""
+        query = """UPDATE sources SET source_fetched = ?, source_accessed = ?
+                   WHERE source_url = ?"""
+        now = time()
+        with self._db_access_lock:
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute(query, (now, now, url))
+                    self._stats["revalidated"] += 1
+            finally:
+                conn.close()
+
+    def get_stats(self):
+        """Return a dict of cache statistics.
+
+        The dict contains the number of fresh cache ``hits``, the number of
+        ``misses`` (URLs not in the cache at all), the number of stale sources
+        ``revalidated`` with the server instead of being downloaded again, the
+        number of sources ``stored`` and ``evictions``, and the ``hit_rate``,
+        the fraction of lookups that didn't need a full download.
+        """
+        with self._db_access_lock:
+            stats = self._stats.copy()
+        saved = stats["hits"] + stats["revalidated"]
+        lookups = saved + stats["stored"]
+        stats["hit_rate"] = float(saved) / lookups if lookups else 0.0
+        return stats
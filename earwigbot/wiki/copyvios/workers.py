@@ -0,0 +1,302 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from bisect import bisect_right
+import sys
+from threading import Condition, Lock, Thread
+from time import time
+from urlparse import urlparse
+
+from earwigbot.wiki.copyvios.fingerprint import Fingerprint
+from earwigbot.wiki.copyvios.markov import CompactMarkovChain
+
+__all__ = ["CopyvioSource", "CopyvioWorkspace"]
+
+class CopyvioSource(object):
+    """The text of a source URL, ready to be compared against articles.
+
+    Its :py:attr:`fingerprint` and Markov :py:attr:`chain` are only built when
+    first used, so a source skipped by a
+    :py:class:`~earwigbot.wiki.copyvios.fingerprint.Prefilter` never needs a
+    chain; either is built only once, even if several threads need it at the
+    same time. Sources may be kept around for a long time (by a
+    :py:class:`~earwigbot.wiki.copyvios.batch.CopyvioBatch`), so
+    :py:attr:`text` is set to ``None`` if the source is :py:meth:`reject`\ ed
+    before its chain is built. Sources that were compared keep their text,
+    since their chains may end up in a check's result.
+    """
+
+    def __init__(self, url, text):
+        self.url = url
+        self.text = text
+        self._fingerprint = None
+        self._chain = None
+        self._lock = Lock()
+
+    def __repr__(self):
+        """Return the canonical string representation of the source."""
+        return "CopyvioSource(url={0!r}, text={1!r})".format(self.url,
+                                                             self.text)
+
+    def __str__(self):
+        """Return a nice string representation of the source."""
+        return "<CopyvioSource of {0}>".format(self.url)
+
+    @property
+    def fingerprint(self):
+        """The :py:class:`~.Fingerprint` of the source's text."""
+        with self._lock:
+            if self._fingerprint is None:
+                self._fingerprint = Fingerprint(self.text)
+            return self._fingerprint
+
+    @property
+    def chain(self):
+        """The :py:class:`~.CompactMarkovChain` of the source's text.
+
+        This is ``None`` if the source was rejected before it was built.
+        """
+        with self._lock:
+            if self._chain is None:
+                if self.text is None:
+                    return None
+                self._chain = CompactMarkovChain(self.text)
+            return self._chain
+
+    @property
+    def rejected(self):
+        """Whether the text was dropped before the chain could be built."""
+        return self.text is None and self._chain is None
+
+    def reject(self):
+        """Drop the source's text after a prefilter has skipped it.
+
+        Only its :py:attr:`fingerprint` is kept, which is enough for other
+        prefilters to skip it too. Nothing is dropped if another check has
+        already built the source's chain.
+        """
+        with self._lock:
+            if self._fingerprint is not None and self._chain is None:
+                self.text = None
+
+
+class CopyvioWorkspace(object):
+    """
+    **EarwigBot: Wiki Toolset: Copyvio Workspace**
+
+    Compares an article against candidate source URLs using a bounded pool of
+    worker threads, so that slow sources don't hold up the rest of a check.
+
+    *compare* is a function that takes a URL and returns a tuple of
+    ``(confidence, chains)``, like
+    :py:meth:`CopyvioMixIn._copyvio_compare_content
+    <earwigbot.wiki.copyvios.CopyvioMixIn._copyvio_compare_content>`. Up to
+    *workers* URLs are compared at once, with at most *domain_workers* of
+    those from any one domain. If *max_time* is not negative, we stop waiting
+    for comparisons that haven't finished *max_time* seconds after the
+    workspace was created.
+
+    URLs are given to :py:meth:`enqueue` in order of preference (search result
+    order), one batch per search query. The result is the same as if they had
+    been compared one at a time in that order, stopping after the batch in
+    which a URL first reaches *min_confidence*: later batches are cancelled as
+    soon as such a URL is found, but the rest of its own batch is still
+    compared. The best match is the URL with the highest confidence, with
+    ties going to the earlier URL. Only running out of time can make the
+    outcome differ from a serial check.
+    """
+
+    def __init__(self, compare, min_confidence, max_time=-1, workers=8,
+                 domain_workers=2):
+        self._compare = compare
+        self._min_confidence = min_confidence
+        self._deadline = time() + max_time if max_time >= 0 else None
+        self._num_workers = max(workers, 1)
+        self._domain_workers = max(domain_workers, 1)
+
+        self._cond = Condition()
+        self._tasks = []  # Pending (index, url, domain) tuples, in order
+        self._results = {}  # Index -> (url, confidence, chains, exc_info)
+        self._next_index = 0
+        self._batch_ends = []  # Index after the last URL of each batch
+        self._done_upto = 0  # Every index below this has a result
+        self._cutoff = None  # End of the first batch to hit min_confidence
+        self._domains = {}  # Domain -> number of comparisons in progress
+        self._threads = []
+        self._stopped = False
+
+    def __repr__(self):
+        """Return the canonical string representation of the workspace."""
+        res = "CopyvioWorkspace({0!r}, {1!r}, workers={2!r}, domain_workers={3!r})"
+        return res.format(self._compare, self._min_confidence,
+                          self._num_workers, self._domain_workers)
+
+    def __str__(self):
+        """Return a nice string representation of the workspace."""
+        res = "<CopyvioWorkspace ({0} of {1} URLs compared)>"
+        return res.format(len(self._results), self._next_index)
+
+    def _get_limit(self, upto=None):
+        """Return the index of the first URL we don't care about anymore.
+
+        If *upto* is given, the limit will be no greater than it.
+        """
+        if self._cutoff is not None:
+            limit = self._cutoff
+        else:
+            limit = self._next_index
+        return limit if upto is None else min(limit, upto)
+
+    def _next_task(self):
+        """Return the next task a worker can take, or ``None``.
+
+        The task is the earliest pending URL whose domain isn't already at its
+        limit. Must be called with the condition held.
+        """
+        for i, (index, url, domain) in enumerate(self._tasks):
+            if self._domains.get(domain, 0) < self._domain_workers:
+                del self._tasks[i]
+                self._domains[domain] = self._domains.get(domain, 0) + 1
+                return index, url, domain
+
+    def _work(self):
+        """Main loop for a worker thread: compare URLs until stopped."""
+        while True:
+            with self._cond:
+                while True:
+                    if self._stopped:
+                        return
+                    task = self._next_task()
+                    if task:
+                        break
+                    self._cond.wait()
+
+            index, url, domain = task
+            confidence, chains, exc_info = 0, None, None
+            try:
+                confidence, chains = self._compare(url)
+            except Exception:
+                exc_info = sys.exc_info()
+
+            with self._cond:
+                self._domains[domain] -= 1
+                self._results[index] = (url, confidence, chains, exc_info)
+                while self._done_upto in self._results:
+                    self._done_upto += 1
+                if confidence >= self._min_confidence:
+                    end = self._batch_ends[bisect_right(self._batch_ends,
+                                                        index)]
+                    if self._cutoff is None or end < self._cutoff:
+                        self._cutoff = end
+                        self._tasks = [pending for pending in self._tasks
+                                       if pending[0] < end]
+                self._cond.notify_all()
+
+    def _start_workers(self):
+        """Start as many worker threads as are useful, up to our limit."""
+        wanted = min(self._num_workers, len(self._tasks))
+        while len(self._threads) < wanted:
+            name = "copyvio-worker-{0}".format(len(self._threads))
+            thread = Thread(target=self._work, name=name)
+            thread.daemon = True
+            self._threads.append(thread)
+            thread.start()
+
+    @property
+    def found(self):
+        """Whether a URL reaching *min_confidence* has been found.
+
+        Other URLs in its batch, and earlier ones, may still be being
+        compared; see :py:meth:`wait`.
+        """
+        return self._cutoff is not None
+
+    @property
+    def queued(self):
+        """The total number of URLs that have been enqueued so far."""
+        return self._next_index
+
+    @property
+    def best(self):
+        """The best match so far, as a ``(confidence, url, chains)`` tuple.
+
+        *url* and *chains* are ``None`` if nothing has been compared yet.
+        """
+        with self._cond:
+            limit = self._get_limit()
+            best = (0, None, None)
+            for index in sorted(self._results):
+                if index >= limit:
+                    break
+                url, confidence, chains, exc_info = self._results[index]
+                if confidence > best[0]:
+                    best = (confidence, url, chains)
+            return best
+
+    def enqueue(self, urls):
+        """Add a batch of URLs to be compared, after all of those added before.
+
+        URLs are ignored if a match has already been found, since a serial
+        check would never have gotten to them.
+        """
+        with self._cond:
+            if self._cutoff is not None or self._stopped:
+                return
+            for url in urls:
+                domain = urlparse(url).netloc.lower()
+                self._tasks.append((self._next_index, url, domain))
+                self._next_index += 1
+            self._batch_ends.append(self._next_index)
+            self._start_workers()
+            self._cond.notify_all()
+
+    def wait(self, upto=None):
+        """Wait until every URL that could affect the result is compared.
+
+        That means all URLs enqueued so far, or, once a match is found, every
+        URL up to the end of its batch. If *upto* is given, we only wait for the first *upto*
+        URLs to be enqueued (compare with :py:attr:`queued`). Returns ``True``
+        when done, or ``False`` if we ran out of time first. If comparing one
+        of those URLs raised an exception, it is raised here.
+        """
+        with self._cond:
+            while self._done_upto < self._get_limit(upto):
+                if self._deadline is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._deadline - time()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+
+            for index in xrange(self._get_limit(upto)):
+                exc_info = self._results[index][3]
+                if exc_info:  # Keep the worker's traceback
+                    raise exc_info[0], exc_info[1], exc_info[2]
+            return True
+
+    def stop(self):
+        """Stop all workers; comparisons in progress are abandoned."""
+        with self._cond:
+            self._stopped = True
+            self._tasks = []
+            self._cond.notify_all()
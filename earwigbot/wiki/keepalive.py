@@ -0,0 +1,290 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Persistent HTTP connections for :py:mod:`urllib2`.
+
+:py:mod:`urllib2` opens a new connection (and, for HTTPS, does a new TLS
+handshake) for every request it makes. The handlers here replace the default
+HTTP and HTTPS handlers with ones that keep connections open after a response
+has been fully read, returning them to a :py:class:`ConnectionPool` so later
+requests to the same host can reuse them.
+"""
+
+import httplib
+import socket
+from StringIO import StringIO
+from threading import Lock
+from time import time
+from urllib2 import HTTPHandler, HTTPSHandler, URLError
+
+__all__ = ["ConnectionPool", "KeepAliveHTTPHandler", "KeepAliveHTTPSHandler"]
+
+class ConnectionPool(object):
+    """
+    **EarwigBot: Wiki Toolset: HTTP Connection Pool**
+
+    Stores idle persistent connections, keyed by scheme and host, so they can
+    be reused by later requests. A single pool can safely be shared by many
+    :py:class:`~earwigbot.wiki.site.Site`\ s and threads; connections are only
+    ever handed to one request at a time.
+
+    *max_idle* is the maximum number of idle connections kept for each host,
+    and *idle_timeout* is the number of seconds after which an idle connection
+    is considered stale and is closed instead of being reused.
+    """
+
+    def __init__(self, max_idle=4, idle_timeout=30):
+        self._max_idle = max_idle
+        self._idle_timeout = idle_timeout
+        self._idle = {}
+        self._stats = {}
+        self._lock = Lock()
+
+    def __repr__(self):
+        """Return the canonical string representation of the ConnectionPool."""
+        res = "ConnectionPool(max_idle={0!r}, idle_timeout={1!r})"
+        return res.format(self._max_idle, self._idle_timeout)
+
+    def __str__(self):
+        """Return a nice string representation of the ConnectionPool."""
+        idle = sum(len(conns) for conns in self._idle.itervalues())
+        return "<ConnectionPool with {0} idle connections>".format(idle)
+
+    def _get_host_stats(self, host):
+        """Return the (mutable) stats dict for the given host."""
+        try:
+            return self._stats[host]
+        except KeyError:
+            stats = {"requests": 0, "reused": 0, "opened": 0, "discarded": 0}
+            self._stats[host] = stats
+            return stats
+
+    def acquire(self, key):
+        """Return an idle connection for *key*, or ``None`` if there isn't one.
+
+        *key* is a ``(scheme, host)`` tuple. Stale connections are closed and
+        skipped over.
+        """
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, last_used = conns.pop()
+                if time() - last_used < self._idle_timeout:
+                    return conn
+                self._get_host_stats(key[1])["discarded"] += 1
+                conn.close()
+
+    def release(self, key, conn):
+        """Return a connection for *key* to the pool once it's free again."""
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self._max_idle:
+                conns.append((conn, time()))
+                return
+            self._get_host_stats(key[1])["discarded"] += 1
+        conn.close()
+
+    def record(self, key, reused):
+        """Record that a request for *key* was made on a new or old connection.
+        """
+        with self._lock:
+            stats = self._get_host_stats(key[1])
+            stats["requests"] += 1
+            stats["reused" if reused else "opened"] += 1
+
+    def clear(self):
+        """Close all idle connections in the pool."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.itervalues():
+            for conn, last_used in conns:
+                conn.close()
+
+    def get_stats(self, host=None):
+        """Return a dict of connection reuse statistics.
+
+        The dict contains the total number of ``requests`` made, the number of
+        those that ``reused`` an existing connection or ``opened`` a new one,
+        the number of idle connections ``discarded`` for being stale or over
+        the limit, and the ``hit_rate``, the fraction of requests that reused a
+        connection. If *host* is given, only requests to that host are counted;
+        otherwise, the stats cover every host in the pool.
+        """
+        keys = ("requests", "reused", "opened", "discarded")
+        with self._lock:
+            if host:
+                hosts = [self._stats[host]] if host in self._stats else []
+            else:
+                hosts = self._stats.values()
+            stats = dict((key, sum(h[key] for h in hosts)) for key in keys)
+        if stats["requests"]:
+            stats["hit_rate"] = float(stats["reused"]) / stats["requests"]
+        else:
+            stats["hit_rate"] = 0.0
+        return stats
+
+
+class _PooledResponse(object):
+    """A response whose connection goes back to the pool once it is read.
+
+    Implements the parts of the :py:func:`urllib2.urlopen` return value that
+    the rest of :py:mod:`urllib2` and our own code rely on.
+
+    The bodies of error responses (with a status of 400 or above) are read
+    right away, so the connection is released even if the
+    :py:exc:`~urllib2.HTTPError` that :py:mod:`urllib2` raises around us is
+    never read or closed.
+    """
+
+    def __init__(self, pool, key, conn, response, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._response = response
+        self._body = None
+        self.url = url
+        self.code = response.status
+        self.msg = response.reason
+        self.headers = response.msg
+        if self.code >= 400:
+            self._body = StringIO(response.read())
+            self._finish()
+
+    def _finish(self):
+        """Release our connection if the response was completely consumed."""
+        if self._conn and self._response.isclosed():
+            if self._response.will_close:
+                self._conn.close()
+            else:
+                self._pool.release(self._key, self._conn)
+            self._conn = None
+
+    def read(self, amt=None):
+        """Read up to *amt* bytes of the response, or all of it if ``None``."""
+        if self._body is not None:
+            return self._body.read(-1 if amt is None else amt)
+        data = self._response.read(amt)
+        self._finish()
+        return data
+
+    def readline(self, limit=-1):
+        """Read a line of the response, reading the rest of it first."""
+        if self._body is None:
+            self._body = StringIO(self.read())
+        return self._body.readline(limit)
+
+    def close(self):
+        """Close the response, discarding the connection if it is unfinished.
+        """
+        self._finish()
+        if self._conn:
+            self._conn.close()
+            self._conn = None
+        self._response.close()
+
+    def info(self):
+        return self.headers
+
+    def geturl(self):
+        return self.url
+
+    def getcode(self):
+        return self.code
+
+
+class _KeepAliveHandlerMixIn(object):
+    """Shared logic for opening pooled HTTP and HTTPS connections."""
+
+    def _send_request(self, conn, req):
+        """Send *req* over *conn* and return the raw response."""
+        headers = dict(req.unredirected_hdrs)
+        headers.update(dict((k, v) for k, v in req.headers.items()
+                            if k not in headers))
+        headers["Connection"] = "keep-alive"
+        headers = dict((name.title(), val) for name, val in headers.items())
+        conn.request(req.get_method(), req.get_selector(), req.data, headers)
+        return conn.getresponse(buffering=True)
+
+    def _keepalive_open(self, http_class, req, **http_conn_args):
+        """Open *req* using a pooled connection if possible, else a new one.
+
+        A reused connection may have been closed by the server while it was
+        idle; in that case, we transparently retry once on a fresh connection.
+        """
+        host = req.get_host()
+        if not host:
+            raise URLError("no host given")
+        if req._tunnel_host:  # Don't bother pooling proxied connections
+            return self.do_open(http_class, req, **http_conn_args)
+
+        key = (req.get_type(), host)
+        conn = self._pool.acquire(key)
+        reused = conn is not None
+        if reused and conn.sock:
+            if req.timeout is socket._GLOBAL_DEFAULT_TIMEOUT:
+                conn.sock.settimeout(socket.getdefaulttimeout())
+            else:
+                conn.sock.settimeout(req.timeout)
+
+        while True:
+            if not conn:
+                conn = http_class(host, timeout=req.timeout, **http_conn_args)
+            try:
+                response = self._send_request(conn, req)
+            except (socket.error, httplib.HTTPException) as exc:
+                conn.close()
+                if reused:
+                    conn, reused = None, False
+                    continue
+                raise URLError(exc)
+            break
+
+        self._pool.record(key, reused)
+        return _PooledResponse(self._pool, key, conn, response,
+                               req.get_full_url())
+
+
+class KeepAliveHTTPHandler(_KeepAliveHandlerMixIn, HTTPHandler):
+    """An HTTP handler for :py:mod:`urllib2` that reuses connections."""
+
+    def __init__(self, pool, debuglevel=0):
+        HTTPHandler.__init__(self, debuglevel)
+        self._pool = pool
+
+    def http_open(self, req):
+        return self._keepalive_open(httplib.HTTPConnection, req)
+
+
+class KeepAliveHTTPSHandler(_KeepAliveHandlerMixIn, HTTPSHandler):
+    """An HTTPS handler for :py:mod:`urllib2` that reuses connections."""
+
+    def __init__(self, pool, debuglevel=0):
+        HTTPSHandler.__init__(self, debuglevel)
+        self._pool = pool
+
+    def https_open(self, req):
+        context = getattr(self, "_context", None)
+        if context:
+            return self._keepalive_open(httplib.HTTPSConnection, req,
+                                        context=context)
+        return self._keepalive_open(httplib.HTTPSConnection, req)
@@ -122,14 +122,7 @@ class Page(CopyvioMixIn):
 
         # Try to determine the page's namespace using our site's namespace
         # converter:
-        prefix = self._title.split(":", 1)[0]
-        if prefix != title:  # ignore a page that's titled "Category" or "User"
-            try:
-                self._namespace = self.site.namespace_name_to_id(prefix)
-            except exceptions.NamespaceNotFoundError:
-                self._namespace = 0
-        else:
-            self._namespace = 0
+        self._namespace = self.site.split_title(self._title)[0]
 
         # Is this a talkpage? Talkpages have odd IDs, while content pages have
         # even IDs, excluding the "special" namespaces:
@@ -512,6 +505,21 @@ class Page(CopyvioMixIn):
         self._assert_existence()  # Missing pages do not have IDs
         return self._pageid
 
+    @property
+    def lastrevid(self):
+        """The ID of the page's latest revision (an integer).
+
+        Makes an API query only if we haven't already made one.
+
+        Raises :py:exc:`~earwigbot.exceptions.InvalidPageError` or
+        :py:exc:`~earwigbot.exceptions.PageNotFoundError` if the page name is
+        invalid or the page does not exist, respectively.
+        """
+        if self._exists == self.PAGE_UNKNOWN:
+            self._load()
+        self._assert_existence()  # Missing pages do not have revisions
+        return self._lastrevid
+
     @property
     def url(self):
         """The page's URL.
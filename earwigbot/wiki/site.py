@@ -25,9 +25,10 @@ from gzip import GzipFile
 from json import loads
 from logging import getLogger, NullHandler
 from os.path import expanduser
+from Queue import Full, Queue
 from StringIO import StringIO
-from threading import Lock
-from time import sleep, time
+from threading import Event, Thread
+from time import time
 from urllib import quote_plus, unquote_plus
 from urllib2 import build_opener, HTTPCookieProcessor, URLError
 from urlparse import urlparse
@@ -35,7 +36,12 @@ from urlparse import urlparse
 from earwigbot import exceptions, importer
 from earwigbot.wiki import constants
 from earwigbot.wiki.category import Category
+from earwigbot.wiki.copyvios.batch import CopyvioBatch
+from earwigbot.wiki.keepalive import (ConnectionPool, KeepAliveHTTPHandler,
+                                      KeepAliveHTTPSHandler)
 from earwigbot.wiki.page import Page
+from earwigbot.wiki.sqlpool import SQLConnectionPool
+from earwigbot.wiki.throttle import QueryScheduler, READ_ACTIONS
 from earwigbot.wiki.user import User
 
 oursql = importer.new("oursql")
@@ -70,15 +76,19 @@ class Site(object):
     *Public methods:*
 
     - :py:meth:`api_query`:            does an API query with kwargs as params
+    - :py:meth:`api_query_iter`:       iterates over a continued API query
     - :py:meth:`sql_query`:            does an SQL query and yields its results
     - :py:meth:`get_maxlag`:           returns the internal database lag
     - :py:meth:`get_replag`:           estimates the external database lag
     - :py:meth:`namespace_id_to_name`: returns names associated with an NS id
     - :py:meth:`namespace_name_to_id`: returns the ID associated with a NS name
+    - :py:meth:`split_title`:          splits a title into its NS ID and the rest
     - :py:meth:`get_page`:             returns a Page for the given title
+    - :py:meth:`get_pages`:            returns Pages for many titles, in bulk
     - :py:meth:`get_category`:         returns a Category for the given title
     - :py:meth:`get_user`:             returns a User object for the given name
     - :py:meth:`delegate`:             controls when the API or SQL is used
+    - :py:meth:`get_stats`:            returns statistics on our connections
     """
     SERVICE_API = 1
     SERVICE_SQL = 2
@@ -88,7 +98,9 @@ class Site(object):
                  namespaces=None, login=(None, None), cookiejar=None,
                  user_agent=None, use_https=False, assert_edit=None,
                  maxlag=None, wait_between_queries=2, logger=None,
-                 search_config=None):
+                 search_config=None, connection_pool=None,
+                 max_concurrent_reads=4, response_cache=None,
+                 max_sql_connections=4):
         """Constructor for new Site instances.
 
         This probably isn't necessary to call yourself unless you're building a
@@ -99,7 +111,17 @@ class Site(object):
         *script_path*; this is enough to figure out an API url. *login*, a
         tuple of (username, password), is highly recommended. *cookiejar* will
         be used to store cookies, and we'll use a normal CookieJar if none is
-        given.
+        given. *connection_pool* is a
+        :py:class:`~earwigbot.wiki.keepalive.ConnectionPool` used to keep
+        HTTP connections alive between API queries; sites on the same farm
+        can share one, and we'll make our own if none is given. Up to
+        *max_concurrent_reads* read queries can be in flight at once (see
+        :py:class:`~earwigbot.wiki.throttle.QueryScheduler`).
+        *response_cache*, if given, is a
+        :py:class:`~earwigbot.wiki.cache.ResponseCache` used to remember the
+        results of recent idempotent queries; by default, nothing is cached.
+        Up to *max_sql_connections* SQL connections can be open at once (see
+        :py:class:`~earwigbot.wiki.sqlpool.SQLConnectionPool`).
 
         First, we'll store the given arguments as attributes, then set up our
         URL opener. We'll load any of the attributes that weren't given from
@@ -115,24 +137,30 @@ class Site(object):
         self._article_path = article_path
         self._script_path = script_path
         self._namespaces = namespaces
+        self._namespace_index = {}
+        if namespaces:
+            self._index_namespaces()
 
         # Attributes used for API queries:
         self._use_https = use_https
         self._assert_edit = assert_edit
         self._maxlag = maxlag
         self._wait_between_queries = wait_between_queries
+        self._max_concurrent_reads = max_concurrent_reads
         self._max_retries = 6
-        self._last_query_time = 0
-        self._api_lock = Lock()
-        self._api_info_cache = {"maxlag": 0, "lastcheck": 0}
+        self._scheduler = QueryScheduler(wait_between_queries,
+                                         max_concurrent_reads)
+        self._response_cache = response_cache
+        self._api_info_cache = {"maxlag": 0, "lastcheck": 0,
+                                "highlimits": None}
 
         # Attributes used for SQL queries:
         if sql:
             self._sql_data = sql
         else:
             self._sql_data = {}
-        self._sql_conn = None
-        self._sql_lock = Lock()
+        self._sql_pool = SQLConnectionPool(self._sql_connect,
+                                           max_sql_connections)
         self._sql_info_cache = {"replag": 0, "lastcheck": 0, "usable": None}
 
         # Attribute used in copyright violation checks (see CopyrightMixIn):
@@ -146,9 +174,16 @@ class Site(object):
             self._cookiejar = cookiejar
         else:
             self._cookiejar = CookieJar()
+        if connection_pool is not None:
+            self._connection_pool = connection_pool
+        else:
+            self._connection_pool = ConnectionPool()
         if not user_agent:
             user_agent = constants.USER_AGENT  # Set default UA
-        self._opener = build_opener(HTTPCookieProcessor(self._cookiejar))
+        self._opener = build_opener(
+            HTTPCookieProcessor(self._cookiejar),
+            KeepAliveHTTPHandler(self._connection_pool),
+            KeepAliveHTTPSHandler(self._connection_pool))
         self._opener.addheaders = [("User-Agent", user_agent),
                                    ("Accept-Encoding", "gzip")]
 
@@ -215,13 +250,10 @@ class Site(object):
         See the documentation for :py:meth:`api_query` for full implementation
         details.
         """
-        since_last_query = time() - self._last_query_time  # Throttling support
-        if since_last_query < self._wait_between_queries:
-            wait_time = self._wait_between_queries - since_last_query
-            log = "Throttled: waiting {0} seconds".format(round(wait_time, 2))
+        wait_time = self._scheduler.throttle()  # Throttling support
+        if wait_time:
+            log = "Throttled: waited {0} seconds".format(round(wait_time, 2))
             self._logger.debug(log)
-            sleep(wait_time)
-        self._last_query_time = time()
 
         url, data = self._build_api_query(params, ignore_maxlag)
         if "lgpassword" in params:
@@ -249,6 +281,29 @@ class Site(object):
 
         return self._handle_api_query_result(result, params, tries, wait)
 
+    def _cached_api_query(self, params, ignore_maxlag=False):
+        """Do an API query through our scheduler and response cache.
+
+        If we have a response cache and the query can be cached, we'll return
+        a fresh cached result if we have one, or store the result otherwise.
+        Writes clear the cache, since they may have invalidated its contents.
+        """
+        write = params.get("action") not in READ_ACTIONS
+        cache = self._response_cache
+        key = cache.make_key(params) if cache else None
+        if key:
+            result = cache.get(key)
+            if result is not None:
+                return result
+
+        with self._scheduler.slot(write):
+            result = self._api_query(params, ignore_maxlag=ignore_maxlag)
+        if key:
+            cache.put(key, result)
+        elif cache and write:
+            cache.clear()
+        return result
+
     def _build_api_query(self, params, ignore_maxlag):
         """Given API query params, return the URL to query and POST data."""
         if not self._base_url or self._script_path is None:
@@ -287,7 +342,7 @@ class Site(object):
             tries += 1
             msg = 'Server says "{0}"; retrying in {1} seconds ({2}/{3})'
             self._logger.info(msg.format(info, wait, tries, self._max_retries))
-            sleep(wait)
+            self._scheduler.pause(wait)  # Hold back all of our other queries
             return self._api_query(params, tries=tries, wait=wait*2)
         else:  # Some unknown error occurred
             e = 'API query failed: got error "{0}"; server says: "{1}".'
@@ -355,6 +410,28 @@ class Site(object):
             alias = namespace["*"]
             self._namespaces[ns_id].append(alias)
 
+        self._index_namespaces()
+
+    def _fold_namespace_name(self, name):
+        """Return a namespace name in the form used as a key in our index.
+
+        Namespace names are case-insensitive, and underscores are equivalent
+        to spaces, so ``"User_talk"`` and ``"user talk"`` fold to the same key.
+        """
+        return name.replace("_", " ").strip().lower()
+
+    def _index_namespaces(self):
+        """Build self._namespace_index, mapping folded names to IDs.
+
+        This is called whenever self._namespaces is set, so that lookups by
+        name don't need to go through every namespace and alias each time.
+        """
+        index = {}
+        for ns_id, names in self._namespaces.iteritems():
+            for name in names:
+                index[self._fold_namespace_name(name)] = ns_id
+        self._namespace_index = index
+
     def _get_cookie(self, name, domain):
         """Return the named cookie unless it is expired or doesn't exist."""
         for cookie in self._cookiejar:
@@ -456,7 +533,9 @@ class Site(object):
         Recent versions of MediaWiki's API have fixed a CSRF vulnerability,
         requiring login to be done in two separate requests. If the response
         from from our initial request is "NeedToken", we'll do another one with
-        the token. If login is successful, we'll try to save our cookiejar.
+        the token. If login is successful, we'll try to save our cookiejar and
+        forget what we knew about our rights (see
+        :py:meth:`_get_titles_limit`), since they may have changed.
 
         Raises LoginError on login errors (duh), like bad passwords and
         nonexistent usernames.
@@ -475,6 +554,7 @@ class Site(object):
 
         res = result["login"]["result"]
         if res == "Success":
+            self._api_info_cache["highlimits"] = None
             self._save_cookiejar()
         elif res == "NeedToken" and attempt == 0:
             token = result["login"]["token"]
@@ -497,14 +577,177 @@ class Site(object):
 
         We'll do a simple API request (api.php?action=logout), clear our
         cookiejar (which probably contains now-invalidated cookies) and try to
-        save it, if it supports that sort of thing.
+        save it, if it supports that sort of thing. We also forget what we
+        knew about our rights, like :py:meth:`_login`.
         """
         self.api_query(action="logout")
+        self._api_info_cache["highlimits"] = None
         self._cookiejar.clear()
         self._save_cookiejar()
 
+    def _get_titles_limit(self):
+        """Return the maximum number of titles we can pass in one API query.
+
+        This is 500 if we have the ``apihighlimits`` right (usually bots and
+        admins), otherwise 50. We check our rights with the API the first time
+        this is called and remember the answer until we log in or out.
+        """
+        if self._api_info_cache["highlimits"] is None:
+            result = self.api_query(action="query", meta="userinfo",
+                                    uiprop="rights")
+            rights = result["query"]["userinfo"].get("rights", [])
+            self._api_info_cache["highlimits"] = "apihighlimits" in rights
+        return 500 if self._api_info_cache["highlimits"] else 50
+
+    def _get_continuation(self, result):
+        """Return the params needed to continue a query, or None if it's done.
+
+        Both old-style (``query-continue``) and new-style (``continue``)
+        continuation blocks are understood.
+        """
+        if "continue" in result:
+            return result["continue"]
+        if "query-continue" in result:
+            params = {}
+            for module in result["query-continue"].itervalues():
+                params.update(module)
+            return params
+
+    def _iter_api_batches(self, params):
+        """Yield the results of a query and each of its continuations."""
+        params = params.copy()
+        if "continue" not in params:
+            params["continue"] = ""  # Ask for new-style continuation
+        while True:
+            result = self.api_query(**params)
+            yield result
+            continuation = self._get_continuation(result)
+            if not continuation:
+                break
+            params.update(continuation)
+
+    def _prefetch_api_batches(self, batches):
+        """Yield from an iterator of batches, fetching one batch ahead.
+
+        The next batch is loaded in a separate thread while the caller works on
+        the current one. At most one batch is kept waiting, so memory stays
+        bounded no matter how slowly the caller consumes them.
+        """
+        queue = Queue(maxsize=1)
+        stopped = Event()
+
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    queue.put(item, timeout=1)
+                except Full:
+                    continue
+                return True
+            return False
+
+        def fetch():
+            try:
+                for batch in batches:
+                    if not put((batch, None)):
+                        return
+            except Exception as exc:
+                put((None, exc))
+            else:
+                put((None, None))
+
+        thread = Thread(target=fetch, name="api-prefetch-" + self.name)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                batch, exc = queue.get()
+                if exc:
+                    raise exc
+                if batch is None:
+                    break
+                yield batch
+        finally:
+            stopped.set()
+
+    def _get_query_items(self, result, params):
+        """Return the items from a query result that api_query_iter yields.
+
+        These are the entries of each requested ``list`` module, followed by
+        the page dicts, if any pages were returned (through ``titles``,
+        ``pageids``, ``revids``, or a ``generator``).
+        """
+        query = result.get("query", {})
+        items = []
+        lists = params.get("list")
+        if lists:
+            for module in lists.split("|"):
+                items.extend(query.get(module, []))
+        if "pages" in query:
+            pages = query["pages"]
+            items.extend(pages.itervalues() if isinstance(pages, dict)
+                         else pages)
+        return items
+
+    def _query_pages(self, pages, content):
+        """Load attributes (and content, if *content*) for a list of Pages.
+
+        Titles are packed into as few queries as the API will allow, and the
+        results are given to each page's
+        :py:meth:`~earwigbot.wiki.page.Page._load_attributes` and
+        :py:meth:`~earwigbot.wiki.page.Page._load_content` as if the page had
+        made the query itself. Redirects are not followed here.
+        """
+        by_title = {}
+        for page in pages:
+            by_title.setdefault(page.title, []).append(page)
+        titles = by_title.keys()
+        limit = self._get_titles_limit()
+
+        for i in xrange(0, len(titles), limit):
+            params = {"action": "query", "prop": "info",
+                      "inprop": "protection|url", "intoken": "edit",
+                      "titles": u"|".join(titles[i:i + limit])}
+            if content:
+                params["prop"] = "info|revisions"
+                params["rvprop"] = "content|timestamp"
+
+            result = self.api_query(**params)
+            query = result["query"]
+            data = query.get("pages", {})
+            continuation = self._get_continuation(result)
+            while continuation:  # Content was too large for a single query
+                params.update(continuation)
+                result = self.api_query(**params)
+                for pageid, info in result["query"].get("pages", {}).items():
+                    if pageid in data and "revisions" in info:
+                        data[pageid]["revisions"] = info["revisions"]
+                    else:
+                        data.setdefault(pageid, info)
+                continuation = self._get_continuation(result)
+
+            renamed = {}
+            for key in ("normalized", "converted"):
+                for item in query.get(key, []):
+                    renamed[item["from"]] = item["to"]
+            by_result_title = {}
+            for pageid, info in data.iteritems():
+                by_result_title[info["title"]] = (pageid, info)
+
+            for title in titles[i:i + limit]:
+                final = renamed.get(title, title)
+                final = renamed.get(final, final)
+                if final not in by_result_title:
+                    continue
+                pageid, info = by_result_title[final]
+                subresult = {"query": {"pages": {pageid: info}}}
+                for page in by_title[title]:
+                    page._load_attributes(result=subresult)
+                    if content and "revisions" in info:
+                        if page._exists == page.PAGE_EXISTS:
+                            page._load_content(result=subresult)
+
     def _sql_connect(self, **kwargs):
-        """Attempt to establish a connection with this site's SQL database.
+        """Establish and return a new connection to this site's SQL database.
 
         oursql.connect() will be called with self._sql_data as its kwargs.
         Any kwargs given to this function will be passed to connect() and will
@@ -513,6 +756,9 @@ class Site(object):
         Will raise SQLError() if the module "oursql" is not available. oursql
         may raise its own exceptions (e.g. oursql.InterfaceError) if it cannot
         establish a connection.
+
+        This is called by :py:attr:`self._sql_pool` whenever it needs a new
+        connection.
         """
         args = self._sql_data
         for key, value in kwargs.iteritems():
@@ -528,7 +774,7 @@ class Site(object):
             args["autoreconnect"] = True
 
         try:
-            self._sql_conn = oursql.connect(**args)
+            return oursql.connect(**args)
         except ImportError:
             e = "SQL querying requires the 'oursql' package: http://packages.python.org/oursql/"
             raise exceptions.SQLError(e)
@@ -552,7 +798,10 @@ class Site(object):
             self._sql_info_cache["lastcheck"] = now
             try:
                 self._sql_info_cache["replag"] = sqllag = self.get_replag()
-            except (exceptions.SQLError, oursql.Error):
+            except exceptions.SQLError:
+                self._sql_info_cache["usable"] = False
+                return [self.SERVICE_API]
+            except oursql.Error:  # Only evaluated if oursql is importable
                 self._sql_info_cache["usable"] = False
                 return [self.SERVICE_API]
             self._sql_info_cache["usable"] = True
@@ -624,11 +873,18 @@ class Site(object):
         well as ``&assert=`` and ``&maxlag=`` based on
         :py:attr:`self._assert_edit` and :py:attr:`_maxlag` respectively.
         Additionally, we'll sleep a bit if the last query was made fewer than
-        :py:attr:`self._wait_between_queries` seconds ago. The request is made
-        through :py:attr:`self._opener`, which has cookie support
-        (:py:attr:`self._cookiejar`), a ``User-Agent``
+        :py:attr:`self._wait_between_queries` seconds ago. Read queries (like
+        ``action=query``) may run alongside each other, up to
+        :py:attr:`self._max_concurrent_reads` at once, while writes (like
+        ``action=edit``) are sent one at a time; this is handled by
+        :py:attr:`self._scheduler`. If we were given a
+        :py:attr:`self._response_cache`, results of read queries may be served
+        from it instead of the API, according to its per-action TTLs. The
+        request is made through :py:attr:`self._opener`, which has cookie
+        support (:py:attr:`self._cookiejar`), a ``User-Agent``
         (:py:const:`earwigbot.wiki.constants.USER_AGENT`), and
-        ``Accept-Encoding`` set to ``"gzip"``.
+        ``Accept-Encoding`` set to ``"gzip"``. Connections are kept alive and
+        reused through :py:attr:`self._connection_pool`.
 
         Assuming everything went well, we'll gunzip the data (if compressed),
         load it as a JSON object, and return it.
@@ -636,16 +892,47 @@ class Site(object):
         If our request failed for some reason, we'll raise
         :py:exc:`~earwigbot.exceptions.APIError` with details. If that
         reason was due to maxlag, we'll sleep for a bit and then repeat the
-        query until we exceed :py:attr:`self._max_retries`.
+        query until we exceed :py:attr:`self._max_retries`. No other queries
+        will be sent while we wait.
 
         There is helpful MediaWiki API documentation at `MediaWiki.org
         <http://www.mediawiki.org/wiki/API>`_.
         """
-        with self._api_lock:
-            return self._api_query(kwargs)
+        return self._cached_api_query(kwargs)
+
+    def api_query_iter(self, prefetch=False, **kwargs):
+        """Do an API query with `kwargs` as params, following continuations.
+
+        This is a generator that makes the query with :py:meth:`api_query`,
+        then keeps making it again with the continuation params the API gives
+        us until there are no more results. Both new-style (``continue``) and
+        old-style (``query-continue``) continuations are understood.
+
+        Instead of whole results, we yield individual items: each entry in the
+        requested ``list`` modules (``list=categorymembers`` yields member
+        dicts), followed by each page dict if the query returned pages (for
+        example, through ``generator=`` or ``titles=``). When a query's
+        ``prop`` modules are continued, the same page may be yielded more than
+        once, each time with the next part of its data. Only one batch of
+        results is held in memory at a time, so this can be used on very long
+        lists.
+
+        If *prefetch* is ``True``, the next batch is requested in the
+        background while the caller is busy with the current one.
+
+        Raises :py:exc:`~earwigbot.exceptions.APIError` under the same
+        conditions as :py:meth:`api_query`.
+        """
+        batches = self._iter_api_batches(kwargs)
+        if prefetch:
+            batches = self._prefetch_api_batches(batches)
+        for result in batches:
+            for item in self._get_query_items(result, kwargs):
+                yield item
 
     def sql_query(self, query, params=(), plain_query=False, dict_cursor=False,
-                  cursor_class=None, show_table=False):
+                  cursor_class=None, show_table=False, stream=False,
+                  batch_size=1000):
         """Do an SQL query and yield its results.
 
         If *plain_query* is ``True``, we will force an unparameterized query.
@@ -656,6 +943,11 @@ class Site(object):
         is True, the name of the table will be prepended to the name of the
         column. This will mainly affect an :py:class:`~oursql.DictCursor`.
 
+        If *stream* is ``True``, rows are pulled from the server in batches of
+        *batch_size* with :py:meth:`~oursql.Cursor.fetchmany`, rather than
+        being iterated over directly; only one batch is held in memory at a
+        time, so this is the way to go through very large result sets.
+
         Example usage::
 
             >>> query = "SELECT user_id, user_registration FROM user WHERE user_name = ?"
@@ -672,24 +964,42 @@ class Site(object):
         :py:exc:`oursql.InterfaceError`, ...) if there were problems with the
         query.
 
-        See :py:meth:`_sql_connect` for information on how a connection is
-        acquired. Also relevant is `oursql's documentation
+        Connections are borrowed from :py:attr:`self._sql_pool` for as long as
+        the results are being iterated over, so queries from different threads
+        can run at the same time. See :py:meth:`_sql_connect` for information
+        on how a new connection is made. Also relevant is `oursql's documentation
         <http://packages.python.org/oursql>`_ for details on that package.
         """
         if not cursor_class:
-            if dict_cursor:
-                cursor_class = oursql.DictCursor
-            else:
-                cursor_class = oursql.Cursor
+            try:
+                if dict_cursor:
+                    cursor_class = oursql.DictCursor
+                else:
+                    cursor_class = oursql.Cursor
+            except (ImportError, AttributeError):  # oursql isn't installed
+                e = "SQL querying requires the 'oursql' package: http://packages.python.org/oursql/"
+                raise exceptions.SQLError(e)
         klass = cursor_class
 
-        with self._sql_lock:
-            if not self._sql_conn:
-                self._sql_connect()
-            with self._sql_conn.cursor(klass, show_table=show_table) as cur:
-                cur.execute(query, params, plain_query)
-                for result in cur:
-                    yield result
+        with self._sql_pool.connection() as conn:
+            start = time()
+            try:
+                with conn.cursor(klass, show_table=show_table) as cur:
+                    cur.execute(query, params, plain_query)
+                    if stream:
+                        while True:
+                            batch = cur.fetchmany(batch_size)
+                            if not batch:
+                                break
+                            for result in batch:
+                                yield result
+                    else:
+                        for result in cur:
+                            yield result
+            except GeneratorExit:  # Closed early, but the query still ran
+                self._sql_pool.record_query(time() - start)
+                raise
+            self._sql_pool.record_query(time() - start)
 
     def get_maxlag(self, showall=False):
         """Return the internal database replication lag in seconds.
@@ -707,8 +1017,7 @@ class Site(object):
         params = {"action": "query", "meta": "siteinfo", "siprop": "dbrepllag"}
         if showall:
             params["sishowalldb"] = 1
-        with self._api_lock:
-            result = self._api_query(params, ignore_maxlag=True)
+        result = self._cached_api_query(params, ignore_maxlag=True)
         if showall:
             return [server["lag"] for server in result["query"]["dbrepllag"]]
         return result["query"]["dbrepllag"][0]["lag"]
@@ -757,19 +1066,35 @@ class Site(object):
         """Given a namespace name, returns the associated ID.
 
         Like :py:meth:`namespace_id_to_name`, but reversed. Case is ignored,
-        because namespaces are assumed to be case-insensitive.
+        because namespaces are assumed to be case-insensitive, and underscores
+        are treated as spaces.
 
         Raises :py:exc:`~earwigbot.exceptions.NamespaceNotFoundError` if the
         name is not found.
         """
-        lname = name.lower()
-        for ns_id, names in self._namespaces.items():
-            lnames = [n.lower() for n in names]  # Be case-insensitive
-            if lname in lnames:
-                return ns_id
+        try:
+            return self._namespace_index[self._fold_namespace_name(name)]
+        except KeyError:
+            e = "There is no namespace with name '{0}'.".format(name)
+            raise exceptions.NamespaceNotFoundError(e)
 
-        e = "There is no namespace with name '{0}'.".format(name)
-        raise exceptions.NamespaceNotFoundError(e)
+    def split_title(self, title):
+        """Split a page title into a tuple of its namespace ID and the rest.
+
+        For example, this returns ``(14, u"Foo")`` for ``u"Category:Foo"`` and
+        ``(0, u"Foo")`` for ``u"Foo"``. If the part of the title before the
+        first colon isn't the name of a namespace, the title is in the main
+        namespace and is returned whole: ``(0, u"Foo:Bar")``. A title with a
+        leading colon is forced into the main namespace, so
+        ``u":Category:Foo"`` gives ``(0, u"Category:Foo")``.
+        """
+        prefix, colon, rest = title.partition(":")
+        if colon:
+            key = self._fold_namespace_name(prefix)
+            ns_id = self._namespace_index.get(key)
+            if ns_id is not None:
+                return ns_id, rest
+        return constants.NS_MAIN, title
 
     def get_page(self, title, follow_redirects=False, pageid=None):
         """Return a :py:class:`Page` object for the given title.
@@ -786,14 +1111,68 @@ class Site(object):
         provide that.
         """
         title = self._unicodeify(title)
-        prefixes = self.namespace_id_to_name(constants.NS_CATEGORY, all=True)
-        prefix = title.split(":", 1)[0]
-        if prefix != title:  # Avoid a page that is simply "Category"
-            if prefix in prefixes:
-                return Category(self, title, follow_redirects, pageid,
-                                self._logger)
+        if self.split_title(title)[0] == constants.NS_CATEGORY:
+            return Category(self, title, follow_redirects, pageid,
+                            self._logger)
         return Page(self, title, follow_redirects, pageid, self._logger)
 
+    def get_pages(self, titles, content=True, follow_redirects=False):
+        """Return a list of :py:class:`Page` objects, loading them in bulk.
+
+        This works like calling :py:meth:`get_page` for each title in
+        *titles*, but the pages' attributes (and content, unless *content* is
+        ``False``) are loaded immediately using as few API queries as possible:
+        up to 500 titles are packed into each query if we have the
+        ``apihighlimits`` right, or 50 otherwise. The returned list is in the
+        same order as *titles*.
+
+        Each page is handled as if it had made its own query, so titles are
+        normalized, and missing or invalid pages will raise
+        :py:exc:`~earwigbot.exceptions.PageNotFoundError` or
+        :py:exc:`~earwigbot.exceptions.InvalidPageError` when their content is
+        requested. If *follow_redirects* is ``True``, redirects are followed
+        (once, like :py:class:`~earwigbot.wiki.page.Page` does) and their
+        targets are loaded in another batch.
+        """
+        pages = [self.get_page(title, follow_redirects) for title in titles]
+        self._query_pages(pages, content)
+
+        redirects = [page for page in pages
+                     if page._keep_following and page._is_redirect]
+        if redirects:
+            unloaded = [page for page in redirects if page._content is None]
+            if unloaded:
+                self._query_pages(unloaded, content=True)
+            followed = []
+            for page in redirects:
+                page._keep_following = False  # Don't follow double redirects
+                try:
+                    target = page.get_redirect_target()
+                except exceptions.RedirectError:
+                    continue
+                page._title = target
+                page._content = page._creator = None
+                followed.append(page)
+            if followed:
+                self._query_pages(followed, content)
+        return pages
+
+    def copyvio_check_many(self, pages, min_confidence=0.5, max_queries=-1,
+                           max_time=-1, interquery_sleep=1, workers=4):
+        """Check many pages for copyright violations, sharing work between them.
+
+        Returns a :py:class:`~earwigbot.wiki.copyvios.batch.CopyvioBatch`,
+        which yields a ``(page, result)`` tuple for each page as soon as its
+        check finishes when iterated over. *pages* is a list of
+        :py:class:`~earwigbot.wiki.page.Page` objects or titles, *workers* is
+        the number of pages checked at once, and the other arguments are the
+        same as those of :py:meth:`Page.copyvio_check()
+        <earwigbot.wiki.copyvios.CopyvioMixIn.copyvio_check>`; see
+        :py:class:`~earwigbot.wiki.copyvios.batch.CopyvioBatch` for details.
+        """
+        return CopyvioBatch(self, pages, min_confidence, max_queries,
+                            max_time, interquery_sleep, workers)
+
     def get_category(self, catname, follow_redirects=False, pageid=None):
         """Return a :py:class:`Category` object for the given category name.
 
@@ -847,3 +1226,28 @@ class Site(object):
                 except exceptions.ServiceError:
                     continue
         raise exceptions.NoServiceError(services)
+
+    def get_stats(self):
+        """Return a dict of statistics about how the site is being accessed.
+
+        ``"http"`` holds the connection reuse statistics of our
+        :py:class:`~earwigbot.wiki.keepalive.ConnectionPool` for this site's
+        domain, as returned by
+        :py:meth:`~earwigbot.wiki.keepalive.ConnectionPool.get_stats`, and
+        ``"scheduler"`` holds the queue depth and wait times of our API
+        queries, from
+        :py:meth:`~earwigbot.wiki.throttle.QueryScheduler.get_stats`.
+        ``"sql"`` holds the usage of our SQL connection pool, wait times, and
+        query latency, from
+        :py:meth:`~earwigbot.wiki.sqlpool.SQLConnectionPool.get_stats`. If we
+        have a response cache, ``"cache"`` holds its hit and miss counters,
+        from :py:meth:`~earwigbot.wiki.cache.ResponseCache.get_stats`.
+        """
+        stats = {
+            "http": self._connection_pool.get_stats(self.domain),
+            "scheduler": self._scheduler.get_stats(),
+            "sql": self._sql_pool.get_stats()
+        }
+        if self._response_cache:
+            stats["cache"] = self._response_cache.get_stats()
+        return stats
@@ -23,14 +23,21 @@
 from collections import OrderedDict
 from cookielib import LWPCookieJar, LoadError
 import errno
+from importlib import import_module
 from os import chmod, path
 from platform import python_version
 import stat
 import sqlite3 as sqlite
+from threading import Thread
 
 from earwigbot import __version__
 from earwigbot.exceptions import SiteNotFoundError
+from earwigbot.wiki.cache import ResponseCache
 from earwigbot.wiki.copyvios.exclusions import ExclusionsDB
+from earwigbot.wiki.copyvios.parsers import ArticleTextParser
+from earwigbot.wiki.copyvios.searchcache import SearchCache
+from earwigbot.wiki.copyvios.sourcecache import SourceCache
+from earwigbot.wiki.keepalive import ConnectionPool
 from earwigbot.wiki.site import Site
 
 __all__ = ["SitesDB"]
@@ -65,10 +72,14 @@ class SitesDB(object):
         self._sitesdb = path.join(bot.config.root_dir, "sites.db")
         self._cookie_file = path.join(bot.config.root_dir, ".cookies")
         self._cookiejar = None
+        self._connection_pool = ConnectionPool()
 
         excl_db = path.join(bot.config.root_dir, "exclusions.db")
         excl_logger = self._logger.getChild("exclusionsdb")
         self._exclusions_db = ExclusionsDB(self, excl_db, excl_logger)
+        self._source_cache = None
+        self._search_cache = None
+        self._metrics_sink = None
 
     def __repr__(self):
         """Return the canonical string representation of the SitesDB."""
@@ -91,6 +102,9 @@ class SitesDB(object):
         get_site()), and the cookiejar is passed to our Site's constructor,
         used when it makes API queries. This way, we can easily preserve
         cookies between sites (e.g., for CentralAuth), making logins easier.
+        For similar reasons, all of our sites share a single
+        :py:class:`~earwigbot.wiki.keepalive.ConnectionPool`, so sites on the
+        same farm reuse each other's open HTTP connections.
         """
         if self._cookiejar:
             return self._cookiejar
@@ -112,6 +126,67 @@ class SitesDB(object):
 
         return self._cookiejar
 
+    def _get_source_cache(self, search_config):
+        """Return the SourceCache shared by all sites' copyvio checks.
+
+        It's created the first time it's needed, in a :file:`sources.db` file
+        next to :file:`exclusions.db`, using the ``source_cache_ttl`` and
+        ``source_cache_size`` settings from the *search_config*. The cache
+        stores the extracted text of the sources it sees, so it's opt-in: if
+        no size is set (or it's 0), sources aren't cached and ``None`` is
+        returned.
+        """
+        if self._source_cache:
+            return self._source_cache
+        max_size = search_config.get("source_cache_size", 0)
+        if not max_size:
+            return None
+        ttl = search_config.get("source_cache_ttl", 60 * 60 * 24 * 7)
+        dbfile = path.join(self.config.root_dir, "sources.db")
+        self._source_cache = SourceCache(dbfile, ttl, max_size)
+        return self._source_cache
+
+    def _get_search_cache(self, search_config):
+        """Return the SearchCache shared by all sites' copyvio checks.
+
+        Like :py:meth:`_get_source_cache`, but the cache lives in
+        :file:`searches.db` and is configured by ``search_cache_ttl``; if that
+        is set to 0, search results aren't cached and ``None`` is returned.
+        """
+        if self._search_cache:
+            return self._search_cache
+        ttl = search_config.get("search_cache_ttl", 60 * 60 * 24 * 3)
+        if not ttl:
+            return None
+        dbfile = path.join(self.config.root_dir, "searches.db")
+        self._search_cache = SearchCache(dbfile, ttl)
+        return self._search_cache
+
+    def _get_metrics_sink(self, search_config):
+        """Return the metrics sink for all sites' copyvio checks, or ``None``.
+
+        The *search_config*'s ``metrics_sink`` is the dotted name of a
+        :py:class:`~earwigbot.wiki.copyvios.metrics.BaseMetricsSink` subclass,
+        which is made without arguments the first time it's needed. If it
+        can't be loaded, the error is logged and metrics aren't recorded.
+        """
+        if self._metrics_sink:
+            return self._metrics_sink
+        name = search_config.get("metrics_sink")
+        if not name:
+            return None
+        if not isinstance(name, basestring):  # Already a sink object
+            self._metrics_sink = name
+            return name
+        modname, _, clsname = name.rpartition(".")
+        try:
+            self._metrics_sink = getattr(import_module(modname), clsname)()
+        except Exception:
+            e = "Couldn't load copyvio metrics sink {0!r}".format(name)
+            self._logger.exception(e)
+            return None
+        return self._metrics_sink
+
     def _create_sitesdb(self):
         """Initialize the sitesdb file with its three necessary tables."""
         script = """
@@ -192,8 +267,11 @@ class SitesDB(object):
         assert_edit = config.wiki.get("assert")
         maxlag = config.wiki.get("maxlag")
         wait_between_queries = config.wiki.get("waitTime", 2)
+        max_concurrent_reads = config.wiki.get("maxConcurrentReads", 4)
+        max_sql_connections = config.wiki.get("maxSQLConnections", 4)
         logger = self._logger.getChild(name)
         search_config = config.wiki.get("search", OrderedDict()).copy()
+        cache_config = config.wiki.get("cache")
 
         if user_agent:
             user_agent = user_agent.replace("$1", __version__)
@@ -203,6 +281,19 @@ class SitesDB(object):
             nltk_dir = path.join(self.config.root_dir, ".nltk")
             search_config["nltk_dir"] = nltk_dir
             search_config["exclusions_db"] = self._exclusions_db
+            search_config["source_cache"] = self._get_source_cache(
+                search_config)
+            search_config["search_cache"] = self._get_search_cache(
+                search_config)
+            search_config["metrics_sink"] = self._get_metrics_sink(
+                search_config)
+
+        if cache_config:
+            ttls = dict(cache_config.get("ttl", {}))
+            max_entries = cache_config.get("maxEntries", 1000)
+            response_cache = ResponseCache(ttls, max_entries)
+        else:
+            response_cache = None
 
         if not sql:
             sql = config.wiki.get("sql", OrderedDict()).copy()
@@ -216,7 +307,11 @@ class SitesDB(object):
                     cookiejar=cookiejar, user_agent=user_agent,
                     use_https=use_https, assert_edit=assert_edit,
                     maxlag=maxlag, wait_between_queries=wait_between_queries,
-                    logger=logger, search_config=search_config)
+                    logger=logger, search_config=search_config,
+                    connection_pool=self._connection_pool,
+                    max_concurrent_reads=max_concurrent_reads,
+                    max_sql_connections=max_sql_connections,
+                    response_cache=response_cache)
 
     def _get_site_name_from_sitesdb(self, project, lang):
         """Return the name of the first site with the given project and lang.
@@ -391,6 +486,8 @@ class SitesDB(object):
         assert_edit = config.wiki.get("assert")
         maxlag = config.wiki.get("maxlag")
         wait_between_queries = config.wiki.get("waitTime", 2)
+        max_concurrent_reads = config.wiki.get("maxConcurrentReads", 4)
+        max_sql_connections = config.wiki.get("maxSQLConnections", 4)
 
         if user_agent:
             user_agent = user_agent.replace("$1", __version__)
@@ -400,7 +497,10 @@ class SitesDB(object):
         site = Site(base_url=base_url, script_path=script_path, sql=sql,
                     login=login, cookiejar=cookiejar, user_agent=user_agent,
                     use_https=use_https, assert_edit=assert_edit,
-                    maxlag=maxlag, wait_between_queries=wait_between_queries)
+                    maxlag=maxlag, wait_between_queries=wait_between_queries,
+                    connection_pool=self._connection_pool,
+                    max_concurrent_reads=max_concurrent_reads,
+                    max_sql_connections=max_sql_connections)
 
         self._logger.info("Added site '{0}'".format(site.name))
         self._add_site_to_sitesdb(site)
@@ -436,3 +536,29 @@ class SitesDB(object):
                 return self._remove_site_from_sitesdb(name)
 
         return False
+
+    def warm_up(self):
+        """Load things copyvio checks need ahead of time, if configured to.
+
+        If ``warm_up`` is ``True`` in our search config, the sentence
+        tokenizer used to chunk articles is loaded (and downloaded, if
+        necessary) in a background thread, so the first check doesn't have to
+        wait for it. This is called when the bot starts.
+        """
+        search_config = self.config.wiki.get("search", {})
+        if not search_config.get("warm_up"):
+            return
+
+        def load_tokenizer():
+            nltk_dir = path.join(self.config.root_dir, ".nltk")
+            name = search_config.get("tokenizer", "nltk")
+            try:
+                ArticleTextParser.get_tokenizer(nltk_dir, name)
+            except Exception:
+                self._logger.exception("Couldn't load sentence tokenizer")
+            else:
+                self._logger.debug("Loaded sentence tokenizer")
+
+        thread = Thread(name="wiki_warm_up", target=load_tokenizer)
+        thread.daemon = True
+        thread.start()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from contextlib import contextmanager
+from threading import Condition
+from time import time
+
+__all__ = ["SQLConnectionPool"]
+
+class SQLConnectionPool(object):
+    """
+    **EarwigBot: Wiki Toolset: SQL Connection Pool**
+
+    A bounded pool of database connections, used by
+    :py:class:`~earwigbot.wiki.site.Site` so that several threads can run SQL
+    queries at the same time without each opening its own connection.
+
+    *connect* is a function that takes no arguments and returns a new DB-API
+    connection. At most *max_connections* are open at once; threads that want
+    one when all are busy wait for one to be released. Idle connections are
+    closed after *idle_timeout* seconds, and those that have been idle for
+    more than *check_after* seconds are pinged before being handed out, so a
+    connection dropped by the server is replaced instead of failing a query.
+    """
+
+    def __init__(self, connect, max_connections=4, idle_timeout=300,
+                 check_after=30):
+        self._connect = connect
+        self._max_connections = max(max_connections, 1)
+        self._idle_timeout = idle_timeout
+        self._check_after = check_after
+
+        self._idle = []  # (connection, time it was released)
+        self._open = 0
+        self._cond = Condition()
+        self._stats = {"acquired": 0, "waited": 0, "wait_time": 0.0,
+                       "opened": 0, "closed": 0, "failed_checks": 0,
+                       "max_in_use": 0, "queries": 0, "query_time": 0.0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the pool."""
+        res = "SQLConnectionPool({0!r}, max_connections={1!r}, idle_timeout={2!r}, check_after={3!r})"
+        return res.format(self._connect, self._max_connections,
+                          self._idle_timeout, self._check_after)
+
+    def __str__(self):
+        """Return a nice string representation of the pool."""
+        res = "<SQLConnectionPool with {0} of {1} connections open>"
+        return res.format(self._open, self._max_connections)
+
+    def _close(self, conn):
+        """Close a connection, ignoring any errors in doing so.
+
+        This doesn't change :py:attr:`_open`; the caller must do that if the
+        connection's slot is being given up.
+        """
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._stats["closed"] += 1
+
+    def _is_healthy(self, conn):
+        """Return whether the given idle connection still works."""
+        try:
+            if hasattr(conn, "ping"):
+                conn.ping()
+            else:
+                cursor = conn.cursor()
+                try:
+                    cursor.execute("SELECT 1")
+                    cursor.fetchall()
+                finally:
+                    cursor.close()
+        except Exception:
+            return False
+        return True
+
+    def _take(self):
+        """Reserve a connection slot, waiting if necessary.
+
+        Returns a ``(connection, idle_since)`` tuple from the idle list, or
+        ``(None, None)`` if the caller should open a new connection. Either way,
+        the slot is counted in :py:attr:`_open`.
+        """
+        start = time()
+        expired = []
+        with self._cond:
+            waited = False
+            while True:
+                now = time()
+                while self._idle:
+                    conn, since = self._idle.pop()
+                    if now - since < self._idle_timeout:
+                        break
+                    self._open -= 1
+                    expired.append(conn)
+                else:
+                    conn = None
+                if conn or self._open < self._max_connections:
+                    break
+                waited = True
+                self._cond.wait()
+
+            if not conn:
+                self._open += 1
+                since = None
+            self._stats["acquired"] += 1
+            if waited:
+                self._stats["waited"] += 1
+            self._stats["wait_time"] += time() - start
+            in_use = self._open - len(self._idle)
+            self._stats["max_in_use"] = max(self._stats["max_in_use"], in_use)
+
+        for old in expired:
+            self._close(old)
+        return conn, since
+
+    def acquire(self):
+        """Return a working connection from the pool, opening one if needed.
+
+        It must be given back with :py:meth:`release` when no longer needed;
+        :py:meth:`connection` does this for you.
+        """
+        conn, since = self._take()
+        if conn and time() - since >= self._check_after:
+            if not self._is_healthy(conn):
+                with self._cond:
+                    self._stats["failed_checks"] += 1
+                self._close(conn)
+                conn = None
+        if not conn:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["opened"] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        """Give a connection back to the pool.
+
+        If *discard* is ``True`` (for example, because an error left the
+        connection in an unknown state), it is closed instead of reused.
+        """
+        with self._cond:
+            if not discard:
+                self._idle.append((conn, time()))
+            else:
+                self._open -= 1
+            self._cond.notify()
+        if discard:
+            self._close(conn)
+
+    @contextmanager
+    def connection(self):
+        """Hold a connection from the pool for the duration of a ``with``
+        block.
+
+        If the block raises an exception, the connection is discarded.
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        except GeneratorExit:  # A query generator was closed early; that's OK
+            self.release(conn)
+            raise
+        except BaseException:
+            self.release(conn, discard=True)
+            raise
+        else:
+            self.release(conn)
+
+    def record_query(self, seconds):
+        """Record that a query took *seconds* seconds to run."""
+        with self._cond:
+            self._stats["queries"] += 1
+            self._stats["query_time"] += seconds
+
+    def clear(self):
+        """Close all idle connections in the pool."""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+            self._cond.notify_all()
+        for conn, since in idle:
+            self._close(conn)
+
+    def get_stats(self):
+        """Return a dict of pool statistics.
+
+        The dict contains the number of connections currently ``open``,
+        ``idle`` and ``in_use`` (and the most ever in use at once,
+        ``max_in_use``); how many times a connection was ``acquired`` and how
+        many of those had to wait for one (``waited``), with the total
+        (``wait_time``) and average (``avg_wait``) seconds spent waiting; the
+        number of connections ``opened``, ``closed``, and replaced after
+        ``failed_checks``; and the number of ``queries`` run, with their total
+        (``query_time``) and average (``avg_query_time``) duration.
+        """
+        with self._cond:
+            stats = self._stats.copy()
+            stats["open"] = self._open
+            stats["idle"] = len(self._idle)
+        stats["in_use"] = stats["open"] - stats["idle"]
+        if stats["acquired"]:
+            stats["avg_wait"] = stats["wait_time"] / stats["acquired"]
+        else:
+            stats["avg_wait"] = 0.0
+        if stats["queries"]:
+            stats["avg_query_time"] = stats["query_time"] / stats["queries"]
+        else:
+            stats["avg_query_time"] = 0.0
+        return stats
@@ -0,0 +1,154 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from contextlib import contextmanager
+from threading import BoundedSemaphore, Lock
+from time import sleep, time
+
+__all__ = ["QueryScheduler", "READ_ACTIONS"]
+
+# API actions that never change anything on the wiki; everything else is
+# treated as a write and serialized:
+READ_ACTIONS = frozenset([
+    "query", "parse", "expandtemplates", "compare", "opensearch", "paraminfo",
+    "help", "sitematrix", "feedcontributions", "feedrecentchanges",
+    "feedwatchlist"
+])
+
+class QueryScheduler(object):
+    """
+    **EarwigBot: Wiki Toolset: Query Scheduler**
+
+    Decides when each of a :py:class:`~earwigbot.wiki.site.Site`'s API queries
+    may be sent. Up to *max_concurrent_reads* read queries can be in flight at
+    once, while writes (edits, logins, and so on) are sent one at a time,
+    independently of reads.
+
+    Queries are rate-limited with a token bucket refilled at one token every
+    *wait_between_queries* seconds, holding at most *burst* tokens; with the
+    default *burst* of 1, the start of each query is spaced at least
+    *wait_between_queries* seconds after the last, as it always has been. The
+    whole schedule can also be paused (for example, when the server reports
+    maxlag) with :py:meth:`pause`.
+    """
+
+    def __init__(self, wait_between_queries=2, max_concurrent_reads=4,
+                 burst=1):
+        self._interval = wait_between_queries
+        self._max_reads = max_concurrent_reads
+        self._burst = burst
+        self._next_time = 0  # "Theoretical arrival time" of the next query
+        self._paused_until = 0
+
+        self._reads = BoundedSemaphore(max(max_concurrent_reads, 1))
+        self._writes = Lock()
+        self._lock = Lock()
+        self._stats = {"requests": 0, "queued": 0, "max_queued": 0,
+                       "in_flight": 0, "wait_time": 0.0}
+
+    def __repr__(self):
+        """Return the canonical string representation of the scheduler."""
+        res = "QueryScheduler(wait_between_queries={0!r}, max_concurrent_reads={1!r}, burst={2!r})"
+        return res.format(self._interval, self._max_reads, self._burst)
+
+    def __str__(self):
+        """Return a nice string representation of the scheduler."""
+        res = "<QueryScheduler ({0} in flight, {1} queued)>"
+        return res.format(self._stats["in_flight"], self._stats["queued"])
+
+    def _add_wait_time(self, waited):
+        """Record that a query spent *waited* seconds waiting to be sent."""
+        with self._lock:
+            self._stats["wait_time"] += waited
+
+    @contextmanager
+    def slot(self, write=False):
+        """Hold one of the read slots, or the write slot if *write*, for the
+        duration of a ``with`` block."""
+        start = time()
+        semaphore = self._writes if write else self._reads
+        with self._lock:
+            self._stats["queued"] += 1
+            queued = self._stats["queued"]
+            self._stats["max_queued"] = max(self._stats["max_queued"], queued)
+        try:
+            semaphore.acquire()
+        finally:
+            with self._lock:
+                self._stats["queued"] -= 1
+
+        with self._lock:
+            self._stats["requests"] += 1
+            self._stats["in_flight"] += 1
+            self._stats["wait_time"] += time() - start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stats["in_flight"] -= 1
+            semaphore.release()
+
+    def throttle(self):
+        """Block until the rate limit allows another query to be sent.
+
+        Returns the number of seconds we spent waiting.
+        """
+        waited = 0
+        while True:
+            with self._lock:
+                now = time()
+                if now < self._paused_until:
+                    delay, reserved = self._paused_until - now, False
+                else:
+                    slack = (self._burst - 1) * self._interval
+                    start = max(now, self._next_time - slack)
+                    self._next_time = max(self._next_time, start) + \
+                        self._interval
+                    delay, reserved = start - now, True
+            if delay > 0:
+                sleep(delay)
+                waited += delay
+            if reserved:
+                self._add_wait_time(waited)
+                return waited
+
+    def pause(self, seconds):
+        """Stop sending new queries for the next *seconds* seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time() + seconds)
+
+    def get_stats(self):
+        """Return a dict of scheduling statistics.
+
+        The dict contains the total number of ``requests`` that got a slot,
+        the number of queries currently ``queued`` for a slot (and the most
+        that have ever been queued at once, ``max_queued``), the number
+        currently ``in_flight``, and the total (``wait_time``) and average
+        (``avg_wait``) number of seconds queries spent waiting to be sent.
+        """
+        with self._lock:
+            stats = self._stats.copy()
+        if stats["requests"]:
+            stats["avg_wait"] = stats["wait_time"] / stats["requests"]
+        else:
+            stats["avg_wait"] = 0.0
+        return stats
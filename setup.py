@@ -42,6 +42,7 @@ extra_deps = {
         "beautifulsoup4 >= 4.1.1",  # Parsing/scraping HTML
         "lxml >= 2.3.5",  # Faster parser for BeautifulSoup
         "nltk >= 2.0.2",  # Parsing sentences to split article content
+        "numpy >= 1.9",  # Faster comparison of article and source text
         "oauth2 >= 1.5.211",  # Interfacing with Yahoo! BOSS Search
     ],
     "time": [
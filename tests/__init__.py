@@ -36,6 +36,12 @@ Fake objects:
   -- FakeIRCConnection implements IRCConnection, using an internal string
      buffer for data instead of sending it over a socket.
 
+Other modules:
+  -- wikiserver provides FakeWiki, a local stand-in for a MediaWiki API
+     server, for testing the wiki toolset without a real wiki.
+  -- benchmark_wiki times common wiki toolset workflows against FakeWiki;
+     run it with "python -m tests.benchmark_wiki".
+
 """
 
 import logging
@@ -45,10 +51,9 @@ from threading import Lock
 from unittest import TestCase
 
 from earwigbot.bot import Bot
-from earwigbot.commands import CommandManager
 from earwigbot.config import BotConfig
 from earwigbot.irc import IRCConnection, Data
-from earwigbot.tasks import TaskManager
+from earwigbot.managers import CommandManager, TaskManager
 from earwigbot.wiki import SitesDB
 
 class CommandTestCase(TestCase):
@@ -110,7 +115,7 @@ class CommandTestCase(TestCase):
 
 class FakeBot(Bot):
     def __init__(self, root_dir):
-        self.config = FakeBotConfig(root_dir)
+        self.config = FakeBotConfig(self, root_dir, logging.INFO)
         self.logger = logging.getLogger("earwigbot")
         self.commands = CommandManager(self)
         self.tasks = TaskManager(self)
@@ -0,0 +1,224 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmarks for the HTML text extraction engines of
+:py:class:`~earwigbot.wiki.copyvios.parsers.HTMLTextParser`, run against a
+generated corpus of web pages shaped like typical copyvio sources: navigation,
+scripts, comments, entities, and a few paragraphs of article text.
+
+Each engine's throughput is reported in MB of HTML per second, along with its
+parity with the default ``"bs4"`` engine: the fraction of documents for which
+it gave exactly the same text, and the similarity of the texts overall, as
+measured by a :py:class:`~earwigbot.wiki.copyvios.markov.MarkovChain`.
+
+Every engine also runs on variants of the corpus that are encoded or labeled
+differently (see :py:data:`VARIANTS`), and its parity on them is measured
+against the ``"bs4"`` engine's text for the standard UTF-8 corpus, so that
+documents an engine decodes wrongly stand out. Run the benchmarks with::
+
+    python -m tests.benchmark_parsers [--docs N] [--paragraphs N] ...
+
+Use ``--help`` for the full list of options.
+"""
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from random import Random
+from time import time
+
+from earwigbot.wiki.copyvios.markov import MarkovChain, MarkovChainIntersection
+from earwigbot.wiki.copyvios.parsers import HTMLTextParser
+
+__all__ = ["VARIANTS", "make_corpus", "run_benchmark", "run_all"]
+
+WORDS = (u"the copyright article source text page were licence editor "
+         u"history museum river company album village season released "
+         u"population church school station university café naïve "
+         u"музей").split()
+
+# Variant name -> (encoding, where the encoding is declared: in a <meta> tag,
+# only in the Content-Type header given to strip_stream(), or nowhere).
+# Characters missing from an encoding are written as character references:
+VARIANTS = OrderedDict([
+    ("utf8", ("utf-8", "meta")),
+    ("undeclared", ("utf-8", None)),
+    ("header", ("koi8-r", "header")),
+    ("latin1", ("iso-8859-1", "meta"))
+])
+
+PAGE = u"""<!DOCTYPE html>
+<html><head>{meta}<title>{title}</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script type="text/javascript">var page = "{title}"; track(page);</script>
+</head><body>
+<div id="nav"><ul>{nav}</ul></div>
+<!-- begin article -->
+<div id="content"><h1>{title}</h1>
+{paragraphs}
+</div>
+<script>document.write("<p>ads</p>");</script>
+<div id="footer">&copy; 2013 Example &amp; Co. <br/>All rights reserved.</div>
+</body></html>
+"""
+
+def _sentence(rng):
+    """Return a random sentence, with some inline markup and entities."""
+    words = [rng.choice(WORDS) for i in xrange(rng.randint(6, 20))]
+    pos = rng.randrange(len(words))
+    words[pos] = rng.choice([u"<b>{0}</b>", u"<a href='/x'>{0}</a>",
+                             u"{0} &ndash;", u"&#8220;{0}&#8221;",
+                             u"{0}"]).format(words[pos])
+    return u" ".join(words).capitalize() + u"."
+
+def make_corpus(num=200, paragraphs=8, seed=0, variant="utf8"):
+    """Return a list of *num* generated HTML documents, as byte strings.
+
+    Each document has about *paragraphs* paragraphs of article text; the same
+    *seed* always gives the same text. *variant* is one of
+    :py:data:`VARIANTS`, and sets the documents' encoding and whether they
+    declare it in a ``<meta>`` tag.
+    """
+    encoding, declared = VARIANTS[variant]
+    meta = u""
+    if declared == "meta":
+        meta = u'<meta charset="{0}">'.format(encoding)
+    rng = Random(seed)
+    docs = []
+    for i in xrange(num):
+        nav = u"".join(u"<li><a href='/{0}'>{0}</a></li>".format(word)
+                       for word in rng.sample(WORDS, 6))
+        paras = []
+        for j in xrange(rng.randint(max(paragraphs / 2, 1), paragraphs * 2)):
+            text = u" ".join(_sentence(rng) for k in xrange(rng.randint(2, 6)))
+            paras.append(u"<p>{0}</p>".format(text))
+        page = PAGE.format(meta=meta, title=u"Document {0}".format(i),
+                           nav=nav, paragraphs=u"\n".join(paras))
+        docs.append(page.encode(encoding, "xmlcharrefreplace"))
+    return docs
+
+def run_benchmark(engine, corpus, reference=None, repeat=3, encoding=None):
+    """Run one engine over the *corpus* and return a dict of its results.
+
+    If *encoding* is given, the documents are stripped with
+    :py:meth:`~earwigbot.wiki.copyvios.parsers.HTMLTextParser.strip_stream`
+    as if it came from their ``Content-Type`` header.
+
+    The dict contains the ``engine``'s name, the best wall-clock ``time`` of
+    *repeat* runs, the throughput in ``mb_per_sec``, and the extracted
+    ``texts``. If a list of *reference* texts is given, it also contains the
+    fraction of texts that are ``identical`` to them and their overall
+    ``similarity``.
+    """
+    if encoding:
+        strip = lambda doc: HTMLTextParser.strip_stream([doc], engine,
+                                                        encoding)
+    else:
+        strip = lambda doc: HTMLTextParser(doc).strip(engine)
+    size = sum(len(doc) for doc in corpus)
+    best = None
+    for i in xrange(max(repeat, 1)):
+        start = time()
+        texts = [strip(doc) for doc in corpus]
+        elapsed = time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    best = max(best, 1e-9)
+    result = {
+        "engine": engine,
+        "time": best,
+        "mb_per_sec": size / best / 1024 ** 2,
+        "texts": texts
+    }
+    if reference is not None:
+        same = sum(1 for a, b in zip(texts, reference) if a == b)
+        result["identical"] = float(same) / len(corpus) if corpus else 1.0
+        ref = MarkovChain(u"\n".join(reference))
+        ours = MarkovChain(u"\n".join(texts))
+        common = MarkovChainIntersection(ref, ours).size()
+        total = max(ref.size(), ours.size())
+        result["similarity"] = float(common) / total if total else 1.0
+    return result
+
+def run_all(num=200, paragraphs=8, repeat=3, only=None, variants=None):
+    """Run every engine (or only those named in *only*) over generated
+    corpora, and return a list of their results.
+
+    *num* and *paragraphs* set the size of each corpus (see
+    :py:func:`make_corpus`), and *repeat* the number of timed runs per engine.
+    There is one corpus for each of *variants*, or for all of
+    :py:data:`VARIANTS` if not given; each result has the name of its
+    ``variant``. The ``"bs4"`` engine always runs first on the ``"utf8"``
+    corpus, since everything is compared to it.
+    """
+    corpus = make_corpus(num, paragraphs)
+    reference = run_benchmark("bs4", corpus, repeat=repeat)
+    reference["identical"] = reference["similarity"] = 1.0
+    reference["variant"] = "utf8"
+    results = []
+    for variant in variants or VARIANTS:
+        encoding, declared = VARIANTS[variant]
+        if variant != "utf8":
+            corpus = make_corpus(num, paragraphs, variant=variant)
+        for engine in HTMLTextParser.engines:
+            if only and engine != "bs4" and engine not in only:
+                continue
+            if variant == "utf8" and engine == "bs4":
+                results.append(reference)
+                continue
+            result = run_benchmark(engine, corpus, reference["texts"], repeat,
+                                   encoding if declared == "header" else None)
+            result["variant"] = variant
+            results.append(result)
+    return results
+
+def main():
+    """Parse command-line arguments, run the benchmarks, and print a table."""
+    parser = ArgumentParser(description="Benchmark the HTML text extraction "
+                                        "engines on a generated corpus.")
+    parser.add_argument("-n", "--docs", type=int, default=200,
+                        help="number of documents in the corpus (default 200)")
+    parser.add_argument("-p", "--paragraphs", type=int, default=8,
+                        help="typical number of paragraphs per document")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="timed runs per engine; the best is reported")
+    parser.add_argument("-e", "--engine", action="append", dest="only",
+                        choices=HTMLTextParser.engines,
+                        help="only run this engine (and bs4); may be repeated")
+    parser.add_argument("-c", "--corpus", action="append", dest="variants",
+                        choices=VARIANTS.keys(),
+                        help="only use this variant of the corpus; may be "
+                             "repeated")
+    args = parser.parse_args()
+
+    results = run_all(args.docs, args.paragraphs, args.repeat, args.only,
+                      args.variants)
+    header = "{0:<11} {1:<8} {2:>8} {3:>8} {4:>10} {5:>10}"
+    row = "{0:<11} {1:<8} {2:>8.3f} {3:>8.2f} {4:>9.1f}% {5:>9.1f}%"
+    print header.format("corpus", "engine", "time (s)", "MB/s", "identical",
+                        "similarity")
+    for res in results:
+        print row.format(res["variant"], res["engine"], res["time"],
+                         res["mb_per_sec"], res["identical"] * 100,
+                         res["similarity"] * 100)
+
+if __name__ == "__main__":
+    main()
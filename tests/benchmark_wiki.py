@@ -0,0 +1,182 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+Benchmarks for the wiki toolset, run against a local
+:py:class:`~tests.wikiserver.FakeWiki` so results don't depend on (or burden)
+a real wiki.
+
+Each benchmark times one common :py:class:`~earwigbot.wiki.site.Site`,
+:py:class:`~earwigbot.wiki.page.Page`, or
+:py:class:`~earwigbot.wiki.category.Category` workflow and reports the
+queries per second, pages per minute, and bytes transferred. Run them with::
+
+    python -m tests.benchmark_wiki [--latency SECONDS] [--pages N] ...
+
+Use ``--help`` for the full list of options.
+"""
+
+from argparse import ArgumentParser
+from time import time
+
+from earwigbot.wiki import AsyncSite, Site
+from earwigbot.wiki.keepalive import ConnectionPool
+from tests.wikiserver import FakeWiki, make_corpus
+
+__all__ = ["BENCHMARKS", "run_benchmark", "run_all"]
+
+def bench_api_queries(site, wiki, num):
+    """Make *num* identical small API queries, one after another."""
+    for i in xrange(num):
+        site.api_query(action="query", list="users", ususers="Example",
+                       usprop="editcount")
+    return 0
+
+def bench_async_queries(site, wiki, num):
+    """Make *num* small API queries at once through an AsyncSite."""
+    asite = AsyncSite(site)
+    results = [asite.api_query(action="query", list="users",
+                               ususers="Example{0}".format(i))
+               for i in xrange(num)]
+    AsyncSite.gather(results)
+    return 0
+
+def bench_page_get(site, wiki, num):
+    """Load the content of *num* pages, one page at a time."""
+    for i in xrange(num):
+        site.get_page(u"Page {0}".format(i)).get()
+    return num
+
+def bench_get_pages(site, wiki, num):
+    """Load the content of *num* pages in bulk with Site.get_pages()."""
+    titles = [u"Page {0}".format(i) for i in xrange(num)]
+    for page in site.get_pages(titles):
+        page.get()
+    return num
+
+def bench_category(site, wiki, num):
+    """Iterate over a category's members, loading each one's attributes."""
+    pages = 0
+    for page in site.get_category("Group 0").get_members():
+        page.exists
+        pages += 1
+    return pages
+
+def bench_edits(site, wiki, num):
+    """Edit *num* pages, one after another."""
+    edits = max(num / 10, 1)
+    for i in xrange(edits):
+        page = site.get_page(u"Sandbox {0}".format(i))
+        page.edit(u"Benchmark edit.", u"Benchmarking")
+    return edits
+
+BENCHMARKS = [
+    ("api_query (serial)", bench_api_queries),
+    ("api_query (async)", bench_async_queries),
+    ("Page.get (serial)", bench_page_get),
+    ("Site.get_pages", bench_get_pages),
+    ("Category.get_members", bench_category),
+    ("Page.edit", bench_edits),
+]
+
+def run_benchmark(name, func, site, wiki, num):
+    """Run one benchmark and return a dict of its results.
+
+    The dict contains the benchmark's ``name``, the wall-clock ``time`` it
+    took, the number of API ``requests`` made and ``bytes`` received, the
+    number of ``pages`` it handled, and the rates derived from those:
+    ``queries_per_sec`` and ``pages_per_min``.
+    """
+    wiki.reset_stats()
+    start = time()
+    pages = func(site, wiki, num)
+    elapsed = max(time() - start, 1e-9)
+    requests = wiki.stats["requests"]
+    return {
+        "name": name,
+        "time": elapsed,
+        "requests": requests,
+        "bytes": wiki.stats["bytes"],
+        "pages": pages,
+        "queries_per_sec": requests / elapsed,
+        "pages_per_min": pages * 60 / elapsed
+    }
+
+def run_all(num=100, latency=0.02, wait=0, reads=4, maxlag_errors=0,
+            only=None):
+    """Run every benchmark (or those whose names contain *only*) against a
+    fresh FakeWiki, and return a list of their results.
+
+    *num* sets the size of each benchmark's workload, *latency* the simulated
+    server latency, *wait* the site's minimum time between queries, *reads*
+    its maximum number of concurrent reads, and *maxlag_errors* the number of
+    maxlag errors the server will give before answering normally.
+    """
+    corpus = make_corpus(max(num, 1), num_categories=2)
+    wiki = FakeWiki(corpus, latency=latency)
+    pool = ConnectionPool()
+    try:
+        site = Site(base_url=wiki.base_url, script_path=wiki.script_path,
+                    maxlag=10, wait_between_queries=wait,
+                    max_concurrent_reads=reads, connection_pool=pool)
+        wiki.maxlag_errors = maxlag_errors
+        results = []
+        for name, func in BENCHMARKS:
+            if only and only.lower() not in name.lower():
+                continue
+            results.append(run_benchmark(name, func, site, wiki, num))
+        return results
+    finally:
+        pool.clear()
+        wiki.stop()
+
+def main():
+    """Parse command-line arguments, run the benchmarks, and print a table."""
+    parser = ArgumentParser(description="Benchmark the wiki toolset against "
+                                        "a local fake MediaWiki API server.")
+    parser.add_argument("-n", "--pages", type=int, default=100,
+                        help="workload size for each benchmark (default 100)")
+    parser.add_argument("-l", "--latency", type=float, default=0.02,
+                        help="simulated server latency in seconds")
+    parser.add_argument("-w", "--wait", type=float, default=0,
+                        help="the site's minimum wait between queries")
+    parser.add_argument("-r", "--reads", type=int, default=4,
+                        help="the site's maximum number of concurrent reads")
+    parser.add_argument("-m", "--maxlag-errors", type=int, default=0,
+                        help="number of maxlag errors to simulate")
+    parser.add_argument("-o", "--only", metavar="NAME",
+                        help="only run benchmarks whose names contain NAME")
+    args = parser.parse_args()
+
+    results = run_all(args.pages, args.latency, args.wait, args.reads,
+                      args.maxlag_errors, args.only)
+    header = "{0:<22} {1:>8} {2:>8} {3:>10} {4:>10} {5:>10}"
+    row = "{0:<22} {1:>8.2f} {2:>8} {3:>10.1f} {4:>10.1f} {5:>10.1f}"
+    print header.format("benchmark", "time (s)", "queries", "queries/s",
+                        "pages/min", "KB")
+    for res in results:
+        print row.format(res["name"], res["time"], res["requests"],
+                         res["queries_per_sec"], res["pages_per_min"],
+                         res["bytes"] / 1024.0)
+
+if __name__ == "__main__":
+    main()
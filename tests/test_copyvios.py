@@ -0,0 +1,534 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from logging import getLogger, NullHandler
+from random import Random
+from shutil import rmtree
+from StringIO import StringIO
+import sys
+from tempfile import mkdtemp
+from threading import enumerate as enumerate_threads
+from time import sleep
+import traceback
+import unittest
+import zlib
+
+from earwigbot.wiki import Site
+from earwigbot.wiki.copyvios import markov
+from earwigbot.wiki.copyvios.exclusions import ExclusionsDB, _ExclusionIndex
+from earwigbot.wiki.copyvios.fingerprint import Fingerprint, Prefilter
+from earwigbot.wiki.copyvios.markov import (MarkovChain, CompactMarkovChain,
+                                            MarkovChainIntersection)
+from earwigbot.wiki.copyvios.metrics import MetricsAggregator
+from earwigbot.wiki.copyvios.parsers import (HTMLTextParser,
+                                             RegexSentenceTokenizer)
+from earwigbot.wiki.copyvios.result import (CopyvioCheckResult,
+                                            CopyvioSourceResult)
+from earwigbot.wiki.copyvios.search import SearchScheduler
+from earwigbot.wiki.copyvios.searchcache import SearchCache
+from earwigbot.wiki.copyvios.sourcecache import SourceCache
+from earwigbot.wiki.copyvios.workers import CopyvioSource, CopyvioWorkspace
+from earwigbot.wiki.keepalive import ConnectionPool
+from tests.wikiserver import FakeWiki, make_corpus
+
+class FakeSearchEngine(object):
+    """A search engine that gives the same URLs for every query."""
+    name = "Fake"
+
+    def __init__(self, urls):
+        self.urls = urls
+        self.queries = []
+
+    def search(self, query):
+        self.queries.append(query)
+        return list(self.urls)
+
+
+class FakeSitesDB(object):
+    """A sites database that always gives the same site, unless it fails."""
+
+    def __init__(self, site):
+        self.site = site
+        self.fail = False
+        self.calls = 0
+
+    def get_site(self, name):
+        self.calls += 1
+        if self.fail:
+            raise IOError("Can't reach the site")
+        return self.site
+
+
+class FakeResponse(object):
+    """A response to a source download, with the given data and headers."""
+
+    def __init__(self, data, headers=None):
+        self._data = StringIO(data)
+        self.headers = headers or {}
+        self.closed = False
+
+    def read(self, amt=-1):
+        return self._data.read(amt)
+
+    def close(self):
+        self.closed = True
+
+
+def fake_compare(sources):
+    """Return a *compare* function for a CopyvioWorkspace.
+
+    *sources* maps URLs to ``(confidence, delay)`` tuples; comparing a URL
+    takes *delay* seconds. URLs that aren't in *sources* raise ValueError.
+    """
+    def compare(url):
+        if url not in sources:
+            raise ValueError(url)
+        confidence, delay = sources[url]
+        sleep(delay)
+        return confidence, (url,)
+    return compare
+
+
+def random_words(rand, count, vocabulary=2000):
+    """Return a text of *count* words picked with the Random object *rand*."""
+    return u" ".join(u"w{0}".format(rand.randrange(vocabulary))
+                     for i in xrange(count))
+
+
+class TestMarkovChain(unittest.TestCase):
+    texts = [u"", u"Only two", u"The quick brown fox jumps over the lazy dog.",
+             u"a b c a b c a b c d", random_words(Random(1), 500, 50)]
+
+    def setUp(self):
+        self.numpy_available = markov._use_numpy()
+
+    def tearDown(self):
+        markov._numpy_available = self.numpy_available
+
+    def assert_sizes_match(self):
+        """Check that compact chains give the same sizes as full ones."""
+        for text1 in self.texts:
+            full1, compact1 = MarkovChain(text1), CompactMarkovChain(text1)
+            self.assertEqual(full1.size(), compact1.size())
+            for text2 in self.texts:
+                full2, compact2 = MarkovChain(text2), CompactMarkovChain(text2)
+                expected = MarkovChainIntersection(full1, full2).size()
+                actual = MarkovChainIntersection(compact1, compact2).size()
+                self.assertEqual(expected, actual)
+
+    def test_sizes(self):
+        markov._numpy_available = False
+        self.assert_sizes_match()
+
+    def test_sizes_numpy(self):
+        if not self.numpy_available:
+            self.skipTest("NumPy is not installed")
+        self.assert_sizes_match()
+
+
+class TestPrefilter(unittest.TestCase):
+
+    def test_never_skips_matches(self):
+        rand = Random(5)
+        prefilter = Prefilter(0.5, error=0.001)
+        for trial in xrange(10):
+            words = random_words(rand, 400).split()
+            article = u" ".join(words)
+            article_chain = CompactMarkovChain(article)
+            for start in xrange(0, 400, 20):
+                for length in (100, 200, 300, 400):
+                    copied = u" ".join(words[start:start + length])
+                    source = u" ".join((random_words(rand, 100), copied,
+                                        random_words(rand, 100)))
+                    delta = MarkovChainIntersection(
+                        article_chain, CompactMarkovChain(source))
+                    confidence = float(delta.size()) / article_chain.size()
+                    if confidence < 0.5:
+                        continue
+                    self.assertTrue(prefilter.could_match(
+                        Fingerprint(article), Fingerprint(source)))
+
+            unrelated = Fingerprint(random_words(rand, 400))
+            self.assertFalse(prefilter.could_match(Fingerprint(article),
+                                                   unrelated))
+
+
+class TestCopyvioWorkspace(unittest.TestCase):
+
+    def test_best_in_batch(self):
+        sources = {"http://a.example/": (0.6, 0),
+                   "http://b.example/": (0.9, 0.05),
+                   "http://c.example/": (0.9, 0.05),
+                   "http://d.example/": (1.0, 0)}
+        workspace = CopyvioWorkspace(fake_compare(sources), 0.5, workers=4)
+        workspace.enqueue(["http://a.example/", "http://b.example/",
+                           "http://c.example/"])
+        self.assertTrue(workspace.wait())
+        self.assertTrue(workspace.found)
+        workspace.enqueue(["http://d.example/"])  # After the match's query
+        self.assertTrue(workspace.wait())
+        workspace.stop()
+        self.assertEqual((0.9, "http://b.example/", ("http://b.example/",)),
+                         workspace.best)
+
+    def test_deterministic(self):
+        rand = Random(3)
+        for trial in xrange(20):
+            sources = {}
+            batches = []
+            for query in xrange(4):
+                batch = []
+                for i in xrange(5):
+                    url = "http://d{0}.example/{1}/{2}".format(i % 3, query, i)
+                    sources[url] = (rand.random(), rand.random() / 100)
+                    batch.append(url)
+                batches.append(batch)
+
+            expected = (0, None, None)
+            for batch in batches:  # What a serial check would find
+                for url in batch:
+                    confidence = sources[url][0]
+                    if confidence > expected[0]:
+                        expected = (confidence, url, (url,))
+                if expected[0] >= 0.8:
+                    break
+
+            workspace = CopyvioWorkspace(fake_compare(sources), 0.8,
+                                         workers=8, domain_workers=2)
+            for batch in batches:
+                workspace.enqueue(batch)
+            self.assertTrue(workspace.wait())
+            workspace.stop()
+            self.assertEqual(expected, workspace.best)
+
+    def test_traceback(self):
+        workspace = CopyvioWorkspace(fake_compare({}), 0.5, workers=2)
+        workspace.enqueue(["http://missing.example/"])
+        try:
+            workspace.wait()
+        except ValueError:
+            frames = traceback.extract_tb(sys.exc_info()[2])
+            self.assertEqual("compare", frames[-1][2])
+        else:
+            self.fail("ValueError not raised")
+        finally:
+            workspace.stop()
+
+
+class TestCopyvioSource(unittest.TestCase):
+
+    def test_reject(self):
+        source = CopyvioSource(u"http://example.com/", u"The quick brown fox")
+        source.fingerprint
+        source.reject()
+        self.assertTrue(source.rejected)
+        self.assertIsNone(source.chain)
+
+    def test_keep_compared_text(self):
+        text = u"The quick brown fox"
+        source = CopyvioSource(u"http://example.com/", text)
+        chain = source.chain
+        source.fingerprint
+        source.reject()  # Another check's prefilter skipped it
+        self.assertFalse(source.rejected)
+        self.assertEqual(text, chain.text)
+        self.assertEqual(6, chain.size())
+        self.assertIsNotNone(chain.chain)
+
+
+class TestParsers(unittest.TestCase):
+    sample = (u"Mr. Smith went to the store. He bought apples, oranges, "
+              u"etc. and then left! Did he pay? Yes.\nA new line starts here")
+    sentences = [u"Mr. Smith went to the store.",
+                 u"He bought apples, oranges, etc. and then left!",
+                 u"Did he pay?", u"Yes.", u"A new line starts here"]
+
+    def test_regex_tokenizer(self):
+        tokenizer = RegexSentenceTokenizer()
+        self.assertEqual(self.sentences, tokenizer.tokenize(self.sample))
+        self.assertEqual([], tokenizer.tokenize(u""))
+
+    def test_regex_tokenizer_punkt(self):
+        try:
+            import nltk
+            punkt = nltk.data.load("tokenizers/punkt/english.pickle")
+        except (ImportError, LookupError):
+            self.skipTest("NLTK's punkt data is not installed")
+        self.assertEqual(punkt.tokenize(self.sample),
+                         RegexSentenceTokenizer().tokenize(self.sample))
+
+    def test_strip_stream(self):
+        html = (u"<html><head><title>Title</title></head><body>"
+                u"<p>Caf\xe9 cr\xe8me br\xfbl\xe9e</p><script>var x;</script>"
+                u"<p>Second paragraph</p></body></html>").encode("utf8")
+        expected = HTMLTextParser(html).strip("fast")
+        self.assertIn(u"Caf\xe9", expected)
+        chunks = [html[i:i + 7] for i in xrange(0, len(html), 7)]
+        stripped = HTMLTextParser.strip_stream(iter(chunks), "fast", "utf-8")
+        self.assertEqual(expected, stripped)
+
+
+class TestCaches(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = mkdtemp()
+
+    def tearDown(self):
+        rmtree(self.tempdir)
+
+    def test_source_cache_ttl(self):
+        cache = SourceCache(self.tempdir + "/sources.db", ttl=0.2)
+        self.assertIsNone(cache.get(u"http://example.com/"))
+        cache.put(u"http://example.com/", u"Some text", etag='"abc"')
+        cached = cache.get(u"http://example.com/")
+        self.assertEqual(u"Some text", cached.text)
+        self.assertTrue(cached.fresh)
+        self.assertTrue(cached.validators)
+        sleep(0.3)
+        self.assertFalse(cache.get(u"http://example.com/").fresh)
+        cache.revalidate(u"http://example.com/")
+        self.assertTrue(cache.get(u"http://example.com/").fresh)
+        stats = cache.get_stats()
+        self.assertEqual((2, 1, 1, 1), (stats["hits"], stats["misses"],
+                                        stats["revalidated"], stats["stored"]))
+
+    def test_source_cache_eviction(self):
+        rand = Random(7)
+        texts = [random_words(rand, 200) for i in xrange(3)]
+        size = max(len(zlib.compress(text.encode("utf8"))) for text in texts)
+        cache = SourceCache(self.tempdir + "/sources.db", max_size=size * 2)
+        cache.put(u"http://example.com/0", texts[0])
+        sleep(0.01)
+        cache.put(u"http://example.com/1", texts[1])
+        sleep(0.01)
+        cache.get(u"http://example.com/0")  # 1 is now least recently used
+        sleep(0.01)
+        cache.put(u"http://example.com/2", texts[2])
+        self.assertIsNotNone(cache.get(u"http://example.com/0"))
+        self.assertIsNone(cache.get(u"http://example.com/1"))
+        self.assertEqual(texts[2], cache.get(u"http://example.com/2").text)
+        self.assertEqual(1, cache.get_stats()["evictions"])
+
+    def test_search_cache(self):
+        cache = SearchCache(self.tempdir + "/searches.db", ttl=0.2)
+        urls = [u"http://example.com/", u"http://example.org/"]
+        cache.put("Fake", u"Some  Query", urls)
+        self.assertEqual(urls, cache.get("Fake", u"some query"))
+        self.assertIsNone(cache.get("Other", u"some query"))
+        sleep(0.3)
+        self.assertIsNone(cache.get("Fake", u"some query"))
+
+    def test_search_scheduler(self):
+        cache = SearchCache(self.tempdir + "/searches.db")
+        engine = FakeSearchEngine([u"http://example.com/"])
+        scheduler = SearchScheduler(engine, cache, interquery_sleep=0)
+        self.assertEqual(([u"http://example.com/"], True),
+                         scheduler.search(u"Some query"))
+        self.assertEqual(([u"http://example.com/"], False),
+                         scheduler.search(u"some  QUERY"))
+        scheduler = SearchScheduler(engine, cache, interquery_sleep=0)
+        self.assertEqual(([u"http://example.com/"], False),
+                         scheduler.search(u"Some query"))
+        self.assertEqual([u"Some query"], engine.queries)
+
+
+class TestExclusions(unittest.TestCase):
+
+    def test_index(self):
+        index = _ExclusionIndex([u"mirror.example/wiki", u"*.fork.example",
+                                 u"example.net"])
+        self.assertTrue(index.matches(u"http://mirror.example/wiki/Foo"))
+        self.assertTrue(index.matches(u"https://MIRROR.example/wiki"))
+        self.assertFalse(index.matches(u"http://mirror.example/other"))
+        self.assertFalse(index.matches(u"http://mirror.example/"))
+        self.assertTrue(index.matches(u"http://example.net.au/"))
+        self.assertTrue(index.matches(u"http://fork.example/page"))
+        self.assertTrue(index.matches(u"https://a.b.FORK.example:8080/"))
+        self.assertFalse(index.matches(u"http://notfork.example/"))
+        self.assertFalse(index.matches(u"http://fork.example.org/"))
+        self.assertFalse(_ExclusionIndex([]).matches(u"http://example.com/"))
+
+    def test_sync(self):
+        wiki = FakeWiki({
+            u"User:EarwigBot/Copyvios/Exclusions":
+                u"* Site: [http://mirror.example/wiki]\n",
+            u"Wikipedia:Mirrors and forks/Abc":
+                u"{{mirror\n| url = *.fork.example\n}}\n"
+        })
+        tempdir = mkdtemp()
+        try:
+            site = Site(base_url=wiki.base_url, script_path=wiki.script_path,
+                        wait_between_queries=0, search_config={})
+            sitesdb = FakeSitesDB(site)
+            logger = getLogger("earwigbot.tests")
+            logger.addHandler(NullHandler())
+            exclusions = ExclusionsDB(sitesdb, tempdir + "/exclusions.db",
+                                      logger)
+            exclusions.sync("enwiki")
+            urls = [u"http://mirror.example/wiki/Foo",
+                    u"http://a.fork.example/", u"http://example.com/"]
+            self.assertEqual(set(urls[:2]),
+                             exclusions.check_many("enwiki", urls))
+            self.assertTrue(exclusions.check("all", urls[0]))
+            self.assertFalse(exclusions.check("all", urls[1]))
+
+            requests = wiki.stats["requests"]
+            exclusions._update("enwiki")  # Unchanged sources aren't reloaded
+            self.assertEqual(1, wiki.stats["requests"] - requests)
+
+            sitesdb.fail = True
+            exclusions._last_updates = {"enwiki": 1, "all": 1}
+            exclusions.sync("enwiki")
+            for thread in enumerate_threads():
+                if thread.name.startswith("exclusionsdb-"):
+                    thread.join()
+            calls = sitesdb.calls
+            self.assertEqual(set(urls[:2]),
+                             exclusions.check_many("enwiki", urls))
+            exclusions.sync("enwiki")  # Don't try again right after failing
+            self.assertEqual(calls, sitesdb.calls)
+        finally:
+            rmtree(tempdir)
+            wiki.stop()
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_totals(self):
+        compared = CopyvioSourceResult(u"http://a.example/", "compared", 0.9)
+        compared.size = 100
+        skipped = CopyvioSourceResult(u"http://b.example/", "skipped")
+        other = CopyvioSourceResult(u"http://c.example/", "compared", 0.1)
+        other.size = 50
+        result1 = CopyvioCheckResult(
+            True, 0.9, u"http://a.example/", 2, 3.0, None, (None, None),
+            {"search": 1.5, "fetch": 1.0}, [compared, skipped])
+        result2 = CopyvioCheckResult(
+            False, 0.1, None, 1, 1.0, None, (None, None), {"search": 0.5},
+            [other])
+
+        aggregator = MetricsAggregator()
+        self.assertEqual(0.0, aggregator.get_stats()["mean"])
+        aggregator.record(None, result1)
+        aggregator.record(None, result2)
+        expected = {"checks": 2, "violations": 1, "queries": 3, "bytes": 150,
+                    "time": 4.0, "mean": 2.0,
+                    "timings": {"search": 2.0, "fetch": 1.0},
+                    "sources": {"compared": 2, "skipped": 1}}
+        self.assertEqual(expected, aggregator.get_stats())
+        aggregator.reset()
+        self.assertEqual(0, aggregator.get_stats()["checks"])
+
+
+class TestCopyvioCheck(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.wiki = FakeWiki(make_corpus(10, num_categories=1))
+        cls.pool = ConnectionPool()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.clear()
+        cls.wiki.stop()
+
+    def get_page(self, sources, title=u"Page 1", site=None, fetched=None,
+                 **search_config):
+        """Return a page whose copyvio checks find the given *sources*.
+
+        *sources* is a list of ``(url, text)`` tuples, in search result order.
+        If *fetched* is given, each URL the page downloads is appended to it.
+        """
+        if not site:
+            config = {"nltk_dir": "", "tokenizer": "regex", "workers": 4}
+            config.update(search_config)
+            site = Site(base_url=self.wiki.base_url,
+                        script_path=self.wiki.script_path,
+                        wait_between_queries=0, connection_pool=self.pool,
+                        search_config=config)
+        page = site.get_page(title)
+        texts = dict(sources)
+        engine = FakeSearchEngine([url for url, text in sources])
+
+        def get_source_text(url, outcome=None):
+            if fetched is not None:
+                fetched.append(url)
+            return texts.get(url)
+
+        page._select_search_engine = lambda: engine
+        page._get_source_text = get_source_text
+        return page
+
+    def test_prefilter_keeps_best_chains(self):
+        sources = [(u"http://other.example/", self.wiki.get_text(u"Page 6")),
+                   (u"http://copy.example/", self.wiki.get_text(u"Page 1"))]
+        page = self.get_page(sources, prefilter_error=0.001)
+        result = page.copyvio_check(max_queries=2, interquery_sleep=0)
+        self.assertTrue(result.violation)
+        self.assertEqual(u"http://copy.example/", result.url)
+        self.assertIsNotNone(result.source_chain.text)
+        self.assertIsNotNone(result.source_chain.chain)
+        self.assertIsNotNone(result.delta_chain.chain)
+        self.assertTrue(result.delta_chain.chain)
+
+    def test_metrics_sink(self):
+        aggregator = MetricsAggregator()
+        sources = [(u"http://copy.example/", self.wiki.get_text(u"Page 1"))]
+        page = self.get_page(sources, metrics_sink=aggregator)
+        page.copyvio_check(max_queries=1, interquery_sleep=0)
+        stats = aggregator.get_stats()
+        self.assertEqual(1, stats["checks"])
+        self.assertEqual(1, stats["violations"])
+        self.assertEqual(1, stats["queries"])
+
+    def test_read_response(self):
+        page = self.get_page([], max_download_size=1000)
+        data = random_words(Random(2), 10000).encode("utf8")
+        response = FakeResponse(data)
+        self.assertEqual(data[:1000], "".join(page._read_response(response)))
+        self.assertTrue(response.closed)
+
+        compressor = zlib.compressobj(9, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        gzipped = compressor.compress(data) + compressor.flush()
+        response = FakeResponse(gzipped, {"Content-Encoding": "gzip"})
+        self.assertEqual(data[:1000], "".join(page._read_response(response)))
+        self.assertTrue(response.closed)
+
+    def test_batch_shares_sources(self):
+        sources = [(u"http://copy1.example/", self.wiki.get_text(u"Page 1")),
+                   (u"http://copy2.example/", self.wiki.get_text(u"Page 2"))]
+        fetched = []
+        page1 = self.get_page(sources, fetched=fetched)
+        page2 = self.get_page(sources, u"Page 2", page1.site, fetched)
+        batch = page1.site.copyvio_check_many(
+            [page1, page2], max_queries=1, interquery_sleep=0)
+        results = dict((page.title, result) for page, result in batch)
+        self.assertEqual(u"http://copy1.example/", results[u"Page 1"].url)
+        self.assertEqual(u"http://copy2.example/", results[u"Page 2"].url)
+        self.assertEqual(sorted(url for url, text in sources),
+                         sorted(fetched))
+        stats = batch.get_stats()
+        self.assertEqual(2, stats["pages"])
+        self.assertEqual(2, stats["sources_fetched"])
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
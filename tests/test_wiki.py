@@ -0,0 +1,131 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import unittest
+
+from earwigbot.exceptions import APIError
+from earwigbot.wiki import Category, Site
+from earwigbot.wiki.cache import ResponseCache
+from earwigbot.wiki.keepalive import ConnectionPool
+from tests.wikiserver import FakeWiki, make_corpus
+
+class TestSite(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.wiki = FakeWiki(make_corpus(120, num_categories=2))
+        cls.pool = ConnectionPool()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.pool.clear()
+        cls.wiki.stop()
+
+    def setUp(self):
+        self.site = Site(base_url=self.wiki.base_url,
+                         script_path=self.wiki.script_path,
+                         wait_between_queries=0, connection_pool=self.pool)
+        self.wiki.reset_stats()
+
+    def test_attributes(self):
+        self.assertEqual("testwiki", self.site.name)
+        self.assertEqual("wikipedia", self.site.project)
+        self.assertEqual("en", self.site.lang)
+
+    def test_namespaces(self):
+        self.assertEqual(3, self.site.namespace_name_to_id("user_TALK"))
+        self.assertEqual((14, u"Foo"), self.site.split_title(u"Category:Foo"))
+        self.assertEqual((0, u"Foo:Bar"), self.site.split_title(u"Foo:Bar"))
+        self.assertEqual((0, u"Category:Foo"),
+                         self.site.split_title(u":Category:Foo"))
+        self.assertIsInstance(self.site.get_page(u"category:Foo"), Category)
+
+    def test_get_pages(self):
+        titles = [u"Page {0}".format(i) for i in xrange(60)]
+        titles += [u"page_3", u"Missing page", u"Redirect 2"]
+        pages = self.site.get_pages(titles, follow_redirects=True)
+        # One query for our rights, two batches of titles, one for redirects:
+        self.assertEqual(4, self.wiki.stats["requests"])
+        self.assertEqual(len(titles), len(pages))
+        self.assertEqual(u"Page 3", pages[60].title)
+        self.assertEqual(pages[0].PAGE_MISSING, pages[61].exists)
+        self.assertEqual(u"Page 2", pages[62].title)
+        self.assertEqual(self.wiki.get_text(u"Page 7"), pages[7].get())
+        self.assertEqual(4, self.wiki.stats["requests"])
+
+    def test_titles_limit_after_login(self):
+        self.site.get_pages([u"Page 1"])
+        self.wiki.reset_stats()
+        self.site._login((u"Example", u"password"))
+        self.assertEqual(2, self.wiki.stats["requests"])
+        self.site.get_pages([u"Page 2"])
+        # Our rights may have changed, so they're checked again:
+        self.assertEqual(4, self.wiki.stats["requests"])
+
+    def test_api_query_iter(self):
+        for style in ({}, {"continue": ""}):
+            self.wiki.reset_stats()
+            members = list(self.site.api_query_iter(
+                action="query", list="categorymembers",
+                cmtitle=u"Category:Group 0", cmlimit=25, **style))
+            self.assertEqual(60, len(set(m["title"] for m in members)))
+            self.assertEqual(3, self.wiki.stats["requests"])
+
+        category = self.site.get_category(u"Group 1")
+        self.assertEqual(60, len(list(category.get_members())))
+        self.assertEqual(10, len(list(category.get_members(limit=10))))
+
+    def test_response_cache(self):
+        site = Site(base_url=self.wiki.base_url,
+                    script_path=self.wiki.script_path, wait_between_queries=0,
+                    connection_pool=self.pool,
+                    response_cache=ResponseCache({"query": 60}))
+        self.wiki.reset_stats()
+        for i in xrange(3):
+            site.api_query(action="query", list="users", ususers="Example")
+        self.assertEqual(1, self.wiki.stats["requests"])
+        self.assertEqual(2, site.get_stats()["cache"]["hits"])
+
+        site.get_page(u"Sandbox").edit(u"Test", u"Testing")
+        site.api_query(action="query", list="users", ususers="Example")
+        self.assertEqual(4, self.wiki.stats["requests"])
+
+    def test_http_error(self):
+        pool = ConnectionPool()
+        site = Site(base_url=self.wiki.base_url,
+                    script_path=self.wiki.script_path, wait_between_queries=0,
+                    connection_pool=pool)
+        opened = pool.get_stats()["opened"]
+        self.wiki.http_errors = 1
+        self.assertRaises(APIError, site.api_query, action="query",
+                          list="users", ususers="Example")
+        site.api_query(action="query", list="users", ususers="Example")
+        self.assertEqual(opened, pool.get_stats()["opened"])
+        pool.clear()
+
+    def test_edit(self):
+        page = self.site.get_page(u"Sandbox")
+        page.edit(u"Hello, world!", u"Testing")
+        self.assertEqual(u"Hello, world!", self.wiki.get_text(u"Sandbox"))
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
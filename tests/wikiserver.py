@@ -0,0 +1,449 @@
+# -*- coding: utf-8  -*-
+#
+# Copyright (C) 2009-2013 Ben Kurtovic <ben.kurtovic@verizon.net>
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""
+A local stand-in for a MediaWiki API server, used to test and benchmark the
+wiki toolset without touching a real wiki.
+
+FakeWiki holds a corpus of pages (a dict of titles to wikitext) and serves the
+small part of api.php that the toolset uses: siteinfo, userinfo, login, page
+info and revisions, categorymembers, backlinks, users, and edit. It runs in a
+background thread on a free local port. Latency, maxlag errors, HTTP errors,
+and rate limits can be simulated, and every request is counted so benchmarks
+can report how many queries and bytes a workflow needed.
+
+Example usage::
+
+    >>> wiki = FakeWiki(make_corpus(100), latency=0.05)
+    >>> site = Site(base_url=wiki.base_url, script_path=wiki.script_path)
+    >>> site.get_page("Page 1").get()[:15]
+    u'{{Infobox|n=1}}'
+    >>> wiki.stats["requests"]
+    2
+    >>> wiki.stop()
+"""
+
+import BaseHTTPServer
+from gzip import GzipFile
+from json import dumps
+import re
+from SocketServer import ThreadingMixIn
+from StringIO import StringIO
+from threading import Lock, Thread
+from time import sleep, time
+from urlparse import parse_qs, urlparse
+
+__all__ = ["FakeWiki", "make_corpus"]
+
+NAMESPACES = {
+    -2: ["Media"], -1: ["Special"], 0: [""], 1: ["Talk"],
+    2: ["User"], 3: ["User talk"], 4: ["Wikipedia", "Project", "WP"],
+    5: ["Wikipedia talk", "Project talk", "WT"], 10: ["Template"],
+    11: ["Template talk"], 14: ["Category"], 15: ["Category talk"]
+}
+
+def make_corpus(num_pages=200, num_categories=5, redirects=10, words=400):
+    """Return a generated corpus of pages, as a dict of titles to wikitext.
+
+    Pages are spread evenly between categories; the first few pages get
+    redirects pointing at them.
+    """
+    vocab = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf",
+             "hotel", "india", "juliet", "kilo", "lima", "mike", "november",
+             "oscar", "papa", "quebec", "romeo", "sierra", "tango"]
+    corpus = {}
+    for i in xrange(num_pages):
+        body = []
+        for j in xrange(words):
+            body.append(vocab[(i * 7 + j * 13 + j / 5) % len(vocab)])
+            if j % 12 == 11:
+                body[-1] += "."
+        cat = "Category:Group {0}".format(i % num_categories)
+        text = u"{{{{Infobox|n={0}}}}}\n'''Page {0}''' {1}\n\n[[{2}]]"
+        corpus[u"Page {0}".format(i)] = text.format(i, " ".join(body), cat)
+    for i in xrange(num_categories):
+        corpus[u"Category:Group {0}".format(i)] = u"A category."
+    for i in xrange(redirects):
+        corpus[u"Redirect {0}".format(i)] = u"#REDIRECT [[Page {0}]]".format(i)
+    corpus[u"Template:Infobox"] = u"<includeonly>{{{n}}}</includeonly>"
+    for i in xrange(3):
+        text = u"#REDIRECT [[Template:Infobox]]"
+        corpus[u"Template:Ib{0}".format(i)] = text
+    return corpus
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Handles a single HTTP request to the fake wiki."""
+    protocol_version = "HTTP/1.1"
+    wbufsize = -1  # Send headers and body together, avoiding Nagle delays
+
+    def log_message(self, format, *args):
+        pass
+
+    def _params(self):
+        query = urlparse(self.path).query
+        if self.command == "POST":
+            length = int(self.headers.get("Content-Length", 0))
+            query = self.rfile.read(length)
+        params = parse_qs(query, keep_blank_values=True)
+        return dict((key, val[0].decode("utf8"))
+                    for key, val in params.iteritems())
+
+    def _respond(self, data, status=200):
+        body = dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if self.server.wiki.gzip and "gzip" in self.headers.get(
+                "Accept-Encoding", ""):
+            stream = StringIO()
+            gzipper = GzipFile(fileobj=stream, mode="w")
+            gzipper.write(body)
+            gzipper.close()
+            body = stream.getvalue()
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        for cookie in getattr(self, "_cookies", []):
+            self.send_header("Set-Cookie", cookie)
+        self.end_headers()
+        self.wfile.write(body)
+        self.server.wiki._count_bytes(len(body))
+
+    def do_GET(self):
+        params = self._params()
+        if self.server.wiki._take_http_error():
+            self._respond({"error": "Internal Server Error"}, 500)
+            return
+        self._respond(self.server.wiki.handle(params, self))
+
+    do_POST = do_GET
+
+
+class _Server(ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class FakeWiki(object):
+    """A fake MediaWiki API server running in a background thread.
+
+    *corpus* is a dict of page titles to wikitext. *latency* is the number of
+    seconds to wait before answering each request. *maxlag_errors* is the
+    number of upcoming requests to answer with a maxlag error, and
+    *http_errors* the number to answer with an HTTP 500 error. *rate_limit* is
+    the maximum number of requests allowed per second before we start
+    answering with ``ratelimited`` errors (``None`` for no limit).
+    """
+
+    def __init__(self, corpus=None, latency=0, maxlag_errors=0,
+                 rate_limit=None, gzip=True, http_errors=0):
+        self.latency = latency
+        self.maxlag_errors = maxlag_errors
+        self.http_errors = http_errors
+        self.rate_limit = rate_limit
+        self.gzip = gzip
+        self._lock = Lock()
+        self._pages = {}
+        self._next_id = 1
+        self._next_revid = 1000
+        for title, text in sorted((corpus or {}).iteritems()):
+            self._store(title, text)
+        self.reset_stats()
+
+        self._server = _Server(("127.0.0.1", 0), _Handler)
+        self._server.wiki = self
+        self.port = self._server.server_address[1]
+        self.base_url = "//127.0.0.1:{0}".format(self.port)
+        self.script_path = "/w"
+        self._thread = Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __repr__(self):
+        """Return the canonical string representation of the FakeWiki."""
+        return "FakeWiki(port={0!r})".format(self.port)
+
+    def stop(self):
+        """Shut down the server."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        """Reset the request counters."""
+        with self._lock:
+            self.stats = {"requests": 0, "bytes": 0, "actions": {},
+                          "titles": 0}
+            self._window = []
+
+    def _take_http_error(self):
+        """Return whether to answer the current request with an HTTP error."""
+        with self._lock:
+            if self.http_errors:
+                self.http_errors -= 1
+                return True
+            return False
+
+    def _count_bytes(self, num):
+        with self._lock:
+            self.stats["bytes"] += num
+
+    def _store(self, title, text):
+        """Store a page in the corpus, giving it a new revision ID."""
+        title = self._normalize(title)
+        with self._lock:
+            if title in self._pages:
+                page = self._pages[title]
+            else:
+                page = {"pageid": self._next_id, "creator": u"Creator"}
+                self._next_id += 1
+                self._pages[title] = page
+            page["text"] = text
+            page["revid"] = self._next_revid
+            page["timestamp"] = "2013-01-01T00:00:00Z"
+            self._next_revid += 1
+
+    def get_text(self, title):
+        """Return the current text of a page in the corpus."""
+        return self._pages[self._normalize(title)]["text"]
+
+    def _split(self, title):
+        """Return the namespace ID and base name of a title."""
+        if ":" in title:
+            prefix, base = title.split(":", 1)
+            for ns_id, names in NAMESPACES.iteritems():
+                if prefix.strip().lower() in [n.lower() for n in names if n]:
+                    return ns_id, names[0], base.strip()
+        return 0, "", title
+
+    def _normalize(self, title):
+        """Normalize a title the way MediaWiki would."""
+        title = re.sub(r"[_ ]+", " ", title).strip()
+        ns_id, prefix, base = self._split(title)
+        base = base[:1].upper() + base[1:]
+        return u":".join((prefix, base)) if prefix else base
+
+    def _error(self, code, info):
+        return {"error": {"code": code, "info": info}}
+
+    def _throttle(self, params):
+        """Return an error response if this request should be rejected."""
+        with self._lock:
+            self.stats["requests"] += 1
+            action = params.get("action", "")
+            actions = self.stats["actions"]
+            actions[action] = actions.get(action, 0) + 1
+            if self.maxlag_errors and "maxlag" in params:
+                self.maxlag_errors -= 1
+                info = "Waiting for db1: 5 seconds lagged"
+                return self._error("maxlag", info)
+            if self.rate_limit:
+                now = time()
+                self._window = [t for t in self._window if now - t < 1]
+                if len(self._window) >= self.rate_limit:
+                    return self._error("ratelimited", "You've exceeded your "
+                                       "rate limit. Please wait some time "
+                                       "and try again.")
+                self._window.append(now)
+
+    def handle(self, params, handler):
+        """Return the response to an API request with the given *params*."""
+        if self.latency:
+            sleep(self.latency)
+        error = self._throttle(params)
+        if error:
+            return error
+        action = params.get("action")
+        if action == "query":
+            return self._query(params)
+        if action == "login":
+            return self._login(params, handler)
+        if action == "logout":
+            return {}
+        if action == "edit":
+            return self._edit(params)
+        return self._error("unknown_action", "Unrecognized value for "
+                           "parameter 'action': {0}".format(action))
+
+    def _login(self, params, handler):
+        if "lgtoken" not in params:
+            return {"login": {"result": "NeedToken", "token": "abc123"}}
+        if params.get("lgpassword") != "password":
+            return {"login": {"result": "WrongPass"}}
+        name = params["lgname"]
+        handler._cookies = ["testwikiUserName={0}; Path=/".format(name),
+                            "testwikiToken=xyz; Path=/"]
+        return {"login": {"result": "Success", "lgusername": name}}
+
+    def _edit(self, params):
+        if not params.get("token"):
+            return self._error("notoken", "The token parameter must be set")
+        title = self._normalize(params["title"])
+        text = params.get("text", u"")
+        if params.get("section") == "new" and title in self._pages:
+            text = self._pages[title]["text"] + u"\n\n" + text
+        self._store(title, text)
+        return {"edit": {"result": "Success", "title": title,
+                         "newrevid": self._pages[title]["revid"]}}
+
+    def _query(self, params):
+        result = {"query": {}}
+        query = result["query"]
+        if "meta" in params:
+            for meta in params["meta"].split("|"):
+                if meta == "siteinfo":
+                    self._siteinfo(params, query)
+                elif meta == "userinfo":
+                    query["userinfo"] = {"id": 1, "name": "Bot",
+                                         "rights": ["read", "edit"]}
+        if "titles" in params:
+            self._pages_query(params, result)
+        if "list" in params:
+            for name in params["list"].split("|"):
+                func = getattr(self, "_list_" + name, None)
+                if func:
+                    func(params, result)
+        return result
+
+    def _siteinfo(self, params, query):
+        props = params.get("siprop", "general").split("|")
+        if "general" in props:
+            query["general"] = {
+                "wikiid": "testwiki", "sitename": "Wikipedia", "lang": "en",
+                "server": self.base_url, "articlepath": "/wiki/$1",
+                "scriptpath": self.script_path
+            }
+        if "namespaces" in props:
+            namespaces = {}
+            for ns_id, names in NAMESPACES.iteritems():
+                namespaces[str(ns_id)] = {"id": ns_id, "*": names[0]}
+                if ns_id:
+                    namespaces[str(ns_id)]["canonical"] = names[0]
+            query["namespaces"] = namespaces
+        if "namespacealiases" in props:
+            query["namespacealiases"] = [
+                {"id": ns_id, "*": alias}
+                for ns_id, names in NAMESPACES.iteritems()
+                for alias in names[1:]]
+        if "dbrepllag" in props:
+            query["dbrepllag"] = [{"host": "db1", "lag": 0}]
+
+    def _pages_query(self, params, result):
+        query = result["query"]
+        titles = params["titles"].split("|")
+        props = params.get("prop", "").split("|")
+        rvprops = params.get("rvprop", "ids|timestamp|flags|comment|user")
+        rvprops = rvprops.split("|")
+        with self._lock:
+            self.stats["titles"] += len(titles)
+        pages = {}
+        missing = -1
+        for title in titles:
+            normal = self._normalize(title)
+            if normal != title:
+                query.setdefault("normalized", []).append(
+                    {"from": title, "to": normal})
+            ns_id = self._split(normal)[0]
+            if re.search(r"[\[\]{}|#<>]", normal) or not normal:
+                pages[str(missing)] = {"title": title, "invalid": ""}
+                missing -= 1
+                continue
+            info = {"ns": ns_id, "title": normal}
+            page = self._pages.get(normal)
+            if page:
+                key = str(page["pageid"])
+                info["pageid"] = page["pageid"]
+                info["lastrevid"] = page["revid"]
+                info["length"] = len(page["text"])
+                if page["text"].upper().startswith("#REDIRECT"):
+                    info["redirect"] = ""
+            else:
+                key = str(missing)
+                missing -= 1
+                info["missing"] = ""
+            if "info" in props:
+                info["protection"] = []
+                url = "http:{0}/wiki/{1}".format(self.base_url,
+                                                 normal.replace(" ", "_"))
+                info["fullurl"] = url
+                if params.get("intoken") == "edit":
+                    info["edittoken"] = "+\\"
+            if "revisions" in props and page:
+                rev = {"revid": page["revid"]}
+                if "content" in rvprops:
+                    rev["*"] = page["text"]
+                if "timestamp" in rvprops:
+                    rev["timestamp"] = page["timestamp"]
+                if "user" in rvprops:
+                    rev["user"] = page["creator"]
+                info["revisions"] = [rev]
+            if "categoryinfo" in props and ns_id == 14:
+                members = self._category_members(normal)
+                info["categoryinfo"] = {
+                    "size": len(members), "pages": len(members), "files": 0,
+                    "subcats": 0}
+            pages[key] = info
+        query["pages"] = pages
+
+    def _continue(self, params, result, module, key, offset):
+        """Add a continuation block to *result* in the style requested."""
+        if "continue" in params:
+            result["continue"] = {key: str(offset), "continue": "-||"}
+        else:
+            result["query-continue"] = {module: {key: str(offset)}}
+
+    def _paginate(self, params, result, module, prefix, items):
+        limit = params.get(prefix + "limit", "10")
+        limit = 500 if limit == "max" else int(limit)
+        offset = int(params.get(prefix + "continue", 0) or 0)
+        result["query"][module] = items[offset:offset + limit]
+        if offset + limit < len(items):
+            self._continue(params, result, module, prefix + "continue",
+                           offset + limit)
+
+    def _category_members(self, category):
+        link = u"[[{0}]]".format(category)
+        return sorted(title for title, page in self._pages.iteritems()
+                      if link in page["text"])
+
+    def _list_categorymembers(self, params, result):
+        category = self._normalize(params["cmtitle"])
+        items = [{"pageid": self._pages[title]["pageid"], "title": title,
+                  "ns": self._split(title)[0]}
+                 for title in self._category_members(category)]
+        self._paginate(params, result, "categorymembers", "cm", items)
+
+    def _list_backlinks(self, params, result):
+        target = self._normalize(params["bltitle"])
+        items = []
+        for title, page in sorted(self._pages.iteritems()):
+            match = re.match(r"#REDIRECT \[\[(.*?)\]\]", page["text"], re.I)
+            if match and self._normalize(match.group(1)) == target:
+                items.append({"pageid": page["pageid"], "title": title,
+                              "ns": self._split(title)[0], "redirect": ""})
+        self._paginate(params, result, "backlinks", "bl", items)
+
+    def _list_users(self, params, result):
+        users = []
+        for name in params.get("ususers", "").split("|"):
+            users.append({"userid": 1, "name": name, "editcount": 1234,
+                          "registration": "2008-07-03T21:51:34Z",
+                          "groups": ["*", "user"], "rights": ["read"],
+                          "gender": "unknown"})
+        result["query"]["users"] = users